@@ -1,17 +1,96 @@
 import arxiv
+import os
+import json
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from config import ARXIV_CONFIG
+from pathlib import Path
+from config import (
+    ARXIV_CONFIG, ARXIV_API_URL, ARXIV_INCREMENTAL, ARXIV_STATE_FILE, ARXIV_WATERMARK_OVERLAP_HOURS,
+    ARXIV_PAGE_SIZE, ARXIV_DELAY_SECONDS, ARXIV_FETCH_WORKERS
+)
+from records import Paper
 import pytz
 
 
 class ArxivScraper:
-    def __init__(self):
-        self.client = arxiv.Client()
+    def __init__(self, state_file=ARXIV_STATE_FILE, incremental=ARXIV_INCREMENTAL,
+                 overlap_hours=ARXIV_WATERMARK_OVERLAP_HOURS, page_size=ARXIV_PAGE_SIZE,
+                 delay_seconds=ARXIV_DELAY_SECONDS, fetch_workers=ARXIV_FETCH_WORKERS):
+        """
+        初始化arXiv论文获取器
+
+        Args:
+            state_file: 保存各查询水位线的文件
+            incremental: 是否按水位线增量获取，False时每次都按days_back重新获取
+            overlap_hours: 水位线向前回看的小时数，用于补上晚公布的论文
+            page_size: 每次请求返回的论文数，越大请求次数越少，但单次响应越慢
+            delay_seconds: 两次请求之间的最小间隔（秒）
+            fetch_workers: 同时获取的查询数
+        """
+        self.client = arxiv.Client(page_size=page_size, delay_seconds=delay_seconds)
+        if ARXIV_API_URL:
+            self.client.query_url_format = ARXIV_API_URL + "?{}"
+        self.fetch_workers = max(1, fetch_workers)
         self.config = ARXIV_CONFIG
+        self.incremental = incremental
+        self.state_file = Path(state_file)
+        self.overlap = timedelta(hours=overlap_hours)
+
+        self._lock = threading.Lock()
+        # 所有查询共用一个客户端，翻页请求在锁内依次发出
+        self._request_lock = threading.Lock()
+        self.watermarks = self._load_watermarks()
+        # 本次运行获取到但尚未确认处理完成的水位线
+        self._pending = {}
+
+    def _load_watermarks(self):
+        """加载水位线"""
+        if self.incremental and self.state_file.exists():
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"加载arXiv水位线失败: {str(e)}")
+        return {}
+
+    def _save_watermarks(self):
+        """原子地保存水位线（调用方需持有锁）"""
+        os.makedirs(self.state_file.parent, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.state_file.parent, suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self.watermarks, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_file)
+
+    @staticmethod
+    def base_id(arxiv_id):
+        """去掉版本号的arXiv ID，同一论文的新版本不视为新论文"""
+        return arxiv_id.rsplit("v", 1)[0] if "v" in arxiv_id else arxiv_id
+
+    def _results(self, search):
+        """
+        逐条返回查询结果
+
+        arxiv.Client只在发出请求前按自己上一次请求的时间等待delay_seconds，多个线程同时翻页时会并发请求。
+        这里在锁内取下一条结果，需要翻页时请求（包括失败重试）依次发出，请求间隔不小于delay_seconds，
+        符合arXiv API的使用要求，其余线程在等待期间处理已返回的结果。
+        """
+        results = self.client.results(search)
+        while True:
+            with self._request_lock:
+                result = next(results, None)
+            if result is None:
+                return
+            yield result
 
     def get_papers(self, search_query, days_back=1):
         """获取最近几天的论文
-        
+
+        启用增量模式且已有水位线时，只获取水位线之后的新论文（向前回看overlap_hours，
+        已见过的论文会被跳过），否则按days_back获取。
+
         Args:
             search_query (dict): 包含query和name的字典
             days_back (int): 获取几天前的论文
@@ -21,37 +100,175 @@ class ArxivScraper:
         start_date = (end_date - timedelta(days=days_back)).replace(
             hour=0, minute=0, second=0, microsecond=0
         )
-        
-        print(f"Searching papers for {search_query['name']} from {start_date} to {end_date}")
-        
+
+        query = search_query['query']
+        with self._lock:
+            state = self.watermarks.get(query) if self.incremental else None
+        seen_ids = set()
+        if state:
+            watermark = datetime.fromisoformat(state["last_published"])
+            start_date = watermark - self.overlap
+            seen_ids = set(state.get("seen", {}))
+            print(f"Searching new papers for {search_query['name']} since watermark {watermark} "
+                  f"(looking back to {start_date})")
+        else:
+            print(f"Searching papers for {search_query['name']} from {start_date} to {end_date}")
+
         search = arxiv.Search(
-            query=search_query['query'],
+            query=query,
             max_results=self.config["max_results"],
             sort_by=arxiv.SortCriterion.SubmittedDate,
             sort_order=arxiv.SortOrder.Descending,
         )
 
         papers = []
+        new_seen = {}
         count = 0
-        for result in self.client.results(search):
+        for result in self._results(search):
             paper_date = result.published
             if not paper_date.tzinfo:
                 paper_date = utc.localize(paper_date)
-            print(paper_date)
-            if start_date <= paper_date <= end_date:
-                count += 1
-                print(f"Found paper_{count} for {search_query['name']}: {result.title}")
-                papers.append({
-                    "title": result.title,
-                    "authors": [author.name for author in result.authors],
-                    "abstract": result.summary,
-                    "pdf_url": result.pdf_url,
-                    "published": paper_date.strftime("%Y-%m-%d"),
-                    "arxiv_id": result.entry_id.split("/")[-1],
-                    "category": search_query['name'],
-                    "category_description": search_query.get('description', '')
-                })
-            else:
+            if paper_date < start_date:
                 break
+            if paper_date > end_date:
+                continue
+
+            arxiv_id = result.entry_id.split("/")[-1]
+            base_id = self.base_id(arxiv_id)
+            if base_id in seen_ids or base_id in new_seen:
+                continue
+            new_seen[base_id] = paper_date.isoformat()
+
+            count += 1
+            print(f"Found paper_{count} for {search_query['name']}: {result.title}")
+            papers.append(Paper(
+                title=result.title,
+                authors=[author.name for author in result.authors],
+                abstract=result.summary,
+                pdf_url=result.pdf_url,
+                published=paper_date.strftime("%Y-%m-%d"),
+                arxiv_id=arxiv_id,
+                category=search_query['name'],
+                category_description=search_query.get('description', '')
+            ))
+
+        if self.incremental:
+            with self._lock:
+                self._pending[query] = new_seen
 
         return papers
+
+    def fetch_all(self, search_queries, days_back=1):
+        """
+        并发获取多个查询的论文
+
+        所有查询共用同一个客户端，分页请求仍依次发出。同一篇论文可能出现在多个查询中（跨分类论文），
+        调用方用split_cross_listed去重后只处理一次，再把结果分发给每个匹配的分类。
+
+        Args:
+            search_queries (list): 查询列表，每项是包含query和name的字典
+            days_back (int): 获取几天前的论文
+
+        Returns:
+            {分类名称: 论文列表}
+        """
+        if len(search_queries) <= 1 or self.fetch_workers <= 1:
+            results = {q['name']: self.get_papers(q, days_back=days_back) for q in search_queries}
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.fetch_workers, len(search_queries))) as executor:
+                futures = {q['name']: executor.submit(self.get_papers, q, days_back) for q in search_queries}
+                results = {name: future.result() for name, future in futures.items()}
+
+        counts = Counter(self.base_id(paper['arxiv_id']) for papers in results.values() for paper in papers)
+        shared = sum(1 for count in counts.values() if count > 1)
+        if shared:
+            print(f"共获取 {len(counts)} 篇论文，其中 {shared} 篇同时属于多个分类，只处理一次")
+        return results
+
+    def split_cross_listed(self, results):
+        """
+        把跨分类论文只留在第一个匹配的分类中
+
+        Args:
+            results: fetch_all返回的{分类名称: 论文列表}，按查询顺序排列
+
+        Returns:
+            (去重后的{分类名称: 论文列表}, {分类名称: 已在之前的分类中出现的论文列表})
+        """
+        seen = set()
+        unique = {}
+        cross_listed = {}
+        for name, papers in results.items():
+            unique[name] = []
+            for paper in papers:
+                base_id = self.base_id(paper['arxiv_id'])
+                if base_id in seen:
+                    cross_listed.setdefault(name, []).append(paper)
+                else:
+                    seen.add(base_id)
+                    unique[name].append(paper)
+        return unique, cross_listed
+
+    def get_pending(self, search_query):
+        """
+        返回某个查询本次获取但尚未确认的水位线，用于保存检查点
+
+        Args:
+            search_query (dict): 包含query和name的字典
+
+        Returns:
+            {去掉版本号的arXiv ID: 发布时间}，没有时返回None
+        """
+        with self._lock:
+            pending = self._pending.get(search_query['query'])
+            return dict(pending) if pending is not None else None
+
+    def restore_pending(self, search_query, pending):
+        """
+        从检查点恢复待确认的水位线，恢复运行时不再重新获取论文
+
+        Args:
+            search_query (dict): 包含query和name的字典
+            pending: get_pending返回的水位线
+        """
+        if self.incremental and pending:
+            with self._lock:
+                self._pending[search_query['query']] = dict(pending)
+
+    def commit_watermark(self, search_query):
+        """
+        确认某个查询本次获取的论文已处理完成，推进并保存水位线
+
+        在邮件发送成功后调用；若运行中途失败则不推进，下次运行会重新获取这些论文。
+
+        Args:
+            search_query (dict): 包含query和name的字典
+        """
+        if not self.incremental:
+            return
+
+        query = search_query['query']
+        with self._lock:
+            new_seen = self._pending.pop(query, None)
+            if not new_seen:
+                return
+
+            state = self.watermarks.get(query, {})
+            seen = dict(state.get("seen", {}))
+            seen.update(new_seen)
+
+            latest = max(datetime.fromisoformat(ts) for ts in seen.values())
+            if state.get("last_published"):
+                latest = max(latest, datetime.fromisoformat(state["last_published"]))
+
+            # 只保留回看窗口内的已见ID，窗口之外的论文不会再被获取
+            cutoff = latest - self.overlap
+            seen = {base_id: ts for base_id, ts in seen.items() if datetime.fromisoformat(ts) >= cutoff}
+
+            self.watermarks[query] = {"last_published": latest.isoformat(), "seen": seen}
+            try:
+                self._save_watermarks()
+            except OSError as e:
+                print(f"保存arXiv水位线失败: {str(e)}")
+                return
+        print(f"{search_query['name']} 的水位线已更新到 {latest}")
@@ -0,0 +1,247 @@
+"""
+端到端基准测试：在本地模拟的arXiv、Gemini和SMTP服务上完整运行run_task
+
+分别用串行（serial）、并行（parallel）和批处理并行（batch）总结器各运行一次，每次运行在独立的子进程中进行，
+输出吞吐量（篇/分钟）、各阶段耗时的百分位数和峰值内存，以便在上线前发现性能退化。
+
+用法:
+    python benchmarks/e2e_benchmark.py [--papers 60] [--modes serial,parallel,batch]
+        [--gemini-latency 0.5] [--gemini-error-rate 0.02] [--gemini-429-rate 0.05] [--json results.json]
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+# 各模式对应的总结器配置
+MODES = {
+    "serial": {"USE_PARALLEL": "False", "USE_BATCH_PARALLEL": "False"},
+    "parallel": {"USE_PARALLEL": "True", "USE_BATCH_PARALLEL": "False"},
+    "batch": {"USE_PARALLEL": "True", "USE_BATCH_PARALLEL": "True"},
+}
+
+STAGES = ("fetch", "download", "extract", "summarize", "email")
+
+
+def percentile(values, fraction):
+    """最近秩法计算百分位数"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))]
+
+
+# ---------------------------------------------------------------- 子进程：运行一次run_task
+
+class _StageTimer:
+    """记录各阶段每次调用的耗时"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {stage: [] for stage in STAGES}
+        self.last_email_at = None
+
+    def wrap(self, owner, name, stage):
+        original = getattr(owner, name)
+        timer = self
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                end = time.perf_counter()
+                with timer._lock:
+                    timer.samples[stage].append(end - start)
+                    if stage == "email":
+                        timer.last_email_at = end
+
+        setattr(owner, name, timed)
+
+
+def run_child(mode, papers, result_file):
+    """在子进程中运行一次run_task（环境变量已由父进程设置好）"""
+    sys.path.insert(0, REPO_DIR)
+    import config
+    import main
+    from arxiv_scraper import ArxivScraper
+    from pdf_downloader import PDFDownloader
+    from pdf_extractor import PDFExtractor
+    from summarizer import PaperSummarizer
+    from parallel_summarizer import ParallelPaperSummarizer
+    from mailer import Mailer
+
+    config.ARXIV_CONFIG["search_queries"] = [{"query": "cat:cs.AI", "name": "bench", "description": "基准测试"}]
+    config.ARXIV_CONFIG["max_results"] = papers
+
+    timer = _StageTimer()
+    timer.wrap(ArxivScraper, "get_papers", "fetch")
+    timer.wrap(PDFDownloader, "download_pdf", "download")
+    timer.wrap(PDFExtractor, "extract_and_clean", "extract")
+    # 串行总结器每篇论文一次请求，并行和批处理总结器的所有请求（包括合并请求）都经过_call_model
+    timer.wrap(PaperSummarizer, "summarize_paper", "summarize")
+    timer.wrap(ParallelPaperSummarizer, "_call_model", "summarize")
+    timer.wrap(Mailer, "send", "email")
+
+    start = time.perf_counter()
+    main.run_task()
+    end = timer.last_email_at or time.perf_counter()
+
+    usage_self = resource.getrusage(resource.RUSAGE_SELF)
+    usage_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    result = {
+        "mode": mode,
+        "papers": papers,
+        "elapsed": end - start,
+        "samples": timer.samples,
+        # Linux下ru_maxrss的单位为KB
+        "peak_rss_mb": usage_self.ru_maxrss / 1024,
+        "peak_rss_children_mb": usage_children.ru_maxrss / 1024,
+    }
+    with open(result_file, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+# ---------------------------------------------------------------- 父进程：启动模拟服务并依次运行各模式
+
+def child_env(args, mode, workdir, arxiv, gemini, smtp):
+    """子进程的环境变量，所有输出目录都放在临时目录中，关闭各类缓存以免影响测量"""
+    env = dict(os.environ)
+    env.update(MODES[mode])
+    env.update({
+        "DEBUG_MODE": "True",
+        "DAYS_BACK": "30",
+        "ARXIV_API_URL": arxiv.api_url,
+        "ARXIV_INCREMENTAL": "False",
+        "ARXIV_DELAY_SECONDS": "0",
+        "GEMINI_BASE_URL": gemini.base_url,
+        "GEMINI_MODEL": "bench-model",
+        "GEMINI_RPM": str(args.rpm),
+        "GEMINI_TPM": "0",
+        "USE_PIPELINE": "True" if args.pipeline else "False",
+        "PDF_EXTRACT_WORKERS": str(args.extract_workers),
+        "PDF_BASE_DIR": os.path.join(workdir, "papers"),
+        "CACHE_DIR": os.path.join(workdir, "cache"),
+        "TEXT_CACHE_ENABLED": "False",
+        "SUMMARY_CACHE_ENABLED": "False",
+        "CHECKPOINT_ENABLED": "False",
+        "SMTP_SERVER": "127.0.0.1",
+        "SMTP_PORT": str(smtp.port),
+        "SMTP_SECURITY": "plain",
+        "SMTP_FALLBACK_PORT": "0",
+        "SENDER_EMAIL": "bench@example.com",
+        "SENDER_PASSWORD": "",
+        "RECEIVER_EMAILS": "reader@example.com",
+        # 本地服务不经过代理
+        "NO_PROXY": "127.0.0.1,localhost",
+        "no_proxy": "127.0.0.1,localhost",
+    })
+    for index in range(1, args.keys + 1):
+        env[f"GEMINI_API_KEY_{index}"] = f"bench-key-{index}"
+    env.pop(f"GEMINI_API_KEY_{args.keys + 1}", None)
+    return env
+
+
+def report(result, gemini_stats):
+    elapsed = result["elapsed"]
+    print(f"\n== {result['mode']} ==")
+    print(f"论文 {result['papers']} 篇，耗时 {elapsed:.1f} 秒，吞吐量 {result['papers'] / elapsed * 60:.1f} 篇/分钟")
+    print(f"峰值内存: 主进程 {result['peak_rss_mb']:.0f} MB，子进程 {result['peak_rss_children_mb']:.0f} MB")
+    print(f"Gemini请求: {gemini_stats['requests']} 次（成功 {gemini_stats['ok']}，合并 {gemini_stats['batch_requests']}，"
+          f"500错误 {gemini_stats['errors']}，429限流 {gemini_stats['rate_limited']}）")
+    print(f"{'阶段':<10}{'次数':>6}{'p50(ms)':>10}{'p90(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for stage in STAGES:
+        samples = result["samples"].get(stage) or []
+        if not samples:
+            print(f"{stage:<10}{0:>6}")
+            continue
+        values = [percentile(samples, q) * 1000 for q in (0.5, 0.9, 0.99)] + [max(samples) * 1000]
+        print(f"{stage:<10}{len(samples):>6}" + "".join(f"{value:>10.1f}" for value in values))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端基准测试")
+    parser.add_argument("--papers", type=int, default=60, help="模拟的论文数量")
+    parser.add_argument("--modes", default="serial,parallel,batch", help="要测试的总结器，逗号分隔")
+    parser.add_argument("--keys", type=int, default=3, help="模拟的Gemini API密钥数量")
+    parser.add_argument("--rpm", type=int, default=600, help="每个密钥的每分钟请求数上限（GEMINI_RPM）")
+    parser.add_argument("--pipeline", action="store_true", help="以流水线方式运行（USE_PIPELINE=True）")
+    parser.add_argument("--extract-workers", type=int, default=1,
+                        help="PDF提取进程数，大于1时提取阶段在进程池中进行，不统计单篇提取耗时")
+    parser.add_argument("--pdf-pages", type=int, default=8, help="合成PDF的页数")
+    parser.add_argument("--gemini-latency", type=float, default=0.5, help="Gemini请求的平均延迟（秒）")
+    parser.add_argument("--gemini-jitter", type=float, default=0.2, help="Gemini请求延迟的波动幅度（秒）")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0, help="Gemini返回500错误的概率")
+    parser.add_argument("--gemini-429-rate", type=float, default=0.0, help="Gemini返回429限流的概率")
+    parser.add_argument("--gemini-retry-delay", type=float, default=1.0, help="429响应建议的等待秒数")
+    parser.add_argument("--json", help="把结果另存为JSON文件")
+    parser.add_argument("--keep", action="store_true", help="保留临时目录（包含各模式的运行日志）")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.papers, args.result_file)
+        return
+
+    sys.path.insert(0, BENCH_DIR)
+    from fake_services import FakeArxivServer, FakeGeminiServer, SmtpSink, make_pdf_corpus
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"未知的模式: {', '.join(unknown)}，可选: {', '.join(MODES)}")
+
+    workroot = tempfile.mkdtemp(prefix="arxiv-bench-")
+    print(f"生成合成PDF（{args.pdf_pages} 页）...")
+    corpus = make_pdf_corpus(count=min(args.papers, 20), pages=args.pdf_pages)
+    results = []
+    with FakeArxivServer(papers=args.papers, pdf_corpus=corpus) as arxiv, \
+            FakeGeminiServer(latency=args.gemini_latency, jitter=args.gemini_jitter,
+                             error_rate=args.gemini_error_rate, rate_limit_rate=args.gemini_429_rate,
+                             retry_delay=args.gemini_retry_delay) as gemini, \
+            SmtpSink() as smtp:
+        for mode in modes:
+            workdir = os.path.join(workroot, mode)
+            os.makedirs(workdir)
+            result_file = os.path.join(workdir, "result.json")
+            log_file = os.path.join(workdir, "run.log")
+            gemini.reset_stats()
+            print(f"运行 {mode}（日志: {log_file}）...")
+            with open(log_file, "w", encoding="utf-8") as log:
+                completed = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--child", mode, "--papers", str(args.papers),
+                     "--result-file", result_file],
+                    cwd=workdir, env=child_env(args, mode, workdir, arxiv, gemini, smtp),
+                    stdout=log, stderr=subprocess.STDOUT,
+                )
+            if completed.returncode != 0 or not os.path.exists(result_file):
+                print(f"{mode} 运行失败（退出码 {completed.returncode}），详见日志: {log_file}")
+                continue
+            with open(result_file, "r", encoding="utf-8") as f:
+                result = json.load(f)
+            result["gemini"] = dict(gemini.stats)
+            results.append(result)
+            report(result, result["gemini"])
+        print(f"\nSMTP接收: {smtp.messages} 封，{smtp.bytes / 1024:.0f} KB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.keep:
+        print(f"临时目录: {workroot}")
+    else:
+        shutil.rmtree(workroot, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+端到端基准测试使用的本地模拟服务
+
+- FakeArxivServer：arXiv查询API（Atom格式）和PDF下载
+- FakeGeminiServer：Gemini streamGenerateContent接口（SSE），可配置延迟、错误率和429限流
+- SmtpSink：只接收不投递的SMTP服务
+- make_pdf_corpus：用PyMuPDF生成合成论文PDF
+
+所有服务都在后台线程中运行，监听127.0.0.1的随机端口。
+"""
+import json
+import random
+import re
+import socketserver
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from xml.sax.saxutils import escape
+
+_WORDS = (
+    "model learning neural network graph transformer attention data training inference agent reasoning "
+    "language vision policy reward optimization gradient benchmark dataset evaluation robust efficient "
+    "sparse scaling alignment retrieval generation diffusion latent embedding representation"
+).split()
+
+_SECTIONS = ("Abstract", "1 Introduction", "2 Related Work", "3 Method", "4 Experiments", "5 Conclusion",
+             "References")
+
+
+def _sentence(rng, words=16):
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_pdf_corpus(count=20, pages=8, seed=0):
+    """
+    生成合成论文PDF
+
+    Args:
+        count: 生成的PDF数量，论文数量更多时循环使用
+        pages: 每个PDF的页数
+        seed: 随机种子
+
+    Returns:
+        PDF内容（bytes）列表
+    """
+    import fitz  # PyMuPDF
+
+    rng = random.Random(seed)
+    corpus = []
+    for index in range(count):
+        doc = fitz.open()
+        sections = iter(_SECTIONS)
+        for page_number in range(pages):
+            page = doc.new_page()
+            lines = []
+            # 章节大致均匀地分布在各页上，参考文献在最后一页
+            if page_number == 0 or page_number == pages - 1 or rng.random() < 0.6:
+                heading = next(sections, None)
+                if page_number == pages - 1:
+                    heading = "References"
+                if heading:
+                    lines.append(heading)
+            lines.extend(_sentence(rng) for _ in range(40))
+            page.insert_textbox(fitz.Rect(40, 40, 560, 800), "\n".join(lines), fontsize=8)
+            page.insert_text((300, 820), str(page_number + 1), fontsize=8)
+        corpus.append(doc.tobytes())
+        doc.close()
+    return corpus
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _BackgroundServer:
+    """在后台线程中运行的服务，支持with语句"""
+
+    def _start(self, server):
+        self.server = server
+        self.port = server.server_address[1]
+        self._thread = threading.Thread(target=server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class FakeArxivServer(_BackgroundServer):
+    """模拟arXiv查询API，返回按提交时间倒序排列的合成论文，并提供PDF下载"""
+
+    def __init__(self, papers=200, pdf_corpus=None, seed=0):
+        """
+        Args:
+            papers: 论文数量，提交时间从现在开始每篇向前推10分钟
+            pdf_corpus: make_pdf_corpus生成的PDF列表
+            seed: 随机种子
+        """
+        rng = random.Random(seed)
+        now = datetime.now(timezone.utc)
+        self.pdf_corpus = pdf_corpus or []
+        self.entries = []
+        for index in range(papers):
+            published = (now - timedelta(minutes=10 * (index + 1))).strftime("%Y-%m-%dT%H:%M:%SZ")
+            self.entries.append({
+                "id": f"2501.{index:05d}v1",
+                "title": " ".join(rng.choice(_WORDS) for _ in range(8)).title(),
+                "summary": " ".join(_sentence(rng) for _ in range(8)),
+                "authors": [f"Author {rng.randrange(500)}" for _ in range(rng.randint(1, 6))],
+                "published": published,
+            })
+        self.requests = 0
+        self.pdf_requests = 0
+
+        owner = self
+
+        class Handler(_QuietHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if parsed.path.startswith("/pdf/"):
+                    owner.pdf_requests += 1
+                    index = int(parsed.path.rsplit(".", 1)[-1].split("v")[0])
+                    if not owner.pdf_corpus:
+                        self._send(404, b"", "text/plain")
+                        return
+                    self._send(200, owner.pdf_corpus[index % len(owner.pdf_corpus)], "application/pdf")
+                    return
+                owner.requests += 1
+                params = parse_qs(parsed.query)
+                start = int(params.get("start", ["0"])[0])
+                max_results = int(params.get("max_results", ["100"])[0])
+                body = owner.feed(start, max_results).encode("utf-8")
+                self._send(200, body, "application/atom+xml; charset=utf-8")
+
+        self._start(ThreadingHTTPServer(("127.0.0.1", 0), Handler))
+
+    @property
+    def api_url(self):
+        return f"http://127.0.0.1:{self.port}/api/query"
+
+    def feed(self, start, max_results):
+        """生成一页Atom结果"""
+        parts = [
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<feed xmlns="http://www.w3.org/2005/Atom" '
+            'xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/" '
+            'xmlns:arxiv="http://arxiv.org/schemas/atom">\n'
+            f'<title>ArXiv Query</title><id>http://arxiv.org/api/bench</id>'
+            f'<updated>{datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")}</updated>\n'
+            f'<opensearch:totalResults>{len(self.entries)}</opensearch:totalResults>'
+            f'<opensearch:startIndex>{start}</opensearch:startIndex>'
+            f'<opensearch:itemsPerPage>{max_results}</opensearch:itemsPerPage>\n'
+        ]
+        for entry in self.entries[start:start + max_results]:
+            authors = "".join(f"<author><name>{escape(name)}</name></author>" for name in entry["authors"])
+            parts.append(
+                f'<entry><id>http://arxiv.org/abs/{entry["id"]}</id>'
+                f'<updated>{entry["published"]}</updated><published>{entry["published"]}</published>'
+                f'<title>{escape(entry["title"])}</title><summary>{escape(entry["summary"])}</summary>'
+                f'{authors}'
+                f'<link href="http://arxiv.org/abs/{entry["id"]}" rel="alternate" type="text/html"/>'
+                f'<link title="pdf" href="http://127.0.0.1:{self.port}/pdf/{entry["id"]}" rel="related" '
+                f'type="application/pdf"/>'
+                f'<arxiv:primary_category term="cs.AI" scheme="http://arxiv.org/schemas/atom"/>'
+                f'<category term="cs.AI" scheme="http://arxiv.org/schemas/atom"/></entry>\n'
+            )
+        parts.append("</feed>\n")
+        return "".join(parts)
+
+
+class FakeGeminiServer(_BackgroundServer):
+    """
+    模拟Gemini的streamGenerateContent接口（?alt=sse）
+
+    普通请求返回与单篇总结格式一致的文本，responseMimeType为application/json的合并请求
+    按提示中的 [P1]、[P2] 编号返回JSON数组。
+    """
+
+    def __init__(self, latency=0.5, jitter=0.2, error_rate=0.0, rate_limit_rate=0.0, retry_delay=1.0,
+                 chunks=3, seed=0):
+        """
+        Args:
+            latency: 每个请求的平均延迟（秒）
+            jitter: 延迟的随机波动幅度（秒）
+            error_rate: 返回500错误的概率
+            rate_limit_rate: 返回429限流的概率
+            retry_delay: 429响应中建议的等待秒数
+            chunks: 正文分成几个SSE事件返回
+            seed: 随机种子
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_delay = retry_delay
+        self.chunks = max(1, chunks)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+        owner = self
+
+        class Handler(_QuietHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                owner.handle(self, request)
+
+        self._start(ThreadingHTTPServer(("127.0.0.1", 0), Handler))
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0, "batch_requests": 0}
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _draw(self):
+        """决定本次请求的结果和延迟"""
+        with self._lock:
+            roll = self._rng.random()
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+        if roll < self.rate_limit_rate:
+            return "rate_limited", 0.0
+        if roll < self.rate_limit_rate + self.error_rate:
+            return "error", delay / 2
+        return "ok", delay
+
+    def handle(self, handler, request):
+        self._count("requests")
+        outcome, delay = self._draw()
+        if outcome == "rate_limited":
+            self._count("rate_limited")
+            body = {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED",
+                              "message": f"Resource has been exhausted. Please retry in {self.retry_delay}s."}}
+            handler._send(429, json.dumps(body).encode("utf-8"), "application/json")
+            return
+        time.sleep(delay)
+        if outcome == "error":
+            self._count("errors")
+            body = {"error": {"code": 500, "status": "INTERNAL", "message": "Internal error encountered."}}
+            handler._send(500, json.dumps(body).encode("utf-8"), "application/json")
+            return
+
+        prompt = "".join(part.get("text", "") for content in request.get("contents", [])
+                         for part in content.get("parts", []))
+        config = request.get("generationConfig") or {}
+        if config.get("responseMimeType") == "application/json":
+            self._count("batch_requests")
+            text = self._batch_response(prompt)
+        else:
+            text = self._single_response(prompt)
+        self._count("ok")
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.end_headers()
+        size = -(-len(text) // self.chunks)
+        for start in range(0, len(text), size):
+            event = {"candidates": [{"content": {"role": "model", "parts": [{"text": text[start:start + size]}]},
+                                     "index": 0}]}
+            handler.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode("utf-8"))
+            handler.wfile.flush()
+
+    @staticmethod
+    def _rating(seed_text):
+        return 40 + sum(seed_text.encode("utf-8")) % 60
+
+    def _single_response(self, prompt):
+        rating = self._rating(prompt[:2000])
+        return (f"1. 主要研究目标: 合成的研究目标。\n2. 关键方法: 合成的方法。\n3. 主要创新点: 合成的创新点。\n"
+                f"4. 主要结论: 合成的结论。\n5. 研究意义: 合成的研究意义。\n6. 论文评分: {rating}\n"
+                f"7. 评分理由: 基准测试生成的评分。")
+
+    def _batch_response(self, prompt):
+        items = []
+        for paper_id in re.findall(r"^\[(P\d+)\]$", prompt, re.MULTILINE):
+            items.append({
+                "id": paper_id, "research_goal": "合成的研究目标", "key_methods": "合成的方法",
+                "innovations": "合成的创新点", "conclusions": "合成的结论", "significance": "合成的研究意义",
+                "rating": self._rating(paper_id + prompt[:200]), "rating_reason": "基准测试生成的评分",
+            })
+        return json.dumps(items, ensure_ascii=False)
+
+
+class SmtpSink(_BackgroundServer):
+    """只接收邮件、不投递的SMTP服务（不支持TLS和认证，配合SMTP_SECURITY=plain使用）"""
+
+    def __init__(self):
+        owner = self
+        self.messages = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                self.wfile.write(b"220 bench SMTP sink\r\n")
+                in_data = False
+                size = 0
+                for line in self.rfile:
+                    if in_data:
+                        if line == b".\r\n":
+                            in_data = False
+                            with owner._lock:
+                                owner.messages += 1
+                                owner.bytes += size
+                            self.wfile.write(b"250 OK: queued\r\n")
+                        else:
+                            size += len(line)
+                        continue
+                    command = line[:4].upper()
+                    if command in (b"EHLO", b"HELO"):
+                        self.wfile.write(b"250-bench\r\n250 8BITMIME\r\n")
+                    elif command == b"DATA":
+                        in_data = True
+                        size = 0
+                        self.wfile.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    elif command == b"QUIT":
+                        self.wfile.write(b"221 Bye\r\n")
+                        return
+                    else:
+                        self.wfile.write(b"250 OK\r\n")
+
+        class Server(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        self._start(Server(("127.0.0.1", 0), Handler))
@@ -0,0 +1,131 @@
+"""
+邮件正文渲染基准测试
+
+用合成的报告条目（默认1000篇）测量digest_renderer的渲染耗时，并与原先逐篇 += 拼接的写法对比。
+
+用法:
+    python benchmarks/render_benchmark.py [--papers 1000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from digest_renderer import build_digest, render_html, render_text  # noqa: E402
+from records import Paper, Summary  # noqa: E402
+
+MODEL = "gemini-2.0-flash"
+CATEGORY = {"name": "cs.AI", "description": "Artificial Intelligence <synthetic>"}
+DATE = "2025-01-01"
+
+
+def make_summaries(count, seed=0):
+    """生成合成的报告条目，文本中包含需要转义的字符"""
+    rng = random.Random(seed)
+    words = ["model", "graph", "neural", "<b>", "R&D", "\"quoted\"", "transformer", "loss", "data", "agent"]
+    summaries = []
+    for i in range(count):
+        paper = Paper(
+            title=" ".join(rng.choice(words) for _ in range(10)),
+            authors=[f"Author {rng.randrange(200)}" for _ in range(rng.randint(1, 8))],
+            abstract=" ".join(rng.choice(words) for _ in range(200)),
+            pdf_url=f"http://arxiv.org/pdf/2501.{i:05d}v1?a=1&b=2",
+            published=DATE,
+            arxiv_id=f"2501.{i:05d}v1",
+            relevance_score=rng.random() if i % 2 else None,
+        )
+        summary_text = "\n".join(f"{n}. " + " ".join(rng.choice(words) for _ in range(30)) for n in range(1, 8))
+        summaries.append(Summary(paper, summary_text, rng.randint(30, 100), triage_only=i % 3 == 0))
+    return summaries
+
+
+def legacy_render(summaries):
+    """原先send_email中逐篇 += 拼接、不转义的写法（省略了样式表）"""
+    html_content = f"<html><body><h2>arXiv {CATEGORY['name']} - {DATE}</h2>"
+    for paper in summaries:
+        summary = paper["summary"].replace("\n", "<br>").replace("  ", "&nbsp;")
+        html_content += f"""
+        <div class="paper">
+            <div class="paper-title">{paper.get('rating', 50)}/100 {paper['title']}</div>
+            <div class="paper-meta">
+                <strong>作者：</strong>{', '.join(paper['authors'])}<br>
+                <strong>arXiv ID：</strong>{paper['arxiv_id']}<br>
+                <strong>发表日期：</strong>{paper['published']}<br>
+                <strong>PDF链接：</strong><a href="{paper['pdf_url']}">{paper['pdf_url']}</a>
+            </div>
+            <p>{paper.get('abstract', '无摘要')}</p>
+            <div class="paper-summary">{summary}</div>
+        </div>
+        """
+    html_content += "</body></html>"
+
+    text_content = "今日论文总结（按评分排序）：\n\n"
+    for paper in summaries:
+        text_content += f"评分：{paper.get('rating', 50)}/100\n"
+        text_content += f"标题：{paper['title']}\n"
+        text_content += f"作者：{', '.join(paper['authors'])}\n"
+        text_content += f"arXiv ID：{paper['arxiv_id']}\n"
+        text_content += f"发表日期：{paper['published']}\n"
+        text_content += f"PDF链接：{paper['pdf_url']}\n"
+        text_content += f"\n原文摘要：\n{paper.get('abstract', '无摘要')}\n"
+        text_content += f"\n总结：\n{paper['summary']}\n"
+        text_content += "\n" + "=" * 50 + "\n\n"
+    return html_content, text_content
+
+
+def render(summaries):
+    digest = build_digest(summaries, CATEGORY, DATE, MODEL)
+    return render_html(digest), render_text(digest)
+
+
+def build_message(html_content, text_content):
+    msg = MIMEMultipart("alternative")
+    msg.attach(MIMEText(text_content, "plain", "utf-8"))
+    msg.attach(MIMEText(html_content, "html", "utf-8"))
+    return msg.as_bytes()
+
+
+def measure(func, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{name:<24} 中位数 {statistics.median(timings):8.2f} ms   p95 {p95:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="邮件正文渲染基准测试")
+    parser.add_argument("--papers", type=int, default=1000, help="合成的论文数量")
+    parser.add_argument("--repeat", type=int, default=20, help="每项测量的重复次数")
+    args = parser.parse_args()
+
+    summaries = make_summaries(args.papers)
+    print(f"合成 {args.papers} 篇论文，重复 {args.repeat} 次")
+
+    (html_content, text_content), timings = measure(lambda: render(summaries), args.repeat)
+    report("digest_renderer", timings)
+    _, timings = measure(lambda: legacy_render(summaries), args.repeat)
+    report("legacy += 拼接", timings)
+    payload, timings = measure(lambda: build_message(html_content, text_content), args.repeat)
+    report("MIME构建+序列化", timings)
+
+    print(f"HTML {len(html_content) / 1024:.0f} KB，纯文本 {len(text_content) / 1024:.0f} KB，"
+          f"邮件 {len(payload) / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
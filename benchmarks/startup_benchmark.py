@@ -0,0 +1,118 @@
+"""
+启动基准测试：统计导入main（或其他模块）的耗时，找出拖慢启动的依赖
+
+每次在新的子进程中用 `python -X importtime` 导入目标模块，输出总耗时的中位数和最小值、累计耗时最多的模块，
+并检查arxiv、google-genai、PyMuPDF等重量级依赖是否在导入阶段就被加载。
+
+用法:
+    python benchmarks/startup_benchmark.py [--module main] [--runs 10] [--top 15] [--json results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+# 只应在对应阶段实际运行时才加载的重量级依赖
+HEAVY_MODULES = ("fitz", "google.genai", "arxiv", "numpy", "requests", "pdf2image", "pytesseract", "schedule")
+
+
+def parse_importtime(stderr):
+    """
+    解析 -X importtime 的输出
+
+    Returns:
+        {模块名: (自身耗时us, 累计耗时us)}，同一模块只保留第一次导入
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].strip()
+        modules.setdefault(name, (int(fields[0]), int(fields[1])))
+    return modules
+
+
+def run_once(module):
+    """在新的子进程中导入一次模块，返回（墙钟耗时秒, importtime结果）"""
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_DIR, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if completed.returncode != 0:
+        # 最后几行是导入失败的异常信息
+        error = "\n".join(line for line in completed.stderr.splitlines() if not line.startswith("import time:"))
+        raise RuntimeError(f"导入 {module} 失败:\n{error}")
+    return elapsed, parse_importtime(completed.stderr)
+
+
+def baseline():
+    """空解释器的启动耗时，用于从结果中扣除"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], cwd=REPO_DIR, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动基准测试")
+    parser.add_argument("--module", default="main", help="要导入的模块")
+    parser.add_argument("--runs", type=int, default=10, help="重复次数")
+    parser.add_argument("--top", type=int, default=15, help="列出累计耗时最多的模块数")
+    parser.add_argument("--json", help="把结果另存为JSON文件")
+    args = parser.parse_args()
+
+    interpreter = statistics.median(baseline() for _ in range(max(1, args.runs)))
+    elapsed = []
+    imports = {}
+    for _ in range(max(1, args.runs)):
+        try:
+            seconds, modules = run_once(args.module)
+        except RuntimeError as e:
+            print(str(e))
+            sys.exit(1)
+        elapsed.append(seconds)
+        # 各模块的累计耗时取多次运行中的最小值，减少磁盘缓存等噪声
+        for name, (self_us, cumulative_us) in modules.items():
+            best = imports.get(name)
+            if best is None or cumulative_us < best[1]:
+                imports[name] = (self_us, cumulative_us)
+
+    median = statistics.median(elapsed)
+    print(f"导入 {args.module}: 中位数 {median * 1000:.0f} ms，最小 {min(elapsed) * 1000:.0f} ms"
+          f"（空解释器 {interpreter * 1000:.0f} ms，共 {len(imports)} 个模块）")
+
+    loaded = [name for name in HEAVY_MODULES if name in imports]
+    if loaded:
+        print(f"导入阶段加载了重量级依赖: {', '.join(loaded)}")
+    else:
+        print("导入阶段没有加载重量级依赖")
+
+    print(f"\n{'累计(ms)':>10}{'自身(ms)':>10}  模块")
+    ranked = sorted(imports.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (self_us, cumulative_us) in ranked[:args.top]:
+        print(f"{cumulative_us / 1000:>10.1f}{self_us / 1000:>10.1f}  {name}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "module": args.module,
+                "runs": elapsed,
+                "median": median,
+                "interpreter": interpreter,
+                "heavy_modules": loaded,
+                "imports": {name: {"self_us": s, "cumulative_us": c} for name, (s, c) in ranked},
+            }, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
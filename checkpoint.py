@@ -0,0 +1,257 @@
+import os
+import json
+import zlib
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from text_spool import read_text
+from records import Paper, Summary
+
+# 单篇论文依次经过的阶段
+STAGES = ("downloaded", "extracted", "summarized")
+
+
+class RunCheckpoint:
+    """按运行保存每个分类、每篇论文各阶段的处理结果（SQLite），进程中断或邮件发送失败后可以从断点继续"""
+
+    def __init__(self, db_file, run_date=None, keep_days=7):
+        """
+        初始化运行检查点
+
+        不指定run_date时，继续今天最近一次未完成的运行，没有时开始新的运行，
+        同一天的多次运行各自从水位线获取新论文；指定run_date时恢复该日期最近一次未完成的运行，都已完成时恢复最近一次运行。
+
+        Args:
+            db_file: 检查点数据库文件
+            run_date: 要恢复的运行日期（YYYY-MM-DD），None表示今天
+            keep_days: 保留最近几天的检查点，更早的自动删除，0表示不删除
+        """
+        self.db_file = Path(db_file)
+        os.makedirs(self.db_file.parent, exist_ok=True)
+
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "run_id TEXT PRIMARY KEY, "
+            "run_date TEXT NOT NULL, "
+            "started_at REAL NOT NULL, "
+            "finished_at REAL)"
+        )
+        self._migrate(conn)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS fetches ("
+            "run_id TEXT NOT NULL, "
+            "category TEXT NOT NULL, "
+            "papers TEXT NOT NULL, "
+            "pending_watermark TEXT, "
+            "done_at REAL, "
+            "updated_at REAL NOT NULL, "
+            "PRIMARY KEY (run_id, category))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS stages ("
+            "run_id TEXT NOT NULL, "
+            "category TEXT NOT NULL, "
+            "arxiv_id TEXT NOT NULL, "
+            "stage TEXT NOT NULL, "
+            "data BLOB NOT NULL, "
+            "failed INTEGER NOT NULL DEFAULT 0, "
+            "updated_at REAL NOT NULL, "
+            "PRIMARY KEY (run_id, category, arxiv_id, stage))"
+        )
+
+        today = datetime.now().strftime('%Y-%m-%d')
+        self.run_date = run_date or today
+        if run_date:
+            row = conn.execute(
+                "SELECT run_id FROM runs WHERE run_date = ? ORDER BY finished_at IS NULL DESC, started_at DESC LIMIT 1",
+                (run_date,),
+            ).fetchone()
+        else:
+            row = conn.execute(
+                "SELECT run_id FROM runs WHERE run_date = ? AND finished_at IS NULL ORDER BY started_at DESC LIMIT 1",
+                (today,),
+            ).fetchone()
+        self.resumed = row is not None
+        if self.resumed:
+            self.run_id = row[0]
+        else:
+            self.run_id = datetime.now().isoformat(timespec='milliseconds')
+            conn.execute("INSERT INTO runs (run_id, run_date, started_at) VALUES (?, ?, ?)",
+                         (self.run_id, self.run_date, time.time()))
+
+        if keep_days:
+            cutoff = (datetime.strptime(self.run_date, '%Y-%m-%d') - timedelta(days=keep_days)).strftime('%Y-%m-%d')
+            expired = "SELECT run_id FROM runs WHERE run_date < ?"
+            conn.execute(f"DELETE FROM fetches WHERE run_id IN ({expired})", (cutoff,))
+            conn.execute(f"DELETE FROM stages WHERE run_id IN ({expired})", (cutoff,))
+            conn.execute("DELETE FROM runs WHERE run_date < ?", (cutoff,))
+
+    @staticmethod
+    def _migrate(conn):
+        """旧版数据库按日期记录运行，把每个日期转换为一次已完成的运行，只能通过--resume恢复"""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(fetches)")}
+        if not columns or "run_id" in columns:
+            return
+        conn.execute("ALTER TABLE fetches RENAME COLUMN run_date TO run_id")
+        conn.execute("ALTER TABLE fetches RENAME COLUMN emailed_at TO done_at")
+        conn.execute("ALTER TABLE stages RENAME COLUMN run_date TO run_id")
+        stage_columns = {row[1] for row in conn.execute("PRAGMA table_info(stages)")}
+        if "failed" not in stage_columns:
+            conn.execute("ALTER TABLE stages ADD COLUMN failed INTEGER NOT NULL DEFAULT 0")
+        conn.execute(
+            "INSERT OR IGNORE INTO runs (run_id, run_date, started_at, finished_at) "
+            "SELECT run_id, run_id, MIN(updated_at), MAX(updated_at) FROM fetches GROUP BY run_id"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def finish(self):
+        """记录本次运行已完成，之后同一天的运行不再继续它"""
+        self._conn().execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), self.run_id))
+
+    def is_done(self, category):
+        """该分类本次运行是否已处理完成（邮件已发送或没有需要发送的论文）"""
+        row = self._conn().execute(
+            "SELECT done_at FROM fetches WHERE run_id = ? AND category = ?", (self.run_id, category)
+        ).fetchone()
+        return row is not None and row[0] is not None
+
+    def mark_done(self, category):
+        """记录该分类已处理完成"""
+        self._conn().execute(
+            "UPDATE fetches SET done_at = ?, updated_at = ? WHERE run_id = ? AND category = ?",
+            (time.time(), time.time(), self.run_id, category),
+        )
+
+    def load_fetch(self, category):
+        """
+        读取已获取（并经过预筛选）的论文列表
+
+        Returns:
+            (论文列表, 待确认的水位线)，没有记录时返回None
+        """
+        row = self._conn().execute(
+            "SELECT papers, pending_watermark FROM fetches WHERE run_id = ? AND category = ?",
+            (self.run_id, category),
+        ).fetchone()
+        if row is None:
+            return None
+        papers = [Paper.from_dict(data) for data in json.loads(row[0])]
+        return papers, json.loads(row[1]) if row[1] else None
+
+    def save_fetch(self, category, papers, pending_watermark=None):
+        """
+        保存获取到的论文列表，以及邮件发送成功后需要提交的水位线
+
+        Args:
+            category: 分类名称
+            papers: 论文列表
+            pending_watermark: 本次获取的待确认水位线
+        """
+        self._conn().execute(
+            "INSERT OR REPLACE INTO fetches (run_id, category, papers, pending_watermark, done_at, updated_at) "
+            "VALUES (?, ?, ?, ?, NULL, ?)",
+            (self.run_id, category, json.dumps([paper.to_dict() for paper in papers], ensure_ascii=False),
+             json.dumps(pending_watermark) if pending_watermark is not None else None, time.time()),
+        )
+
+    def record(self, category, stage, paper, summary=None):
+        """
+        记录单篇论文完成了某个阶段
+
+        Args:
+            category: 分类名称
+            stage: 阶段名称，见STAGES
+            paper: 论文数据
+            summary: summarized阶段的报告条目
+        """
+        failed = False
+        if stage == "downloaded":
+            data = {"pdf_path": paper.get("pdf_path")}
+        elif stage == "extracted":
+            data = {"full_text": read_text(paper.get("full_text")), "full_text_budget": paper.get("full_text_budget")}
+        elif stage == "summarized":
+            # 失败的总结同样记录，但带上失败标记，恢复运行时会重新总结
+            failed = bool(summary.get("failed"))
+            data = summary.to_dict()
+        else:
+            raise ValueError(f"未知的阶段: {stage}")
+
+        # 全文可能较长，压缩后保存
+        blob = zlib.compress(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO stages (run_id, category, arxiv_id, stage, data, failed, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.run_id, category, paper["arxiv_id"], stage, blob, int(failed), time.time()),
+            )
+        except sqlite3.Error as e:
+            print(f"保存检查点失败: {paper.get('arxiv_id')} {stage} - {str(e)}")
+
+    def restore(self, category, papers):
+        """
+        把已完成的阶段结果恢复到论文上
+
+        Args:
+            category: 分类名称
+            papers: 论文列表
+
+        Returns:
+            (仍需处理的论文列表, 已完成总结的报告条目列表)
+        """
+        rows = self._conn().execute(
+            "SELECT arxiv_id, stage, data FROM stages WHERE run_id = ? AND category = ? AND failed = 0",
+            (self.run_id, category),
+        ).fetchall()
+        completed = {}
+        for arxiv_id, stage, blob in rows:
+            completed.setdefault(arxiv_id, {})[stage] = json.loads(zlib.decompress(blob).decode('utf-8'))
+
+        pending = []
+        summaries = []
+        counts = dict.fromkeys(STAGES, 0)
+        for paper in papers:
+            stages = completed.get(paper["arxiv_id"], {})
+            if "summarized" in stages:
+                summaries.append(Summary.from_dict(stages["summarized"]))
+                counts["summarized"] += 1
+                continue
+            if "extracted" in stages:
+                paper.update(stages["extracted"])
+                counts["extracted"] += 1
+            if "downloaded" in stages and stages["downloaded"]["pdf_path"]:
+                paper.update(stages["downloaded"])
+                counts["downloaded"] += 1
+            pending.append(paper)
+
+        if rows:
+            print(f"从检查点恢复 {category}: 已总结 {counts['summarized']} 篇，已提取 {counts['extracted']} 篇，"
+                  f"已下载 {counts['downloaded']} 篇，剩余 {len(pending)} 篇待处理")
+        return pending, summaries
+
+    def for_category(self, category):
+        """返回绑定到某个分类的记录器，供流水线调用"""
+        return CategoryCheckpoint(self, category)
+
+
+class CategoryCheckpoint:
+    """绑定到单个分类的检查点记录器"""
+
+    def __init__(self, checkpoint, category):
+        self.checkpoint = checkpoint
+        self.category = category
+
+    def record(self, stage, paper, summary=None):
+        """记录单篇论文完成了某个阶段，参数同RunCheckpoint.record"""
+        self.checkpoint.record(self.category, stage, paper, summary)
@@ -0,0 +1,180 @@
+import re
+from rate_limiter import estimate_tokens
+
+# 章节标题的识别规则：(章节类型, 标题关键词正则)
+SECTION_PATTERNS = [
+    ("abstract", r"abstract"),
+    ("introduction", r"introduction"),
+    ("related", r"related\s+works?|background|preliminar(?:y|ies)|prior\s+work"),
+    ("method", r"methods?|methodology|approach|proposed\s+\w+|framework|model|our\s+method"),
+    ("experiments", r"experiments?|experimental\s+\w+|evaluation|results|setup|implementation\s+details"),
+    ("discussion", r"discussion|analysis|limitations|ablation\s+stud(?:y|ies)"),
+    ("conclusion", r"conclusions?|concluding\s+remarks|summary|future\s+work"),
+    ("acknowledgments", r"acknowledge?ments?"),
+    ("references", r"references|bibliography"),
+    ("appendix", r"appendix|appendices|supplementary\s+material"),
+]
+
+# 标题行：可选的编号（1 / 1. / 2.3 / IV. / A.）后接关键词，整行较短
+_HEADING_RE = re.compile(
+    r"^\s*(?:(?:\d+(?:\.\d+)*\.?|[IVX]+\.?|[A-H]\.)\s+)?(?P<title>"
+    + "|".join(f"(?P<{name}>{pattern})" for name, pattern in SECTION_PATTERNS)
+    + r")\b[\s:.]*$",
+    re.IGNORECASE,
+)
+
+# 各章节的保留优先级，数值越小越优先；不在表中的章节按正文处理
+SECTION_PRIORITY = {
+    "front": 0,
+    "abstract": 0,
+    "introduction": 1,
+    "conclusion": 2,
+    "method": 3,
+    "experiments": 4,
+    "discussion": 5,
+    "body": 6,
+    "related": 7,
+    "appendix": 8,
+}
+
+# 对总结没有帮助、总是丢弃的章节
+DROPPED_SECTIONS = {"references", "acknowledgments"}
+
+# 正文之后的章节，提取PDF时遇到这些标题即可停止解析后续页面
+TAIL_SECTIONS = ("references", "appendix")
+
+# 标题、作者等开头部分最多保留的字符数
+FRONT_MATTER_CHARS = 1500
+
+
+def heading_type(line):
+    """
+    识别章节标题行
+
+    Args:
+        line: 一行文本
+
+    Returns:
+        章节类型（见SECTION_PATTERNS），不是标题时返回None
+    """
+    match = _HEADING_RE.match(line) if len(line) <= 80 else None
+    if match is None:
+        return None
+    return next(name for name, _ in SECTION_PATTERNS if match.group(name))
+
+
+def split_sections(text):
+    """
+    按章节标题切分全文
+
+    Args:
+        text: 清理后的全文
+
+    Returns:
+        [(章节类型, 章节文本), ...]，第一个标题之前的内容类型为"front"
+    """
+    sections = []
+    current_name = "front"
+    current_lines = []
+
+    for line in text.split("\n"):
+        name = heading_type(line)
+        if name:
+            if current_lines:
+                sections.append((current_name, "\n".join(current_lines)))
+            current_name = name
+            current_lines = [line]
+        else:
+            current_lines.append(line)
+
+    if current_lines:
+        sections.append((current_name, "\n".join(current_lines)))
+
+    # 参考文献和附录之后出现的其他标题（如附录里的"Experiments"）仍属于附录
+    normalized = []
+    tail = None
+    for name, section_text in sections:
+        if name in ("references", "appendix"):
+            tail = name
+        elif tail is not None:
+            name = "appendix" if tail == "appendix" else "references"
+        elif name not in SECTION_PRIORITY and name not in DROPPED_SECTIONS:
+            name = "body"
+        normalized.append((name, section_text))
+    return normalized
+
+
+def _truncate_to_tokens(text, budget):
+    """按行截断文本，使其不超过budget个token"""
+    kept = []
+    used = 0
+    for line in text.split("\n"):
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept)
+
+
+def condense_text(text, token_budget):
+    """
+    按章节压缩全文：丢弃参考文献和致谢，按优先级保留摘要、引言、结论、方法、实验等章节，直到用完token预算
+
+    Args:
+        text: 清理后的全文
+        token_budget: token预算，0或None表示只丢弃参考文献和致谢
+
+    Returns:
+        (压缩后的文本, 统计信息字典，包含original_tokens、condensed_tokens和saved_tokens)
+    """
+    original_tokens = estimate_tokens(text)
+    sections = split_sections(text)
+
+    if len(sections) == 1 and sections[0][0] == "front":
+        # 没有识别出章节，直接截断
+        condensed = _truncate_to_tokens(text, token_budget) if token_budget and original_tokens > token_budget else text
+    else:
+        candidates = []
+        for index, (name, section_text) in enumerate(sections):
+            if name in DROPPED_SECTIONS:
+                continue
+            if name == "front":
+                section_text = section_text[:FRONT_MATTER_CHARS]
+            candidates.append((SECTION_PRIORITY.get(name, SECTION_PRIORITY["body"]), index, section_text))
+
+        kept = {}
+        remaining = token_budget if token_budget else None
+        # 同一优先级内按原文顺序保留
+        for _, index, section_text in sorted(candidates):
+            if remaining is None:
+                kept[index] = section_text
+                continue
+            cost = estimate_tokens(section_text)
+            if cost <= remaining:
+                kept[index] = section_text
+                remaining -= cost
+            else:
+                # 预算不足以保留整个章节时保留其开头部分，然后停止
+                partial = _truncate_to_tokens(section_text, remaining)
+                if partial.strip():
+                    kept[index] = partial + "\n[...]"
+                break
+
+        # 按原文顺序拼接，被省略的位置用[...]标记
+        parts = []
+        for index in range(len(sections)):
+            if index in kept:
+                parts.append(kept[index])
+            elif not parts or parts[-1] != "[...]":
+                parts.append("[...]")
+        while parts and parts[-1] == "[...]":
+            parts.pop()
+        condensed = "\n".join(parts)
+
+    condensed_tokens = estimate_tokens(condensed)
+    return condensed, {
+        "original_tokens": original_tokens,
+        "condensed_tokens": condensed_tokens,
+        "saved_tokens": max(0, original_tokens - condensed_tokens),
+    }
@@ -0,0 +1,275 @@
+from html import escape
+from collections import namedtuple
+
+# 邮件正文的中间表示：HTML和纯文本版本都从同一份数据渲染，字段已经格式化好，渲染时只需拼接
+DigestEntry = namedtuple("DigestEntry", [
+    "rating", "rating_class", "title", "authors", "arxiv_id", "published",
+    "triage_only", "relevance", "pdf_url", "abstract", "summary",
+])
+Digest = namedtuple("Digest", ["name", "description", "date", "model", "entries"])
+
+# 样式只在模块加载时生成一次
+_CSS = """
+        body {
+            font-family: 'Microsoft YaHei', Arial, sans-serif;
+            line-height: 1.6;
+            color: #333;
+            max-width: 800px;
+            margin: 0 auto;
+            padding: 20px;
+        }
+        .header {
+            background-color: #f8f9fa;
+            padding: 15px;
+            border-radius: 5px;
+            margin-bottom: 20px;
+            text-align: center;
+            border-left: 5px solid #4285f4;
+        }
+        .paper {
+            background-color: #ffffff;
+            border: 1px solid #e0e0e0;
+            border-radius: 5px;
+            padding: 15px;
+            margin-bottom: 20px;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.05);
+        }
+        .paper-title {
+            color: #4285f4;
+            font-size: 18px;
+            font-weight: bold;
+            margin-bottom: 10px;
+        }
+        .paper-meta {
+            color: #666;
+            font-size: 14px;
+            margin-bottom: 10px;
+        }
+        .paper-abstract {
+            background-color: #f0f8ff;
+            padding: 10px;
+            border-radius: 3px;
+            margin-bottom: 10px;
+        }
+        .paper-summary {
+            background-color: #f9f9f9;
+            padding: 10px;
+            border-radius: 3px;
+            margin-top: 10px;
+        }
+        details summary {
+            cursor: pointer;
+            font-weight: bold;
+        }
+        details p {
+            margin-top: 10px;
+            line-height: 1.5;
+        }
+        .paper-rating {
+            display: inline-block;
+            background-color: #4285f4;
+            color: white;
+            font-weight: bold;
+            padding: 3px 8px;
+            border-radius: 12px;
+            margin-right: 10px;
+            font-size: 14px;
+        }
+        .rating-high {
+            background-color: #0f9d58; /* 绿色 */
+        }
+        .rating-medium {
+            background-color: #4285f4; /* 蓝色 */
+        }
+        .rating-low {
+            background-color: #db4437; /* 红色 */
+        }
+        .footer {
+            margin-top: 30px;
+            padding-top: 15px;
+            border-top: 1px solid #e0e0e0;
+            font-size: 12px;
+            color: #777;
+            text-align: center;
+        }
+        a {
+            color: #4285f4;
+            text-decoration: none;
+        }
+        a:hover {
+            text-decoration: underline;
+        }
+        .divider {
+            border-top: 1px dashed #e0e0e0;
+            margin: 15px 0;
+        }
+"""
+
+# 预先编译的模板，渲染时直接调用绑定好的format方法
+_HTML_HEAD = ("""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <style>""" + _CSS.replace("{", "{{").replace("}", "}}") + """    </style>
+</head>
+<body>
+    <div class="header">
+        <h2>arXiv {name} - {date}</h2>
+        <p>{description}</p>
+    </div>
+""").format
+
+_HTML_PAPER = """    <div class="paper">
+        <div class="paper-title">
+            <span class="paper-rating {rating_class}">{rating}/100</span>
+            {title}
+        </div>
+        <div class="paper-meta">
+            <strong>作者：</strong>{authors}<br>
+            <strong>arXiv ID：</strong>{arxiv_id}<br>
+            <strong>发表日期：</strong>{published}<br>
+{extra_meta}            <strong>PDF链接：</strong><a href="{pdf_url}">{pdf_url}</a>
+        </div>
+        <div class="paper-abstract">
+            <details>
+                <summary>原文摘要</summary>
+                <p>{abstract}</p>
+            </details>
+        </div>
+        <div class="paper-summary">
+            <strong>总结：</strong><br>
+            {summary}
+        </div>
+    </div>
+""".format
+
+_HTML_TRIAGE = "            <strong>总结依据：</strong>仅根据摘要初筛<br>\n"
+_HTML_RELEVANCE = "            <strong>相关度：</strong>{}<br>\n".format
+
+_HTML_FOOT = """    <div class="footer">
+        <p>此邮件由arXiv论文自动总结系统发送，使用模型{model}总结，如有问题请联系管理员。</p>
+        <p>如需退订，请回复并注明'退订'。</p>
+    </div>
+</body>
+</html>
+""".format
+
+_TEXT_PAPER = ("评分：{rating}/100\n"
+               "标题：{title}\n"
+               "作者：{authors}\n"
+               "arXiv ID：{arxiv_id}\n"
+               "发表日期：{published}\n"
+               "{extra_meta}"
+               "PDF链接：{pdf_url}\n"
+               "\n原文摘要：\n{abstract}\n"
+               "\n总结：\n{summary}\n"
+               "\n" + "=" * 50 + "\n\n").format
+
+_TEXT_FOOT = ("\n\n此邮件由arXiv论文自动总结系统发送，使用模型{model}总结，\n如有问题请联系管理员（hukongyi@ihep.ac.cn）。\n"
+              "如需退订，请发送退订至此（hukongyi@ihep.ac.cn）并注明'退订'。\n").format
+
+
+def _rating_class(rating):
+    """根据评分决定样式类名"""
+    if rating >= 90:
+        return "rating-high"
+    if rating <= 60:
+        return "rating-low"
+    return "rating-medium"
+
+
+def build_digest(summaries, category_info, date, model):
+    """
+    把报告条目转换为邮件正文的中间表示
+
+    Args:
+        summaries: 报告条目列表（按评分排序）
+        category_info: 包含name和description的分类信息
+        date: 日期字符串
+        model: 总结使用的模型名称
+
+    Returns:
+        Digest
+    """
+    entries = []
+    for paper in summaries:
+        rating = paper.get('rating', 50)
+        relevance_score = paper.get('relevance_score')
+        entries.append(DigestEntry(
+            rating=rating,
+            rating_class=_rating_class(rating),
+            title=paper['title'],
+            authors=', '.join(paper['authors']),
+            arxiv_id=paper['arxiv_id'],
+            published=paper['published'],
+            triage_only=bool(paper.get('triage_only')),
+            relevance=f"{relevance_score:.3f}" if relevance_score is not None else None,
+            pdf_url=paper['pdf_url'],
+            abstract=paper.get('abstract', '无摘要'),
+            summary=paper['summary'],
+        ))
+    return Digest(category_info['name'], category_info.get('description', ''), date, model, entries)
+
+
+def render_html(digest):
+    """
+    渲染HTML正文，所有来自论文和模型的文本都经过转义
+
+    Args:
+        digest: build_digest返回的中间表示
+
+    Returns:
+        HTML字符串
+    """
+    parts = [_HTML_HEAD(name=escape(digest.name), date=escape(digest.date),
+                        description=escape(digest.description))]
+    append = parts.append
+    for entry in digest.entries:
+        extra_meta = _HTML_TRIAGE if entry.triage_only else ""
+        if entry.relevance is not None:
+            extra_meta += _HTML_RELEVANCE(entry.relevance)
+        append(_HTML_PAPER(
+            rating_class=entry.rating_class,
+            rating=entry.rating,
+            title=escape(entry.title, quote=False),
+            authors=escape(entry.authors, quote=False),
+            arxiv_id=escape(entry.arxiv_id, quote=False),
+            published=escape(entry.published, quote=False),
+            extra_meta=extra_meta,
+            pdf_url=escape(entry.pdf_url),
+            abstract=escape(entry.abstract, quote=False),
+            summary=escape(entry.summary, quote=False).replace("\n", "<br>").replace("  ", "&nbsp;"),
+        ))
+    append(_HTML_FOOT(model=escape(digest.model)))
+    return "".join(parts)
+
+
+def render_text(digest):
+    """
+    渲染纯文本正文（作为HTML的备用）
+
+    Args:
+        digest: build_digest返回的中间表示
+
+    Returns:
+        纯文本字符串
+    """
+    parts = ["今日论文总结（按评分排序）：\n\n"]
+    append = parts.append
+    for entry in digest.entries:
+        extra_meta = "总结依据：仅根据摘要初筛\n" if entry.triage_only else ""
+        if entry.relevance is not None:
+            extra_meta += f"相关度：{entry.relevance}\n"
+        append(_TEXT_PAPER(
+            rating=entry.rating,
+            title=entry.title,
+            authors=entry.authors,
+            arxiv_id=entry.arxiv_id,
+            published=entry.published,
+            extra_meta=extra_meta,
+            pdf_url=entry.pdf_url,
+            abstract=entry.abstract,
+            summary=entry.summary,
+        ))
+    append(_TEXT_FOOT(model=digest.model))
+    return "".join(parts)
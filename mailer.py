@@ -0,0 +1,147 @@
+import smtplib
+import time
+from metrics import metrics
+
+# 支持的连接方式：ssl（隐式TLS，通常为465端口）、starttls（通常为587端口）、plain（不加密，仅用于本地测试用的SMTP服务）
+SMTP_SECURITY_MODES = ("ssl", "starttls", "plain")
+
+
+class Mailer:
+    """在一次运行中复用同一个已登录的SMTP连接发送所有分类的邮件，只有发送失败时才重新连接"""
+
+    def __init__(self, smtp_server, smtp_port, sender_email, sender_password, security="ssl",
+                 fallback_port=587, timeout=30, max_attempts=2):
+        """
+        初始化邮件发送器，连接在第一次发送时才建立
+
+        Args:
+            smtp_server: SMTP服务器地址
+            smtp_port: SMTP端口
+            sender_email: 登录用的发件人邮箱
+            sender_password: 邮箱授权码，为空时不登录（本地测试用的SMTP服务）
+            security: 连接方式，见SMTP_SECURITY_MODES
+            fallback_port: 主端口连接失败时改用STARTTLS连接的备用端口，0表示不使用
+            timeout: 网络操作超时（秒）
+            max_attempts: 单封邮件最多尝试的次数，每次失败后重新连接
+        """
+        if security not in SMTP_SECURITY_MODES:
+            raise ValueError(f"未知的SMTP连接方式: {security}，可选: {', '.join(SMTP_SECURITY_MODES)}")
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.sender_email = sender_email
+        self.sender_password = sender_password
+        self.security = security
+        self.fallback_port = fallback_port
+        self.timeout = timeout
+        self.max_attempts = max(1, max_attempts)
+        self._server = None
+
+        # 发送统计
+        self.connections = 0
+        self.failures = 0
+        self.latencies = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _open(self, port, security):
+        """建立连接并登录"""
+        if security == "ssl":
+            server = smtplib.SMTP_SSL(self.smtp_server, port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.smtp_server, port, timeout=self.timeout)
+            if security == "starttls":
+                server.starttls()
+        try:
+            if self.sender_password:
+                server.login(self.sender_email, self.sender_password)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def _connect(self):
+        """连接主端口，失败时改用备用端口"""
+        start = time.perf_counter()
+        try:
+            self._server = self._open(self.smtp_port, self.security)
+        except Exception as e:
+            if not self.fallback_port or self.security == "plain" or (
+                    self.fallback_port == self.smtp_port and self.security == "starttls"):
+                raise
+            print(f"连接SMTP服务器失败：{str(e)}，尝试使用备用端口 {self.fallback_port}...")
+            self._server = self._open(self.fallback_port, "starttls")
+        self.connections += 1
+        metrics.inc("smtp_connections_total")
+        print(f"已连接SMTP服务器 {self.smtp_server}，耗时 {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def _disconnect(self):
+        """丢弃当前连接（连接可能已经断开，不等待服务器响应）"""
+        if self._server is not None:
+            try:
+                self._server.close()
+            except Exception:
+                pass
+            self._server = None
+
+    def send(self, from_addr, to_addrs, payload):
+        """
+        发送一封已序列化的邮件
+
+        Args:
+            from_addr: 信封发件人
+            to_addrs: 收件人列表
+            payload: 邮件内容（bytes或str）
+
+        Returns:
+            bool: 是否发送成功
+        """
+        for attempt in range(self.max_attempts):
+            try:
+                if self._server is None:
+                    self._connect()
+                start = time.perf_counter()
+                self._server.sendmail(from_addr, to_addrs, payload)
+            except Exception as e:
+                print(f"邮件发送失败（尝试 {attempt + 1}/{self.max_attempts}）：{str(e)}")
+                if attempt + 1 < self.max_attempts:
+                    metrics.inc("retries_total", stage="email")
+                # 连接可能已被服务器断开（空闲超时、限流等），下次尝试时重新连接
+                self._disconnect()
+                continue
+
+            latency = time.perf_counter() - start
+            self.latencies.append(latency)
+            metrics.observe("stage_seconds", latency, stage="email")
+            metrics.inc("emails_total", result="sent")
+            print(f"邮件发送成功！耗时 {latency * 1000:.0f} ms")
+            return True
+
+        self.failures += 1
+        metrics.inc("emails_total", result="failed")
+        print("请检查邮箱配置和授权码是否正确")
+        return False
+
+    def close(self):
+        """结束会话"""
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+    def report(self):
+        """打印本次运行的发送统计"""
+        if not self.latencies and not self.failures:
+            return
+        latencies = sorted(self.latencies)
+        if latencies:
+            average = sum(latencies) / len(latencies) * 1000
+            print(f"邮件统计: 成功 {len(latencies)} 封，失败 {self.failures} 封，建立连接 {self.connections} 次，"
+                  f"平均耗时 {average:.0f} ms，最长 {latencies[-1] * 1000:.0f} ms")
+        else:
+            print(f"邮件统计: 成功 0 封，失败 {self.failures} 封，建立连接 {self.connections} 次")
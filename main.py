@@ -1,6 +1,6 @@
-import schedule
+import argparse
+import math
 import time
-import smtplib
 import os
 import shutil
 from email.mime.text import MIMEText
@@ -8,27 +8,48 @@ from email.mime.multipart import MIMEMultipart
 from email.header import Header
 from email.utils import formataddr
 from datetime import datetime
-from arxiv_scraper import ArxivScraper
-from summarizer import PaperSummarizer
-from parallel_summarizer import ParallelPaperSummarizer, BatchParallelPaperSummarizer
-from pdf_downloader import PDFDownloader
-from pdf_extractor import PDFExtractor
+from pipeline import PaperPipeline
+from triage import PaperTriage
+from checkpoint import RunCheckpoint
+from digest_renderer import build_digest, render_html, render_text
+from mailer import Mailer
+from metrics import metrics
+from text_cache import TextCache
+from text_spool import TextSpool
+from summary_cache import SummaryCache
 from config import (
     EMAIL_CONFIG, SCHEDULE_TIME, DEBUG_MODE, DAYS_BACK,
     GEMINI_MODEL, ARXIV_CONFIG, DOWNLOAD_PDFS, FULL_TEXT_ANALYSIS,
-    PDF_MAX_PAGES, PDF_BASE_DIR, PDF_DB_FILE, USE_OCR_FALLBACK, ORGANIZE_BY_DATE,
-    USE_PARALLEL, USE_BATCH_PARALLEL, MAX_WORKERS, BATCH_SIZE
+    PDF_MAX_PAGES, PDF_STOP_AT_REFERENCES, PDF_MAX_CHARS, PDF_EXTRACT_WORKERS, PDF_EXTRACT_TIMEOUT, PDF_BASE_DIR, PDF_DB_FILE, USE_OCR_FALLBACK, OCR_DPI, OCR_WORKERS, ORGANIZE_BY_DATE,
+    FULL_TEXT_CONDENSE, FULL_TEXT_TOKEN_BUDGET,
+    TEXT_CACHE_ENABLED, TEXT_CACHE_DIR, TEXT_CACHE_MAX_MB, TEXT_SPOOL_ENABLED, TEXT_SPOOL_DIR,
+    SUMMARY_CACHE_ENABLED, SUMMARY_CACHE_FILE, SUMMARY_CACHE_TTL_DAYS,
+    SUMMARY_CACHE_MAX_ENTRIES, SUMMARY_CACHE_REFRESH,
+    USE_PARALLEL, USE_BATCH_PARALLEL, MAX_WORKERS, BATCH_SIZE,
+    USE_PIPELINE, PIPELINE_DOWNLOAD_WORKERS, PIPELINE_EXTRACT_WORKERS,
+    PIPELINE_SUMMARIZE_WORKERS, PIPELINE_QUEUE_SIZE,
+    TRIAGE_ENABLED, TRIAGE_MODEL, TRIAGE_TOP_K, TRIAGE_MIN_RATING,
+    RELEVANCE_ENABLED, RELEVANCE_KEYWORDS, RELEVANCE_AUTHORS, RELEVANCE_SEED_FILE, RELEVANCE_STATE_FILE,
+    RELEVANCE_HASH_BITS, RELEVANCE_MIN_SCORE, RELEVANCE_MAX_PAPERS, RELEVANCE_ACTION, ARXIV_WATERMARK_OVERLAP_HOURS,
+    CHECKPOINT_ENABLED, CHECKPOINT_FILE, CHECKPOINT_KEEP_DAYS,
+    METRICS_ENABLED, METRICS_REPORT_DIR, METRICS_PROMETHEUS_FILE,
+    apply_proxy
 )
 
 
-def send_email(summaries, category_info):
+def send_email(summaries, category_info, mailer=None):
     """发送邮件
 
     Args:
         summaries (list): 论文总结列表
         category_info (dict): 包含category name和description的字典
+        mailer (Mailer): 复用的邮件发送器，None表示单独建立连接发送
+
+    Returns:
+        bool: 是否发送成功
     """
     msg = MIMEMultipart("alternative")
+    today = datetime.now().strftime('%Y-%m-%d')
 
     sender_name = "arXiv论文助手"
     sender_email = EMAIL_CONFIG["sender_email"]
@@ -44,7 +65,7 @@ def send_email(summaries, category_info):
 
     # 修改邮件主题，加入分类信息
     msg["Subject"] = Header(
-        f"arXiv {category_info['name']} - {datetime.now().strftime('%Y-%m-%d')}",
+        f"arXiv {category_info['name']} - {today}",
         "utf-8"
     )
 
@@ -55,296 +76,368 @@ def send_email(summaries, category_info):
     msg["X-Mailer"] = "arXiv Paper Summarizer"
     msg["List-Unsubscribe"] = f"<mailto:{sender_email}?subject=unsubscribe>"
 
-    # 修改HTML内容头部，加入分类描述
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="utf-8">
-        <style>
-            body {{
-                font-family: 'Microsoft YaHei', Arial, sans-serif;
-                line-height: 1.6;
-                color: #333;
-                max-width: 800px;
-                margin: 0 auto;
-                padding: 20px;
-            }}
-            .header {{
-                background-color: #f8f9fa;
-                padding: 15px;
-                border-radius: 5px;
-                margin-bottom: 20px;
-                text-align: center;
-                border-left: 5px solid #4285f4;
-            }}
-            .paper {{
-                background-color: #ffffff;
-                border: 1px solid #e0e0e0;
-                border-radius: 5px;
-                padding: 15px;
-                margin-bottom: 20px;
-                box-shadow: 0 2px 4px rgba(0,0,0,0.05);
-            }}
-            .paper-title {{
-                color: #4285f4;
-                font-size: 18px;
-                font-weight: bold;
-                margin-bottom: 10px;
-            }}
-            .paper-meta {{
-                color: #666;
-                font-size: 14px;
-                margin-bottom: 10px;
-            }}
-            .paper-abstract {{
-                background-color: #f0f8ff;
-                padding: 10px;
-                border-radius: 3px;
-                margin-bottom: 10px;
-            }}
-            .paper-summary {{
-                background-color: #f9f9f9;
-                padding: 10px;
-                border-radius: 3px;
-                margin-top: 10px;
-            }}
-            details summary {{
-                cursor: pointer;
-                font-weight: bold;
-            }}
-            details p {{
-                margin-top: 10px;
-                line-height: 1.5;
-            }}
-            .paper-rating {{
-                display: inline-block;
-                background-color: #4285f4;
-                color: white;
-                font-weight: bold;
-                padding: 3px 8px;
-                border-radius: 12px;
-                margin-right: 10px;
-                font-size: 14px;
-            }}
-            .rating-high {{
-                background-color: #0f9d58; /* 绿色 */
-            }}
-            .rating-medium {{
-                background-color: #4285f4; /* 蓝色 */
-            }}
-            .rating-low {{
-                background-color: #db4437; /* 红色 */
-            }}
-            .footer {{
-                margin-top: 30px;
-                padding-top: 15px;
-                border-top: 1px solid #e0e0e0;
-                font-size: 12px;
-                color: #777;
-                text-align: center;
-            }}
-            a {{
-                color: #4285f4;
-                text-decoration: none;
-            }}
-            a:hover {{
-                text-decoration: underline;
-            }}
-            .divider {{
-                border-top: 1px dashed #e0e0e0;
-                margin: 15px 0;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h2>arXiv {category_info['name']} - {datetime.now().strftime('%Y-%m-%d')}</h2>
-            <p>{category_info.get('description', '')}</p>
-        </div>
-    """
-
-    for paper in summaries:
-        summary = paper["summary"].replace("\n", "<br>").replace("  ", "&nbsp;")
-
-        # 根据评分决定样式类名
-        rating = paper.get('rating', 50)
-        rating_class = "rating-medium"
-        if rating >= 90:
-            rating_class = "rating-high"
-        elif rating <= 60:
-            rating_class = "rating-low"
-
-        html_content += f"""
-        <div class="paper">
-            <div class="paper-title">
-                <span class="paper-rating {rating_class}">{rating}/100</span>
-                {paper['title']}
-            </div>
-            <div class="paper-meta">
-                <strong>作者：</strong>{', '.join(paper['authors'])}<br>
-                <strong>arXiv ID：</strong>{paper['arxiv_id']}<br>
-                <strong>发表日期：</strong>{paper['published']}<br>
-                <strong>PDF链接：</strong><a href="{paper['pdf_url']}">{paper['pdf_url']}</a>
-            </div>
-            <div class="paper-abstract">
-                <details>
-                    <summary>原文摘要</summary>
-                    <p>{paper.get('abstract', '无摘要')}</p>
-                </details>
-            </div>
-            <div class="paper-summary">
-                <strong>总结：</strong><br>
-                {summary}
-            </div>
-        </div>
-        """
-
-    html_content += f"""
-        <div class="footer">
-            <p>此邮件由arXiv论文自动总结系统发送，使用模型{GEMINI_MODEL}总结，如有问题请联系管理员。</p>
-            <p>如需退订，请回复并注明'退订'。</p>
-        </div>
-    </body>
-    </html>
-    """
-
-    # html_content += f"""
-    #     <div class="footer">
-    #         <p>此邮件由arXiv论文自动总结系统发送，使用模型{GEMINI_MODEL}总结，如有问题请联系管理员（<a href="mailto:hukongyi@ihep.ac.cn">hukongyi@ihep.ac.cn</a>）。</p>
-    #         <p>如需退订，请发送退订至<a href="mailto:hukongyi@ihep.ac.cn">hukongyi@ihep.ac.cn</a>并注明'退订'。</p>
-    #     </div>
-    # </body>
-    # </html>
-    # """
-
-    # 添加纯文本版本（作为备用）
-    text_content = "今日论文总结（按评分排序）：\n\n"
-    for paper in summaries:
-        rating = paper.get('rating', 50)
-        text_content += f"评分：{rating}/100\n"
-        text_content += f"标题：{paper['title']}\n"
-        text_content += f"作者：{', '.join(paper['authors'])}\n"
-        text_content += f"arXiv ID：{paper['arxiv_id']}\n"
-        text_content += f"发表日期：{paper['published']}\n"
-        text_content += f"PDF链接：{paper['pdf_url']}\n"
-        text_content += f"\n原文摘要：\n{paper.get('abstract', '无摘要')}\n"
-        text_content += f"\n总结：\n{paper['summary']}\n"
-        text_content += "\n" + "=" * 50 + "\n\n"
-
-    # 添加免责声明
-    text_content += f"\n\n此邮件由arXiv论文自动总结系统发送，使用模型{GEMINI_MODEL}总结，\n如有问题请联系管理员（hukongyi@ihep.ac.cn）。\n"
-    text_content += "如需退订，请发送退订至此（hukongyi@ihep.ac.cn）并注明'退订'。\n"
+    # HTML和纯文本版本从同一份中间表示渲染
+    digest = build_digest(summaries, category_info, today, GEMINI_MODEL)
+    html_content = render_html(digest)
+    text_content = render_text(digest)
 
     # 添加HTML和纯文本版本
     msg.attach(MIMEText(text_content, "plain", "utf-8"))
     msg.attach(MIMEText(html_content, "html", "utf-8"))
 
-    try:
-        # 使用SSL连接
-        server = smtplib.SMTP_SSL(
-            EMAIL_CONFIG["smtp_server"], EMAIL_CONFIG["smtp_port"]
-        )
-        server.login(EMAIL_CONFIG["sender_email"], EMAIL_CONFIG["sender_password"])
+    # 邮件只序列化一次，重新连接后重试时复用
+    payload = msg.as_bytes()
+    recipients = receiver_emails if isinstance(receiver_emails, list) else [receiver_emails]
+
+    if mailer is not None:
+        return mailer.send(sender_email, recipients, payload)
+    with create_mailer() as mailer:
+        return mailer.send(sender_email, recipients, payload)
+
+
+def create_mailer():
+    """根据邮件配置创建发送器，一次运行中所有分类的邮件共用同一个连接"""
+    return Mailer(
+        EMAIL_CONFIG["smtp_server"],
+        EMAIL_CONFIG["smtp_port"],
+        EMAIL_CONFIG["sender_email"],
+        EMAIL_CONFIG["sender_password"],
+        security=EMAIL_CONFIG["security"],
+        fallback_port=EMAIL_CONFIG["fallback_port"],
+        timeout=EMAIL_CONFIG["timeout"],
+    )
 
-        # 发送给所有收件人
-        if isinstance(receiver_emails, list):
-            server.sendmail(sender_email, receiver_emails, msg.as_string())
-        else:
-            server.send_message(msg)
-
-        server.quit()
-        print("邮件发送成功！")
-    except Exception as e:
-        print(f"邮件发送失败：{str(e)}")
-        # 尝试使用备用端口
-        try:
-            print("尝试使用备用端口发送...")
-            server = smtplib.SMTP(EMAIL_CONFIG["smtp_server"], 587)
-            server.starttls()
-            server.login(EMAIL_CONFIG["sender_email"], EMAIL_CONFIG["sender_password"])
-
-            # 发送给所有收件人
-            if isinstance(receiver_emails, list):
-                server.sendmail(sender_email, receiver_emails, msg.as_string())
-            else:
-                server.send_message(msg)
 
-            server.quit()
-            print("使用备用端口发送成功！")
-        except Exception as e2:
-            print(f"备用端口发送也失败：{str(e2)}")
-            print("请检查邮箱配置和授权码是否正确")
+def write_metrics(run_date=None):
+    """写入本次运行的JSON报告，配置了Prometheus文件时同时写入"""
+    started = datetime.fromtimestamp(metrics.started_at)
+    report_file = os.path.join(METRICS_REPORT_DIR, f"run-{started.strftime('%Y%m%d-%H%M%S')}.json")
+    try:
+        metrics.write_json(report_file, run_date=run_date or started.strftime('%Y-%m-%d'))
+        print(f"运行报告已保存: {report_file}")
+        if METRICS_PROMETHEUS_FILE:
+            metrics.write_prometheus(METRICS_PROMETHEUS_FILE)
+    except OSError as e:
+        print(f"保存运行报告失败: {str(e)}")
+
 
+def run_task(run_date=None):
+    """执行任务
 
-def run_task():
-    """执行任务"""
+    Args:
+        run_date (str): 要恢复的运行日期（YYYY-MM-DD），None表示今天
+    """
     print(f"开始执行任务 - {datetime.now()}")
+    metrics.reset()
+
+    # 依赖arxiv、google-genai、PyMuPDF、numpy等重量级库的模块在用到时才导入，导入main本身保持轻量
+    from arxiv_scraper import ArxivScraper
+    from summarizer import PaperSummarizer
 
     # 初始化组件
     scraper = ArxivScraper()
 
+    # 检查点：今天的运行中断后重启时跳过已完成的阶段，指定日期时恢复该日期的运行，否则开始新的运行
+    checkpoint = None
+    if CHECKPOINT_ENABLED or run_date:
+        checkpoint = RunCheckpoint(CHECKPOINT_FILE, run_date=run_date, keep_days=CHECKPOINT_KEEP_DAYS)
+        if checkpoint.resumed:
+            print(f"继续 {checkpoint.run_date} 未完成的运行: {checkpoint.run_id}")
+        else:
+            print(f"开始新的运行: {checkpoint.run_id}")
+
+    # 本地相关度预筛选，不调用任何API
+    relevance_filter = None
+    if RELEVANCE_ENABLED:
+        from relevance import RelevanceFilter, load_seed_texts
+        relevance_filter = RelevanceFilter(
+            keywords=RELEVANCE_KEYWORDS,
+            authors=RELEVANCE_AUTHORS,
+            seed_texts=load_seed_texts(RELEVANCE_SEED_FILE),
+            state_file=RELEVANCE_STATE_FILE,
+            hash_bits=RELEVANCE_HASH_BITS,
+            min_score=RELEVANCE_MIN_SCORE,
+            max_papers=RELEVANCE_MAX_PAPERS,
+            action=RELEVANCE_ACTION,
+            # 重复获取只发生在回看窗口内：首次获取的天数，或水位线向前回看的小时数
+            id_window_days=max(DAYS_BACK, math.ceil(ARXIV_WATERMARK_OVERLAP_HOURS / 24)) + 1,
+        )
+
+    summary_cache = None
+    if SUMMARY_CACHE_ENABLED:
+        summary_cache = SummaryCache(
+            SUMMARY_CACHE_FILE,
+            ttl_days=SUMMARY_CACHE_TTL_DAYS,
+            max_entries=SUMMARY_CACHE_MAX_ENTRIES,
+            refresh=SUMMARY_CACHE_REFRESH,
+        )
+        if SUMMARY_CACHE_REFRESH:
+            print("已启用强制刷新，本次运行将忽略已有的总结缓存")
+
     # 选择要使用的总结器
     if USE_PARALLEL:
+        from parallel_summarizer import ParallelPaperSummarizer, BatchParallelPaperSummarizer
         if USE_BATCH_PARALLEL:
             print(f"使用批处理并行总结器，批大小: {BATCH_SIZE}, 最大线程数: {MAX_WORKERS if MAX_WORKERS > 0 else '自动'}")
-            summarizer = BatchParallelPaperSummarizer(max_workers=MAX_WORKERS or None, batch_size=BATCH_SIZE)
+            summarizer = BatchParallelPaperSummarizer(
+                max_workers=MAX_WORKERS or None, batch_size=BATCH_SIZE, summary_cache=summary_cache
+            )
         else:
             print(f"使用并行总结器，最大线程数: {MAX_WORKERS if MAX_WORKERS > 0 else '自动'}")
-            summarizer = ParallelPaperSummarizer(max_workers=MAX_WORKERS or None)
+            summarizer = ParallelPaperSummarizer(max_workers=MAX_WORKERS or None, summary_cache=summary_cache)
     else:
         print("使用串行总结器")
-        summarizer = PaperSummarizer()
+        summarizer = PaperSummarizer(summary_cache=summary_cache)
+
+    # 初筛只看摘要，使用更快的模型，只有排名靠前的论文才下载PDF并做全文分析
+    triage = None
+    if TRIAGE_ENABLED:
+        print(f"启用两级筛选，初筛模型: {TRIAGE_MODEL}，全文分析前 {TRIAGE_TOP_K or '全部'} 篇"
+              f"（初筛评分不低于 {TRIAGE_MIN_RATING}）")
+        if USE_PARALLEL:
+            triage_summarizer = ParallelPaperSummarizer(
+                max_workers=MAX_WORKERS or None, summary_cache=summary_cache, model=TRIAGE_MODEL
+            )
+        else:
+            triage_summarizer = PaperSummarizer(summary_cache=summary_cache, model=TRIAGE_MODEL)
+        triage = PaperTriage(triage_summarizer, top_k=TRIAGE_TOP_K, min_rating=TRIAGE_MIN_RATING)
 
     pdf_downloader = None
     pdf_extractor = None
+    text_spool = None
 
     # 如果启用了PDF下载和分析
     if DOWNLOAD_PDFS:
+        from pdf_downloader import PDFDownloader
+        from pdf_extractor import PDFExtractor
         pdf_downloader = PDFDownloader(base_dir=PDF_BASE_DIR, db_file=PDF_DB_FILE)
-        pdf_extractor = PDFExtractor(ocr_fallback=USE_OCR_FALLBACK, max_pages=PDF_MAX_PAGES)
+        if FULL_TEXT_ANALYSIS and TEXT_SPOOL_ENABLED:
+            text_spool = TextSpool(TEXT_SPOOL_DIR)
+        pdf_extractor = PDFExtractor(
+            ocr_fallback=USE_OCR_FALLBACK,
+            ocr_dpi=OCR_DPI,
+            ocr_workers=OCR_WORKERS,
+            max_pages=PDF_MAX_PAGES,
+            stop_at_references=PDF_STOP_AT_REFERENCES,
+            max_chars=PDF_MAX_CHARS,
+            workers=PDF_EXTRACT_WORKERS or os.cpu_count() or 1,
+            timeout=PDF_EXTRACT_TIMEOUT or None,
+            text_cache=TextCache(TEXT_CACHE_DIR, TEXT_CACHE_MAX_MB * 1024 * 1024) if TEXT_CACHE_ENABLED else None,
+            token_budget=FULL_TEXT_TOKEN_BUDGET if FULL_TEXT_CONDENSE else None,
+            text_spool=text_spool,
+        )
+
+    pipeline = None
+    if USE_PIPELINE:
+        pipeline = PaperPipeline(
+            summarizer,
+            pdf_downloader=pdf_downloader,
+            pdf_extractor=pdf_extractor,
+            download_workers=PIPELINE_DOWNLOAD_WORKERS,
+            # 提取线程只负责把PDF交给进程池，线程数不少于进程数才能用满所有进程
+            extract_workers=max(PIPELINE_EXTRACT_WORKERS, pdf_extractor.workers if pdf_extractor else 1),
+            summarize_workers=PIPELINE_SUMMARIZE_WORKERS or None,
+            queue_size=PIPELINE_QUEUE_SIZE,
+        )
 
+    mailer = create_mailer()
+    success = False
     try:
-        # 为每个搜索主题获取并发送论文
+        # 恢复运行时使用检查点中当时获取的论文，不再重新请求arXiv
+        restored = {}
+        to_fetch = []
         for search_query in ARXIV_CONFIG["search_queries"]:
-            print(f"处理分类: {search_query['name']}")
+            category = search_query['name']
+            if checkpoint and checkpoint.is_done(category):
+                continue
+            fetched = checkpoint.load_fetch(category) if checkpoint else None
+            if fetched is not None:
+                restored[category] = fetched
+            elif not run_date:
+                to_fetch.append(search_query)
+
+        # 其余分类的论文并发获取
+        fetched_papers = {}
+        cross_listed = {}
+        if to_fetch:
+            with metrics.timer("phase_seconds", phase="fetch", category="all"):
+                fetched_papers = scraper.fetch_all(to_fetch, days_back=DAYS_BACK)
+            # 同时属于多个分类的论文只在第一个分类中做相关性筛选、初筛和总结
+            fetched_papers, cross_listed = scraper.split_cross_listed(fetched_papers)
+
+        # 之后的分类按去掉版本号的arXiv ID直接复用已有的总结
+        shared_summaries = {}
+        relevant_ids = set()
+
+        # 为每个搜索主题处理并发送论文
+        for search_query in ARXIV_CONFIG["search_queries"]:
+            category = search_query['name']
+            print(f"处理分类: {category}")
 
-            # 获取该主题的论文
-            papers = scraper.get_papers(search_query, days_back=DAYS_BACK)
+            if checkpoint and checkpoint.is_done(category):
+                print(f"{category} 已在运行 {checkpoint.run_id} 中处理完成，跳过")
+                continue
 
-            if not papers:
-                print(f"{search_query['name']} 今日没有新论文")
+            if run_date and category not in restored:
+                # 恢复运行只重做检查点中已有获取结果的分类，其余分类的论文属于今天的运行
+                print(f"检查点中没有 {category} 在 {run_date} 获取的论文，恢复运行时跳过")
                 continue
 
-            # 如果启用了PDF下载和分析
-            if DOWNLOAD_PDFS and pdf_downloader and pdf_extractor:
-                print("开始下载论文PDF...")
-                # 下载PDF
-                papers = pdf_downloader.download_papers(papers)
+            if category in restored:
+                papers, pending_watermark = restored.pop(category)
+                scraper.restore_pending(search_query, pending_watermark)
+                print(f"从检查点读取 {category} 的 {len(papers)} 篇论文")
+            else:
+                papers = fetched_papers.pop(category)
+                shared = cross_listed.pop(category, [])
+                metrics.inc("papers_total", len(papers) + len(shared), category=category, stage="fetched")
+                if papers and relevance_filter:
+                    with metrics.timer("phase_seconds", phase="relevance", category=category):
+                        papers = relevance_filter.filter(papers)
+                relevant_ids.update(ArxivScraper.base_id(paper['arxiv_id']) for paper in papers)
+                # 跨分类论文沿用第一个分类的筛选结果，在之前的分类中被过滤掉的不再处理
+                papers = papers + [paper for paper in shared if ArxivScraper.base_id(paper['arxiv_id']) in relevant_ids]
+                if checkpoint:
+                    checkpoint.save_fetch(category, papers, scraper.get_pending(search_query))
 
-                # 提取PDF文本
-                print("开始提取PDF文本...")
-                papers = pdf_extractor.process_papers(papers)
+            if not papers:
+                print(f"{category} 今日没有新论文")
+                # 没有需要发送的论文同样视为处理完成，推进水位线，否则之后每次运行都要重新获取越来越长的时间窗口
+                if checkpoint:
+                    checkpoint.mark_done(category)
+                if not run_date:
+                    scraper.commit_watermark(search_query)
+                continue
 
-            # 生成总结
-            summaries = summarizer.generate_daily_report(papers)
+            # 跳过已完成总结的论文，已下载、已提取的论文不再重复处理
+            done_summaries = []
+            category_checkpoint = None
+            if checkpoint:
+                papers, done_summaries = checkpoint.restore(category, papers)
+                category_checkpoint = checkpoint.for_category(category)
+
+            reused_summaries = [shared_summaries[ArxivScraper.base_id(paper['arxiv_id'])] for paper in papers
+                                if ArxivScraper.base_id(paper['arxiv_id']) in shared_summaries]
+            if reused_summaries:
+                print(f"{len(reused_summaries)} 篇论文已在之前的分类中处理，直接复用总结")
+                papers = [paper for paper in papers if ArxivScraper.base_id(paper['arxiv_id']) not in shared_summaries]
+                if category_checkpoint:
+                    for summary in reused_summaries:
+                        category_checkpoint.record("summarized", summary, summary)
+
+            triage_summaries = []
+            if triage and papers:
+                with metrics.timer("phase_seconds", phase="triage", category=category):
+                    papers, triage_summaries = triage.run(papers)
+                if category_checkpoint:
+                    for summary in triage_summaries:
+                        category_checkpoint.record("summarized", summary, summary)
 
-            # 发送邮件
-            send_email(summaries, search_query)
+            if not papers:
+                summaries = []
+            elif pipeline:
+                # 下载、提取和总结流水线并行执行
+                with metrics.timer("phase_seconds", phase="pipeline", category=category):
+                    summaries = pipeline.run(papers, checkpoint=category_checkpoint)
+            else:
+                # 如果启用了PDF下载和分析
+                if DOWNLOAD_PDFS and pdf_downloader and pdf_extractor:
+                    print("开始下载论文PDF...")
+                    # 下载PDF
+                    with metrics.timer("phase_seconds", phase="download", category=category):
+                        papers = pdf_downloader.download_papers(papers)
+                    if category_checkpoint:
+                        for paper in papers:
+                            if paper.get('pdf_path'):
+                                category_checkpoint.record("downloaded", paper)
+
+                    # 提取PDF文本
+                    print("开始提取PDF文本...")
+                    with metrics.timer("phase_seconds", phase="extract", category=category):
+                        papers = pdf_extractor.process_papers(papers)
+                    if category_checkpoint:
+                        for paper in papers:
+                            if paper.get('full_text'):
+                                category_checkpoint.record("extracted", paper)
+
+                # 生成总结
+                with metrics.timer("phase_seconds", phase="summarize", category=category):
+                    summaries = summarizer.generate_daily_report(papers)
+                if category_checkpoint:
+                    for summary in summaries:
+                        category_checkpoint.record("summarized", summary, summary)
+
+            # 合并本次总结、初筛总结、检查点中已完成的总结和其他分类中的总结，按评分从高到低排序
+            summaries = summaries + triage_summaries + done_summaries + reused_summaries
+            summaries.sort(key=lambda x: x.get("rating", 0), reverse=True)
+            for summary in summaries:
+                # 失败的总结不复用，之后的分类会重新处理
+                if not summary.get("failed"):
+                    shared_summaries.setdefault(ArxivScraper.base_id(summary['arxiv_id']), summary)
+            metrics.inc("papers_total", len(summaries), category=category, stage="summarized")
+
+            # 发送邮件，发送成功后才推进水位线，失败时下次运行会重新获取这些论文
+            with metrics.timer("phase_seconds", phase="email", category=category):
+                sent = send_email(summaries, search_query, mailer)
+            if sent:
+                if checkpoint:
+                    checkpoint.mark_done(category)
+                # 恢复的是过去某天的运行，水位线已被之后的运行推进，不能再回退
+                if not run_date:
+                    scraper.commit_watermark(search_query)
+
+            # 该分类的总结已完成，删除暂存的全文
+            if text_spool:
+                text_spool.clear()
+        # 运行正常结束（包括邮件发送失败的分类）后，同一天的下一次运行从水位线重新获取，不再继续本次运行
+        if checkpoint:
+            checkpoint.finish()
+        success = True
     finally:
+        mailer.close()
+        mailer.report()
+        metrics.set("run_duration_seconds", time.time() - metrics.started_at)
+        metrics.set("run_success", 1 if success else 0)
+        metrics.set("run_timestamp_seconds", time.time())
+        if METRICS_ENABLED:
+            write_metrics(checkpoint.run_date if checkpoint else run_date)
+        if pdf_extractor:
+            pdf_extractor.close()
+        if text_spool:
+            text_spool.close()
         # 在处理不同主题之间添加延时，避免API限制
         time.sleep(5)
 
 
+def _run_date(value):
+    """校验--resume参数的日期格式"""
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"日期格式应为YYYY-MM-DD: {value}")
+    return value
+
+
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="arXiv论文监控系统")
+    parser.add_argument("--resume", metavar="DATE", type=_run_date,
+                        help="从检查点恢复指定日期（YYYY-MM-DD）的运行，完成后退出")
+    args = parser.parse_args()
+
     print("启动arXiv论文监控系统...")
+    apply_proxy()
 
-    if DEBUG_MODE:
+    if args.resume:
+        print(f"恢复 {args.resume} 的运行")
+        run_task(run_date=args.resume)
+        print("任务执行完成！")
+    elif DEBUG_MODE:
         print("调试模式：立即执行一次任务")
         run_task()
         print("任务执行完成！")
     else:
+        import schedule
         print(f"正常模式：将在每天 {SCHEDULE_TIME} 执行任务")
         schedule.every().day.at(SCHEDULE_TIME).do(run_task)
 
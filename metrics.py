@@ -0,0 +1,184 @@
+import os
+import json
+import math
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# 导出Prometheus指标时使用的前缀
+PROMETHEUS_PREFIX = "arxiv_digest"
+
+# 计时器导出的分位数
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def _quantile(sorted_values, q):
+    """最近秩法计算分位数"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(q * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metrics:
+    """进程内的计数器、计时器和仪表，每次运行结束时导出为JSON报告和Prometheus文本格式"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """清空所有指标，每次运行开始时调用"""
+        with self._lock:
+            self._counters = {}
+            self._gauges = {}
+            self._timers = {}
+            self.started_at = time.time()
+
+    def inc(self, name, value=1, **labels):
+        """
+        计数器加value
+
+        Args:
+            name: 指标名称
+            value: 增加的值
+            **labels: 标签，如 stage="download"
+        """
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """设置仪表的当前值"""
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, seconds, **labels):
+        """记录一次耗时（秒）"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._timers.setdefault(key, []).append(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """统计with块的耗时，块内抛出异常时同样记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        """
+        返回当前所有指标
+
+        Returns:
+            {"counters": [...], "gauges": [...], "timers": [...]}，每项包含name、labels和值
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            timers = {key: sorted(values) for key, values in self._timers.items()}
+
+        def entries(items, render):
+            return [dict(name=name, labels=dict(labels), **render(value))
+                    for (name, labels), value in sorted(items.items())]
+
+        return {
+            "counters": entries(counters, lambda value: {"value": value}),
+            "gauges": entries(gauges, lambda value: {"value": value}),
+            "timers": entries(timers, lambda values: {
+                "count": len(values),
+                "sum": sum(values),
+                "max": values[-1] if values else 0.0,
+                **{f"p{int(q * 100)}": _quantile(values, q) for q in QUANTILES},
+            }),
+        }
+
+    def write_json(self, path, **info):
+        """
+        把所有指标写入JSON报告
+
+        Args:
+            path: 报告文件路径
+            **info: 附加到报告中的运行信息，如运行日期
+        """
+        report = {"started_at": self.started_at, "finished_at": time.time(), **info, **self.snapshot()}
+        _atomic_write(path, json.dumps(report, ensure_ascii=False, indent=2))
+
+    def prometheus_text(self, prefix=PROMETHEUS_PREFIX):
+        """按Prometheus文本格式导出，计时器导出为summary类型"""
+        snapshot = self.snapshot()
+        lines = []
+        declared = set()
+
+        def declare(name, kind):
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        def labels_text(labels, extra=None):
+            items = list(labels.items()) + (list(extra.items()) if extra else [])
+            if not items:
+                return ""
+            return "{" + ",".join(f'{key}="{_escape_label(str(value))}"' for key, value in items) + "}"
+
+        for entry in snapshot["counters"]:
+            name = f"{prefix}_{entry['name']}"
+            declare(name, "counter")
+            lines.append(f"{name}{labels_text(entry['labels'])} {entry['value']}")
+        for entry in snapshot["gauges"]:
+            name = f"{prefix}_{entry['name']}"
+            declare(name, "gauge")
+            lines.append(f"{name}{labels_text(entry['labels'])} {entry['value']}")
+        for entry in snapshot["timers"]:
+            name = f"{prefix}_{entry['name']}"
+            declare(name, "summary")
+            for q in QUANTILES:
+                lines.append(f"{name}{labels_text(entry['labels'], {'quantile': q})} {entry[f'p{int(q * 100)}']}")
+            lines.append(f"{name}_sum{labels_text(entry['labels'])} {entry['sum']}")
+            lines.append(f"{name}_count{labels_text(entry['labels'])} {entry['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, prefix=PROMETHEUS_PREFIX):
+        """
+        写入Prometheus文本格式文件，供node-exporter的textfile collector读取
+
+        Args:
+            path: .prom文件路径
+            prefix: 指标名称前缀
+        """
+        _atomic_write(path, self.prometheus_text(prefix), mode=0o644)
+
+
+def _atomic_write(path, content, mode=None):
+    """原子地写入文本文件，读取方不会看到写了一半的文件"""
+    path = Path(path)
+    os.makedirs(path.parent, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+# 全局指标，各模块直接记录到这里
+metrics = Metrics()
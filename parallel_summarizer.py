@@ -1,78 +1,39 @@
-from google import genai
 from google.genai import types
-from config import GEMINI_API_KEYS, GEMINI_MODEL, FULL_TEXT_ANALYSIS
+from config import (
+    GEMINI_API_KEYS, GEMINI_MODEL, FULL_TEXT_ANALYSIS, GEMINI_RPM, GEMINI_TPM, KEY_MAX_IN_FLIGHT,
+    ABSTRACT_BATCH_SIZE,
+)
+from rate_limiter import KeyRateLimiter, estimate_tokens, retry_after_seconds
+from text_spool import read_text
+from records import Summary
+from summarizer import create_client
+from metrics import metrics
 import re
+import json
 import threading
 import queue
 import time
-import concurrent.futures
+from contextlib import contextmanager
 from typing import List, Dict, Any, Optional
 
+# 单篇论文因限流被转交给其他密钥的最大次数
+MAX_HANDOFFS = 5
 
-class ParallelPaperSummarizer:
-    """使用多线程并行处理论文总结的类"""
+# 合并请求的响应中缺失的论文重新合并请求的次数，用完后改为逐篇总结
+MAX_BATCH_RETRIES = 2
 
-    def __init__(self, max_workers=None):
-        """
-        初始化并行论文总结器
 
-        Args:
-            max_workers: 最大工作线程数，默认为None（使用所有可用的API密钥）
-        """
-        # 初始化API客户端
-        self.api_clients = self._initialize_clients()
+class RateLimited(Exception):
+    """密钥被限流，论文应交还工作队列由其他密钥处理"""
 
-        # 设置最大工作线程数
-        self.max_workers = max_workers or len(self.api_clients)
-        if self.max_workers > len(self.api_clients):
-            self.max_workers = len(self.api_clients)
+    def __init__(self, client_index, retry_after):
+        super().__init__(f"密钥 {client_index} 被限流，需冷却 {retry_after:.0f} 秒")
+        self.client_index = client_index
+        self.retry_after = retry_after
 
-        print(f"初始化并行论文总结器，使用 {self.max_workers} 个工作线程")
 
-    def _initialize_clients(self):
-        """初始化所有API客户端"""
-        clients = []
-        for api_key in GEMINI_API_KEYS:
-            try:
-                client = genai.Client(api_key=api_key)
-                # 测试客户端是否有效
-                clients.append(client)
-                print(f"成功初始化API客户端: {api_key}")
-            except Exception as e:
-                print(f"初始化API客户端失败: {api_key} - {str(e)}")
-
-        if not clients:
-            raise ValueError("没有可用的API客户端，请检查API密钥")
-
-        return clients
-
-    def _summarize_paper_with_client(self, paper: Dict[str, Any], client_index: int) -> Dict[str, Any]:
-        """
-        使用指定的客户端总结论文
-
-        Args:
-            paper: 论文数据
-            client_index: 客户端索引
-
-        Returns:
-            包含总结文本和评分的字典
-        """
-        client = self.api_clients[client_index]
-
-        # 使用f-string更安全地处理可能包含特殊字符的内容
-        title = paper.get("title", "N/A")
-        authors = ", ".join(paper.get("authors", ["N/A"]))
-        abstract = paper.get("abstract", "N/A")
-
-        # 检查是否有全文可用
-        has_full_text = 'full_text' in paper and paper['full_text'] and len(paper['full_text']) > 200
-
-        # 根据配置和全文可用性决定使用哪种提示
-        if FULL_TEXT_ANALYSIS and has_full_text:
-            # 提取全文
-            full_text = paper['full_text']
-
-            prompt = f"""
+# 基于全文的提示模板
+FULL_TEXT_PROMPT_TEMPLATE = """
 请扮演一位专业的科研助理。
 你的任务是根据下面提供的论文信息（标题、作者、摘要、全文），用简洁、专业的中文进行总结和评分。
 
@@ -101,9 +62,9 @@ class ParallelPaperSummarizer:
 *   篇幅：每个部分的内容**严格限制在200字以内**。
 *   格式：**仅输出**编号和对应内容（例如："1. 主要研究目标: [内容]"），每个部分占一行。**绝对不要包含任何**引言、结语、问候语、解释性文字或任何与要求格式无关的内容。直接开始输出 "1. 主要研究目标: ..."。
 """
-        else:
-            # 使用原来的只基于摘要的提示
-            prompt = f"""
+
+# 只基于摘要的提示模板
+ABSTRACT_PROMPT_TEMPLATE = """
 请扮演一位专业的科研助理。
 你的任务是根据下面提供的论文信息（标题、作者、摘要），用简洁、专业的中文进行总结和评分。
 
@@ -132,9 +93,145 @@ class ParallelPaperSummarizer:
 *   格式：**仅输出**编号和对应内容（例如："1. 主要研究目标: [内容]"），每个部分占一行。**绝对不要包含任何**引言、结语、问候语、解释性文字或任何与要求格式无关的内容。直接开始输出 "1. 主要研究目标: ..."。
 """
 
+
+# 多篇论文合并总结的提示模板，要求输出JSON数组
+ABSTRACT_BATCH_PROMPT_TEMPLATE = """
+请扮演一位专业的科研助理。
+你的任务是根据下面提供的{count}篇论文的信息（编号、标题、作者、摘要），分别用简洁、专业的中文进行总结和评分。
+
+**输入信息:**
+{papers}
+
+**输出要求:**
+输出一个JSON数组，每篇论文对应一个对象，包含以下字段：
+
+- "id": 论文编号，与输入中方括号内的编号完全一致（例如 "P1"）
+- "research_goal": 主要研究目标 (总结论文试图解决的核心问题或达成的具体目标)
+- "key_methods": 关键方法 (总结论文采用的主要研究方法、技术路径或实验设计)
+- "innovations": 主要创新点 (总结论文相比现有研究的新颖之处或独特贡献)
+- "conclusions": 主要结论 (总结论文得出的最重要研究结果、发现或核心观点)
+- "significance": 研究意义 (总结该研究的理论价值、潜在应用前景或对相关领域的贡献)
+- "rating": 论文评分 (1-100的整数，100分为最高，50分以上为合格，80分以上为优秀)
+- "rating_reason": 评分理由 (简要说明评分理由，包括创新性、方法学严谨性、结果可靠性和影响力等方面)
+
+**格式与约束:**
+*   语言：除id外的文字字段使用简体中文。
+*   篇幅：每个字段的内容**严格限制在200字以内**。
+*   每篇论文必须各输出一个对象，不要遗漏、合并或重复。
+*   **仅输出**JSON数组，不要包含任何其他文字。
+"""
+
+# 合并总结的JSON字段与单篇总结格式中各行标题的对应关系
+BATCH_SUMMARY_FIELDS = [
+    ("research_goal", "1. 主要研究目标"),
+    ("key_methods", "2. 关键方法"),
+    ("innovations", "3. 主要创新点"),
+    ("conclusions", "4. 主要结论"),
+    ("significance", "5. 研究意义"),
+    ("rating", "6. 论文评分"),
+    ("rating_reason", "7. 评分理由"),
+]
+
+
+class ParallelPaperSummarizer:
+    """使用多线程并行处理论文总结的类"""
+
+    def __init__(self, max_workers=None, summary_cache=None, max_in_flight=KEY_MAX_IN_FLIGHT,
+                 abstract_batch_size=ABSTRACT_BATCH_SIZE, model=GEMINI_MODEL):
+        """
+        初始化并行论文总结器
+
+        Args:
+            max_workers: 最大工作线程数，默认为None（每个API密钥max_in_flight个线程）
+            summary_cache: 总结缓存（SummaryCache），None表示不使用缓存
+            max_in_flight: 每个API密钥同时进行中的最大请求数
+            abstract_batch_size: 只用摘要总结时每次请求合并的论文数，1表示不合并
+            model: 使用的Gemini模型
+        """
+        self.summary_cache = summary_cache
+        self.model = model
+        self.abstract_batch_size = max(1, abstract_batch_size)
+        # 初始化API客户端
+        self.api_clients = self._initialize_clients()
+
+        # 每个API密钥独立限流，未配置配额时不限流
+        self.rate_limiter = None
+        if GEMINI_RPM > 0 or GEMINI_TPM > 0:
+            self.rate_limiter = KeyRateLimiter(len(self.api_clients), GEMINI_RPM, GEMINI_TPM)
+            print(f"启用按密钥限流: 每分钟 {GEMINI_RPM or '不限'} 次请求，{GEMINI_TPM or '不限'} 个token")
+
+        # 设置最大工作线程数，每个线程固定使用一个密钥
+        self.max_in_flight = max(1, max_in_flight)
+        self.capacity = len(self.api_clients) * self.max_in_flight
+        self.max_workers = min(max_workers or self.capacity, self.capacity)
+
+        # 流水线调用时每次请求临时选用密钥，记录每个密钥进行中的请求数
+        self._key_condition = threading.Condition()
+        self._in_flight = [0] * len(self.api_clients)
+
+        # 线程到密钥的映射，按密钥交错排列，线程数少于总容量时也能均匀覆盖所有密钥
+        self.worker_keys = [
+            key_index
+            for _ in range(self.max_in_flight)
+            for key_index in range(len(self.api_clients))
+        ][:self.max_workers]
+
+        print(f"初始化并行论文总结器，使用 {self.max_workers} 个工作线程（每个密钥最多 {self.max_in_flight} 个并发请求）")
+
+    def _initialize_clients(self):
+        """初始化所有API客户端"""
+        clients = []
+        for api_key in GEMINI_API_KEYS:
+            try:
+                client = create_client(api_key)
+                # 测试客户端是否有效
+                clients.append(client)
+                print(f"成功初始化API客户端: {api_key}")
+            except Exception as e:
+                print(f"初始化API客户端失败: {api_key} - {str(e)}")
+
+        if not clients:
+            raise ValueError("没有可用的API客户端，请检查API密钥")
+
+        return clients
+
+    def _uses_full_text(self, paper: Dict[str, Any]) -> bool:
+        """根据配置和全文可用性判断是否使用全文提示"""
+        full_text = paper.get('full_text')
+        return bool(FULL_TEXT_ANALYSIS and full_text and len(full_text) > 200)
+
+    def _call_model(self, client_index: int, prompt: str, estimated_tokens: int,
+                    allow_handoff: bool = False, response_mime_type: str = "text/plain") -> str:
+        """
+        使用指定的客户端发送一次请求，处理限流和重试
+
+        Args:
+            client_index: 客户端索引
+            prompt: 提示文本
+            estimated_tokens: 预计消耗的token数，用于限流
+            allow_handoff: 被限流时是否抛出RateLimited，把论文交给其他密钥处理
+            response_mime_type: 响应格式
+
+        Returns:
+            模型的响应文本，多次重试后仍为空时返回空字符串
+
+        Raises:
+            RateLimited: allow_handoff为True且密钥被限流
+            Exception: 重试次数用完后抛出最后一次的异常
+        """
+        client = self.api_clients[client_index]
+
         max_retries = 3
-        for attempt in range(max_retries):
+        max_rate_limited = 5
+        attempt = 0
+        rate_limited = 0
+        while True:
             try:
+                if self.rate_limiter is not None:
+                    wait_start = time.perf_counter()
+                    self.rate_limiter.acquire(client_index, estimated_tokens)
+                    metrics.observe("rate_limit_wait_seconds", time.perf_counter() - wait_start, key=client_index)
+
                 # 准备请求内容
                 contents = [
                     types.Content(
@@ -145,46 +242,356 @@ class ParallelPaperSummarizer:
 
                 # 设置生成配置
                 generate_content_config = types.GenerateContentConfig(
-                    response_mime_type="text/plain",
+                    response_mime_type=response_mime_type,
                 )
 
                 # 生成响应
                 response = ""
-                for chunk in client.models.generate_content_stream(
-                    model=GEMINI_MODEL,
-                    contents=contents,
-                    config=generate_content_config,
-                ):
-                    response += chunk.text
+                request_start = time.perf_counter()
+                try:
+                    for chunk in client.models.generate_content_stream(
+                        model=self.model,
+                        contents=contents,
+                        config=generate_content_config,
+                    ):
+                        response += chunk.text
+                finally:
+                    metrics.observe("api_request_seconds", time.perf_counter() - request_start,
+                                    key=client_index, model=self.model)
 
                 # 如果响应为空，重试
                 if not response.strip():
-                    if attempt < max_retries - 1:
-                        print(f"API响应为空，重试 ({attempt+1}/{max_retries})...")
-                        time.sleep(60)
+                    metrics.inc("api_requests_total", key=client_index, model=self.model, outcome="empty")
+                    attempt += 1
+                    if attempt < max_retries:
+                        metrics.inc("retries_total", stage="summarize", reason="empty")
+                        print(f"API响应为空，重试 ({attempt}/{max_retries})...")
+                        time.sleep(self._backoff_seconds(attempt))
                         continue
-                    else:
-                        return {"summary_text": "API响应为空，请稍后重试。", "rating": 50}
-
-                # 提取评分
-                rating = self._extract_rating(response)
+                    return ""
 
-                print(f"线程 {client_index} 成功总结论文: {title[:30]}...")
-                return {
-                    "summary_text": response,
-                    "rating": rating
-                }
+                metrics.inc("api_requests_total", key=client_index, model=self.model, outcome="ok")
+                return response
 
             except Exception as e:
                 print(f"线程 {client_index} 总结失败: {str(e)}")
-                if attempt < max_retries - 1:
-                    print(f"重试 ({attempt+1}/{max_retries})...")
-                    time.sleep(60)
+
+                # 限流错误：按服务端建议的时间让该密钥冷却，由限流器负责等待
+                retry_after = retry_after_seconds(e)
+                metrics.inc("api_requests_total", key=client_index, model=self.model,
+                            outcome="rate_limited" if retry_after is not None else "error")
+                if retry_after is not None and rate_limited < max_rate_limited:
+                    rate_limited += 1
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.penalize(client_index, retry_after)
+                    if allow_handoff:
+                        raise RateLimited(client_index, retry_after)
+                    metrics.inc("retries_total", stage="summarize", reason="rate_limited")
+                    print(f"密钥 {client_index} 被限流，冷却 {retry_after:.0f} 秒后重试")
+                    if self.rate_limiter is None:
+                        time.sleep(retry_after)
+                    continue
+
+                attempt += 1
+                if attempt < max_retries:
+                    metrics.inc("retries_total", stage="summarize", reason="error")
+                    print(f"重试 ({attempt}/{max_retries})...")
+                    time.sleep(self._backoff_seconds(attempt))
                 else:
-                    return {
-                        "summary_text": f"总结失败: {str(e)}",
-                        "rating": 50
-                    }
+                    raise
+
+    def _summarize_paper_with_client(self, paper: Dict[str, Any], client_index: int,
+                                     allow_handoff: bool = False) -> Dict[str, Any]:
+        """
+        使用指定的客户端总结论文
+
+        Args:
+            paper: 论文数据
+            client_index: 客户端索引
+            allow_handoff: 被限流时是否抛出RateLimited，把论文交给其他密钥处理
+
+        Returns:
+            包含总结文本和评分的字典
+        """
+        # 准备提示中使用的论文信息
+        title = paper.get("title", "N/A")
+        authors = ", ".join(paper.get("authors", ["N/A"]))
+        abstract = paper.get("abstract", "N/A")
+
+        # 根据配置和全文可用性决定使用哪种提示
+        if self._uses_full_text(paper):
+            # 压缩预算不同时送入模型的全文不同，预算也作为缓存键的一部分
+            budget = paper.get('full_text_budget')
+            mode = "full_text" if budget is None else f"full_text:{budget}"
+            template = FULL_TEXT_PROMPT_TEMPLATE
+        else:
+            # 使用原来的只基于摘要的提示
+            mode = "abstract"
+            template = ABSTRACT_PROMPT_TEMPLATE
+
+        # 优先使用缓存的总结结果，命中时不必从暂存区读取全文
+        cache_key = None
+        if self.summary_cache is not None and paper.get("arxiv_id"):
+            cache_key = self.summary_cache.make_key(paper["arxiv_id"], self.model, template, mode)
+            cached = self.summary_cache.get(cache_key)
+            if cached is not None:
+                print(f"线程 {client_index} 使用缓存的总结: {title[:30]}...")
+                return cached
+
+        if mode == "abstract":
+            prompt = template.format(title=title, authors=authors, abstract=abstract)
+        else:
+            prompt = template.format(title=title, authors=authors, abstract=abstract, full_text=read_text(paper['full_text']))
+
+        # 预计消耗的token数：提示本身加上约1000个token的输出
+        estimated_tokens = estimate_tokens(prompt) + 1000
+
+        try:
+            response = self._call_model(client_index, prompt, estimated_tokens, allow_handoff)
+        except RateLimited:
+            raise
+        except Exception as e:
+            return {
+                "summary_text": f"总结失败: {str(e)}",
+                "rating": 50,
+                "failed": True
+            }
+        if not response:
+            return {"summary_text": "API响应为空，请稍后重试。", "rating": 50, "failed": True}
+
+        # 提取评分
+        rating = self._extract_rating(response)
+
+        print(f"线程 {client_index} 成功总结论文: {title[:30]}...")
+        summary_result = {
+            "summary_text": response,
+            "rating": rating
+        }
+        if cache_key is not None:
+            self.summary_cache.put(cache_key, paper["arxiv_id"], self.model, mode, summary_result)
+        return summary_result
+
+    def _batch_cache_key(self, paper: Dict[str, Any]) -> Optional[str]:
+        if self.summary_cache is None or not paper.get("arxiv_id"):
+            return None
+        return self.summary_cache.make_key(paper["arxiv_id"], self.model, ABSTRACT_BATCH_PROMPT_TEMPLATE, "abstract_batch")
+
+    def _parse_batch_response(self, response: str, expected_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        解析并校验合并总结的JSON响应
+
+        Args:
+            response: 模型的响应文本
+            expected_ids: 请求中的论文编号
+
+        Returns:
+            {论文编号: 总结结果}，只包含字段完整、编号有效的论文
+        """
+        text = response.strip()
+        # 个别情况下模型仍会用代码块包裹JSON
+        fenced = re.match(r"^```(?:json)?\s*(.*?)\s*```$", text, re.DOTALL)
+        if fenced:
+            text = fenced.group(1)
+        try:
+            items = json.loads(text)
+        except ValueError as e:
+            print(f"合并总结的响应不是有效的JSON: {str(e)}")
+            return {}
+        if isinstance(items, dict):
+            # 兼容 {"papers": [...]} 这样包了一层的输出
+            items = next((value for value in items.values() if isinstance(value, list)), [])
+        if not isinstance(items, list):
+            return {}
+
+        expected = set(expected_ids)
+        results = {}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            paper_id = str(item.get("id", "")).strip()
+            if paper_id not in expected or paper_id in results:
+                continue
+            try:
+                rating = max(1, min(100, int(float(item.get("rating")))))
+            except (TypeError, ValueError):
+                continue
+            lines = []
+            for field, label in BATCH_SUMMARY_FIELDS:
+                value = rating if field == "rating" else item.get(field)
+                if not isinstance(value, (str, int)) or not str(value).strip():
+                    break
+                lines.append(f"{label}: {str(value).strip()}")
+            else:
+                results[paper_id] = {"summary_text": "\n".join(lines), "rating": rating}
+        return results
+
+    def _summarize_batch_with_client(self, papers: List[Dict[str, Any]], client_index: int,
+                                     allow_handoff: bool = False) -> List[Optional[Dict[str, Any]]]:
+        """
+        把多篇论文的摘要合并到一次请求中总结
+
+        Args:
+            papers: 论文列表，均只使用摘要总结
+            client_index: 客户端索引
+            allow_handoff: 被限流时是否抛出RateLimited，把论文交给其他密钥处理
+
+        Returns:
+            与papers一一对应的总结结果，响应中缺失或无效的论文为None
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(papers)
+
+        # 优先使用缓存的总结结果，只把未命中的论文放入请求
+        pending = []
+        for position, paper in enumerate(papers):
+            cache_key = self._batch_cache_key(paper)
+            cached = self.summary_cache.get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                print(f"线程 {client_index} 使用缓存的总结: {paper.get('title', 'N/A')[:30]}...")
+                results[position] = cached
+            else:
+                pending.append((position, f"P{len(pending) + 1}", paper, cache_key))
+        if not pending:
+            return results
+
+        blocks = [
+            f"[{paper_id}]\n标题：{paper.get('title', 'N/A')}\n"
+            f"作者：{', '.join(paper.get('authors', ['N/A']))}\n摘要：{paper.get('abstract', 'N/A')}"
+            for _, paper_id, paper, _ in pending
+        ]
+        prompt = ABSTRACT_BATCH_PROMPT_TEMPLATE.format(count=len(pending), papers="\n\n".join(blocks))
+        # 预计消耗的token数：提示本身加上每篇约600个token的输出
+        estimated_tokens = estimate_tokens(prompt) + 600 * len(pending)
+
+        try:
+            response = self._call_model(client_index, prompt, estimated_tokens, allow_handoff,
+                                        response_mime_type="application/json")
+        except RateLimited:
+            raise
+        except Exception as e:
+            print(f"线程 {client_index} 合并总结 {len(pending)} 篇论文失败: {str(e)}")
+            return results
+
+        parsed = self._parse_batch_response(response, [paper_id for _, paper_id, _, _ in pending])
+        for position, paper_id, paper, cache_key in pending:
+            summary_result = parsed.get(paper_id)
+            if summary_result is None:
+                continue
+            results[position] = summary_result
+            if cache_key is not None:
+                self.summary_cache.put(cache_key, paper["arxiv_id"], self.model, "abstract_batch", summary_result)
+
+        print(f"线程 {client_index} 合并总结 {len(pending)} 篇论文，成功 {len(parsed)} 篇")
+        return results
+
+    @staticmethod
+    def _backoff_seconds(attempt):
+        """非限流错误的指数退避时间"""
+        return min(2 ** attempt, 30)
+
+    @contextmanager
+    def _lease_key(self):
+        """
+        为一次请求选用密钥：优先选进行中请求数未满且无需等待限流的密钥；有余量的密钥都在冷却时，
+        等待其他密钥的请求完成或冷却结束，所有密钥都在冷却时选等待时间最短的
+
+        Yields:
+            客户端索引
+        """
+        with self._key_condition:
+            while True:
+                free = [key_index for key_index, count in enumerate(self._in_flight) if count < self.max_in_flight]
+                waits = {key_index: self.rate_limiter.wait_time(key_index) if self.rate_limiter is not None else 0.0
+                         for key_index in free}
+                ready = [key_index for key_index in free if waits[key_index] <= 0]
+                if ready:
+                    client_index = min(ready, key=lambda key_index: self._in_flight[key_index])
+                    break
+                if len(free) == len(self._in_flight):
+                    client_index = min(free, key=waits.get)
+                    break
+                self._key_condition.wait(min(waits.values()) if waits else None)
+            self._in_flight[client_index] += 1
+        try:
+            yield client_index
+        finally:
+            with self._key_condition:
+                self._in_flight[client_index] -= 1
+                self._key_condition.notify()
+
+    def summarize_paper(self, paper: Dict[str, Any], worker_index: int = 0) -> Dict[str, Any]:
+        """
+        总结单篇论文，供流水线调用
+
+        每次请求临时选用有余量的密钥，被限流时换用其他密钥，不会固定占用某个密钥等待冷却。
+
+        Args:
+            paper: 论文数据
+            worker_index: 工作线程索引，密钥按余量选择，不再使用该参数
+
+        Returns:
+            包含总结文本和评分的字典
+        """
+        handoffs = 0
+        while True:
+            with self._lease_key() as client_index:
+                try:
+                    return self._summarize_paper_with_client(paper, client_index, handoffs < MAX_HANDOFFS)
+                except RateLimited as e:
+                    print(f"{str(e)}，论文交由其他密钥处理: {paper.get('title', 'N/A')[:30]}...")
+                    metrics.inc("handoffs_total", key=client_index)
+                    handoffs += 1
+
+    def can_batch(self, paper: Dict[str, Any]) -> bool:
+        """论文是否只用摘要总结，可以与其他论文合并到一次请求中"""
+        return self.abstract_batch_size > 1 and not self._uses_full_text(paper)
+
+    def summarize_abstract_batch(self, papers: List[Dict[str, Any]], worker_index: int = 0) -> List[Dict[str, Any]]:
+        """
+        在指定工作线程上合并总结多篇只用摘要的论文，供流水线调用
+
+        响应中缺失的论文会重新合并请求，多次缺失后改为逐篇总结。
+
+        Args:
+            papers: 论文列表
+            worker_index: 工作线程索引，密钥按余量选择，不再使用该参数
+
+        Returns:
+            与papers一一对应的总结结果
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(papers)
+        missing = list(range(len(papers)))
+        attempts = 0
+        handoffs = 0
+        while missing and attempts <= MAX_BATCH_RETRIES:
+            with self._lease_key() as client_index:
+                try:
+                    batch_results = self._summarize_batch_with_client(
+                        [papers[i] for i in missing], client_index, handoffs < MAX_HANDOFFS
+                    )
+                except RateLimited as e:
+                    print(f"{str(e)}，{len(missing)} 篇论文交由其他密钥处理")
+                    metrics.inc("handoffs_total", key=client_index)
+                    handoffs += 1
+                    continue
+            for i, summary_result in zip(missing, batch_results):
+                results[i] = summary_result
+            missing = [i for i in missing if results[i] is None]
+            attempts += 1
+
+        if missing:
+            print(f"{len(missing)} 篇论文合并总结失败，改为逐篇总结")
+            for i in missing:
+                results[i] = self.summarize_paper(papers[i])
+        return results
+
+    def make_summary(self, paper: Dict[str, Any], summary_result: Dict[str, Any]) -> Summary:
+        """根据论文数据和总结结果生成报告条目"""
+        # 提取摘要文本和评分
+        summary_text = summary_result.get("summary_text", "")
+        rating = summary_result.get("rating", 50)
+
+        # 报告条目引用论文记录，不再复制标题、作者等字段
+        return Summary(paper, summary_text, rating, failed=summary_result.get("failed", False))
 
     def _extract_rating(self, summary_text: str) -> int:
         """从总结文本中提取评分"""
@@ -216,56 +623,95 @@ class ParallelPaperSummarizer:
 
         print(f"开始并行处理 {len(papers)} 篇论文，使用 {self.max_workers} 个线程...")
 
-        # 使用线程池并行处理
-        summaries = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # 创建任务
-            future_to_paper = {}
-            for i, paper in enumerate(papers):
-                client_index = i % len(self.api_clients)
-                future = executor.submit(self._summarize_paper_with_client, paper, client_index)
-                future_to_paper[future] = paper
-
-            # 收集结果
-            for future in concurrent.futures.as_completed(future_to_paper):
-                paper = future_to_paper[future]
+        # 所有论文放入共享队列，空闲的线程随时领取，慢的或被限流的密钥不会拖住其他论文
+        # 队列元素为(任务列表, 转交次数, 剩余合并重试次数)，任务为(论文序号, 论文)；
+        # 只用摘要的论文每abstract_batch_size篇合并为一个任务，剩余合并重试次数为None表示逐篇总结
+        work_queue = queue.Queue()
+        batchable = []
+        for index, paper in enumerate(papers):
+            if self.can_batch(paper):
+                batchable.append((index, paper))
+            else:
+                work_queue.put(([(index, paper)], 0, None))
+        for i in range(0, len(batchable), self.abstract_batch_size):
+            work_queue.put((batchable[i:i + self.abstract_batch_size], 0, MAX_BATCH_RETRIES))
+        if batchable:
+            print(f"{len(batchable)} 篇论文只用摘要总结，每 {self.abstract_batch_size} 篇合并为一次请求")
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(papers)
+        remaining = [len(papers)]
+        lock = threading.Lock()
+
+        def worker(client_index):
+            while True:
+                # 密钥冷却期间不领取新论文，让其他密钥处理
+                if self.rate_limiter is not None:
+                    self.rate_limiter.wait_until_available(client_index)
+                try:
+                    jobs, handoffs, batch_retries = work_queue.get(timeout=0.5)
+                except queue.Empty:
+                    # 队列为空但仍有论文在处理中时继续等待，它们可能因限流被交还
+                    with lock:
+                        if remaining[0] == 0:
+                            return
+                    continue
+
+                allow_handoff = handoffs < MAX_HANDOFFS
                 try:
-                    summary_result = future.result()
-
-                    # 提取摘要文本和评分
-                    summary_text = summary_result.get("summary_text", "")
-                    rating = summary_result.get("rating", 50)
-
-                    summaries.append({
-                        "title": paper["title"],
-                        "authors": paper["authors"],
-                        "arxiv_id": paper["arxiv_id"],
-                        "pdf_url": paper["pdf_url"],
-                        "published": paper.get("published", "N/A"),
-                        "abstract": paper.get("abstract", ""),
-                        "summary": summary_text,
-                        "rating": rating,
-                        "pdf_path": paper.get("pdf_path", None),
-                    })
+                    if batch_retries is None:
+                        index, paper = jobs[0]
+                        summary_results = [self._summarize_paper_with_client(paper, client_index, allow_handoff)]
+                    else:
+                        summary_results = self._summarize_batch_with_client(
+                            [paper for _, paper in jobs], client_index, allow_handoff
+                        )
+                except RateLimited as e:
+                    print(f"{str(e)}，{len(jobs)} 篇论文交由其他密钥处理: {jobs[0][1].get('title', 'N/A')[:30]}...")
+                    work_queue.put((jobs, handoffs + 1, batch_retries))
+                    metrics.inc("handoffs_total", key=client_index)
+                    continue
                 except Exception as e:
                     print(f"处理论文失败: {str(e)}")
-                    # 添加一个失败的条目
-                    summaries.append({
-                        "title": paper["title"],
-                        "authors": paper["authors"],
-                        "arxiv_id": paper["arxiv_id"],
-                        "pdf_url": paper["pdf_url"],
-                        "published": paper.get("published", "N/A"),
-                        "abstract": paper.get("abstract", ""),
-                        "summary": f"总结失败: {str(e)}",
-                        "rating": 50,
-                        "pdf_path": paper.get("pdf_path", None),
-                    })
+                    # 添加失败的条目
+                    summary_results = [{"summary_text": f"总结失败: {str(e)}", "rating": 50, "failed": True}] * len(jobs)
+
+                # 合并响应中缺失的论文重新入队，只重试缺失的部分
+                missing = [job for job, summary_result in zip(jobs, summary_results) if summary_result is None]
+                if missing:
+                    metrics.inc("batch_missing_total", len(missing))
+                    if batch_retries > 0:
+                        print(f"合并总结的响应缺少 {len(missing)} 篇论文，重新入队")
+                        work_queue.put((missing, handoffs, batch_retries - 1))
+                    else:
+                        print(f"{len(missing)} 篇论文合并总结失败，改为逐篇总结")
+                        for job in missing:
+                            work_queue.put(([job], handoffs, None))
+
+                done = 0
+                for (index, paper), summary_result in zip(jobs, summary_results):
+                    if summary_result is not None:
+                        results[index] = self.make_summary(paper, summary_result)
+                        done += 1
+                with lock:
+                    remaining[0] -= done
+
+        threads = [
+            threading.Thread(target=worker, args=(client_index,), name=f"summarizer-{i}", daemon=True)
+            for i, client_index in enumerate(self.worker_keys)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        summaries = [summary for summary in results if summary is not None]
 
         # 按评分排序（从高到低）
         summaries.sort(key=lambda x: x.get("rating", 0), reverse=True)
 
         print(f"并行处理完成，共处理 {len(summaries)} 篇论文")
+        if self.summary_cache is not None:
+            self.summary_cache.report()
         return summaries
 
 
@@ -273,21 +719,25 @@ class ParallelPaperSummarizer:
 class BatchParallelPaperSummarizer(ParallelPaperSummarizer):
     """使用批处理和多线程并行处理大量论文总结的类"""
 
-    def __init__(self, max_workers=None, batch_size=10):
+    def __init__(self, max_workers=None, batch_size=10, summary_cache=None, max_in_flight=KEY_MAX_IN_FLIGHT,
+                 model=GEMINI_MODEL):
         """
         初始化批处理并行论文总结器
 
         Args:
-            max_workers: 最大工作线程数，默认为None（使用所有可用的API密钥）
+            max_workers: 最大工作线程数，默认为None（每个API密钥max_in_flight个线程）
             batch_size: 每批处理的论文数量
+            summary_cache: 总结缓存（SummaryCache），None表示不使用缓存
+            max_in_flight: 每个API密钥同时进行中的最大请求数
+            model: 使用的Gemini模型
         """
-        super().__init__(max_workers)
+        super().__init__(max_workers, summary_cache, max_in_flight, model=model)
         self.batch_size = batch_size
         print(f"初始化批处理并行论文总结器，批大小: {batch_size}")
 
     def generate_daily_report(self, papers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
-        分批并行生成每日报告
+        分批并行生成每日报告，启用限流时不再分批
 
         Args:
             papers: 论文列表
@@ -298,6 +748,10 @@ class BatchParallelPaperSummarizer(ParallelPaperSummarizer):
         if not papers:
             return []
 
+        # 启用限流时由限流器控制请求节奏，不再需要按批次等待
+        if self.rate_limiter is not None:
+            return super().generate_daily_report(papers)
+
         total_papers = len(papers)
         print(f"开始分批并行处理 {total_papers} 篇论文，批大小: {self.batch_size}...")
 
@@ -1,25 +1,125 @@
 import os
-import json
 import requests
-import shutil
 from pathlib import Path
 import time
+import threading
+import concurrent.futures
 from datetime import datetime
 from urllib.parse import urlparse
-from config import PDF_BASE_DIR, PDF_DB_FILE, ORGANIZE_BY_DATE
+from requests.adapters import HTTPAdapter
+from pdf_store import open_pdf_store
+from metrics import metrics
+from config import (
+    PDF_BASE_DIR, PDF_DB_FILE, PDF_DB_BACKEND, PDF_LEGACY_DB_FILE, ORGANIZE_BY_DATE,
+    DOWNLOAD_WORKERS, DOWNLOAD_PER_HOST_LIMIT, DOWNLOAD_MIN_INTERVAL
+)
+
+
+# 写入临时文件时每次读取的字节数
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# PDF文件头，规范允许其出现在文件开头的1024字节内
+PDF_MAGIC = b"%PDF"
+PDF_MAGIC_WINDOW = 1024
+
+
+def is_valid_pdf(file_path, expected_size=None):
+    """
+    检查本地PDF是否完整：文件非空、大小与记录一致、开头包含PDF文件头
+
+    Args:
+        file_path: PDF文件路径
+        expected_size: 下载时记录的文件大小（字节），None表示不检查大小
+
+    Returns:
+        bool: 文件是否可用
+    """
+    try:
+        size = os.path.getsize(file_path)
+        if size == 0 or (expected_size is not None and size != expected_size):
+            return False
+        with open(file_path, 'rb') as f:
+            return PDF_MAGIC in f.read(PDF_MAGIC_WINDOW)
+    except OSError:
+        return False
+
+
+def _expected_total(response, offset):
+    """
+    根据响应头计算完整文件的大小
+
+    Args:
+        response: 下载请求的响应
+        offset: 本次响应内容在文件中的起始位置
+
+    Returns:
+        完整文件的字节数，服务器没有给出长度或内容经过压缩编码时返回None
+    """
+    if response.headers.get("Content-Encoding", "identity").lower() != "identity":
+        # 响应头中的长度是压缩后的大小，与解码后写入的字节数不可比
+        return None
+    content_range = response.headers.get("Content-Range", "")
+    if "/" in content_range and not content_range.endswith("/*"):
+        return int(content_range.rsplit("/", 1)[1])
+    content_length = response.headers.get("Content-Length")
+    if content_length is not None:
+        return offset + int(content_length)
+    return None
+
+
+class _HostLimiter:
+    """按主机限制并发连接数和请求间隔，避免对同一站点请求过密"""
+
+    def __init__(self, max_concurrent=2, min_interval=0.0):
+        """
+        Args:
+            max_concurrent: 每个主机允许的最大并发下载数
+            min_interval: 同一主机两次请求之间的最小间隔（秒）
+        """
+        self.max_concurrent = max(1, max_concurrent)
+        self.min_interval = max(0.0, min_interval)
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_request_time = {}
+
+    def acquire(self, host):
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.Semaphore(self.max_concurrent))
+        semaphore.acquire()
+
+        # 预约下一次可发起请求的时间点，保证同一主机的请求间隔
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_request_time.get(host, now))
+            self._next_request_time[host] = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+    def release(self, host):
+        with self._lock:
+            semaphore = self._semaphores[host]
+        semaphore.release()
 
 
 class PDFDownloader:
-    def __init__(self, base_dir=PDF_BASE_DIR, db_file=PDF_DB_FILE):
+    def __init__(self, base_dir=PDF_BASE_DIR, db_file=PDF_DB_FILE, max_workers=DOWNLOAD_WORKERS,
+                 per_host_limit=DOWNLOAD_PER_HOST_LIMIT, min_interval=DOWNLOAD_MIN_INTERVAL,
+                 db_backend=PDF_DB_BACKEND, legacy_db_file=PDF_LEGACY_DB_FILE):
         """
         初始化PDF下载器
 
         Args:
             base_dir: PDF文件保存的基础目录
             db_file: 存储PDF文件位置的数据库文件
+            db_backend: 数据库后端，"sqlite"或"json"
+            legacy_db_file: 首次使用sqlite后端时需要迁移的旧版JSON数据库，为空时使用base_dir下的pdf_database.json
+            max_workers: 批量下载时的并发线程数，1表示逐个下载
+            per_host_limit: 每个主机的最大并发下载数
+            min_interval: 同一主机两次请求之间的最小间隔（秒）
         """
         self.base_dir = Path(base_dir)
         self.db_file = Path(db_file)
+        self.max_workers = max(1, max_workers)
 
         # 确保基础目录存在
         os.makedirs(self.base_dir, exist_ok=True)
@@ -27,27 +127,56 @@ class PDFDownloader:
         # 确保数据库文件所在目录存在
         os.makedirs(self.db_file.parent, exist_ok=True)
 
-        # 加载PDF数据库
-        self.pdf_db = self._load_pdf_database()
+        # 打开PDF数据库，多个下载线程可以并发读写
+        self.pdf_db = open_pdf_store(db_backend, self.db_file, legacy_db_file, base_dir=self.base_dir)
+
+        # 所有下载线程共用一个带连接池的会话
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(self.max_workers, per_host_limit))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.host_limiter = _HostLimiter(per_host_limit, min_interval)
+
+        # 下载统计，用于报告每次运行的吞吐量
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
 
         print(f"PDF文件将保存到: {self.base_dir}")
 
-    def _load_pdf_database(self):
-        """加载PDF数据库"""
-        if self.db_file.exists():
-            try:
-                with open(self.db_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"加载PDF数据库失败: {str(e)}")
-                return {}
-        return {}
+    def reset_stats(self):
+        """重置下载统计"""
+        with self._stats_lock:
+            self.stats = {"downloaded": 0, "cached": 0, "failed": 0, "bytes": 0}
+            self._stats_start = time.time()
+
+    def _count(self, key, value=1):
+        with self._stats_lock:
+            self.stats[key] += value
+        if key == "bytes":
+            metrics.inc("download_bytes_total", value)
+        else:
+            metrics.inc("downloads_total", value, result=key)
 
-    def _save_pdf_database(self):
-        """保存PDF数据库"""
+    def report_throughput(self):
+        """打印本次运行的下载吞吐量"""
+        elapsed = max(time.time() - self._stats_start, 1e-6)
+        stats = dict(self.stats)
+        megabytes = stats["bytes"] / (1024 * 1024)
+        print(f"下载统计: 新下载 {stats['downloaded']} 篇，已有 {stats['cached']} 篇，失败 {stats['failed']} 篇，"
+              f"共 {megabytes:.1f} MB，耗时 {elapsed:.1f} 秒，"
+              f"吞吐量 {megabytes / elapsed:.2f} MB/s，{stats['downloaded'] / elapsed * 60:.1f} 篇/分钟")
+        return stats
+
+    def _record_pdf(self, arxiv_id, file_path):
+        """记录论文的本地路径和文件大小"""
+        if not arxiv_id:
+            return
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            size = None
         try:
-            with open(self.db_file, 'w', encoding='utf-8') as f:
-                json.dump(self.pdf_db, f, ensure_ascii=False, indent=2)
+            self.pdf_db.put(arxiv_id, file_path, size)
         except Exception as e:
             print(f"保存PDF数据库失败: {str(e)}")
 
@@ -95,73 +224,171 @@ class PDFDownloader:
         else:
             filename = f"{arxiv_id}.pdf"
 
-        # 检查数据库中是否已有该论文
-        if arxiv_id in self.pdf_db:
-            existing_path = Path(self.pdf_db[arxiv_id])
-            if existing_path.exists():
+        # 检查数据库中是否已有该论文，文件被截断或损坏时重新下载
+        record = self.pdf_db.get(arxiv_id) if arxiv_id else None
+        if record:
+            existing_path = Path(record["path"])
+            if is_valid_pdf(existing_path, record.get("size")):
                 print(f"数据库中已有该论文: {existing_path}")
+                self._count("cached")
                 return str(existing_path)
+            if existing_path.exists():
+                print(f"已有的PDF文件不完整或已损坏，重新下载: {existing_path}")
+                metrics.inc("corrupt_pdfs_total")
 
         # 获取保存文件夹
         save_folder = self._get_date_folder(published_date)
         file_path = save_folder / filename
 
-        # 如果文件已存在，直接返回路径
-        if file_path.exists():
-            print(f"文件已存在: {file_path}")
-            # 更新数据库
-            self.pdf_db[arxiv_id] = str(file_path)
-            self._save_pdf_database()
-            return str(file_path)
+        # 如果数据库之外的文件已存在且完整，直接返回路径
+        if file_path.exists() and not (record and Path(record["path"]) == file_path):
+            if is_valid_pdf(file_path):
+                print(f"文件已存在: {file_path}")
+                # 更新数据库
+                self._record_pdf(arxiv_id, file_path)
+                self._count("cached")
+                return str(file_path)
+            print(f"已有的PDF文件不完整或已损坏，重新下载: {file_path}")
+            metrics.inc("corrupt_pdfs_total")
+
+        # 先下载到临时文件，校验通过后再原子地替换为正式文件，中断时不会留下被当作有效文件的半截PDF；
+        # 之前的运行或重试留下的临时文件不删除，通过Range请求从已下载的位置继续
+        part_path = file_path.with_name(file_path.name + ".part")
 
-        # 下载文件
+        host = urlparse(pdf_url).netloc
         for attempt in range(max_retries):
             try:
-                print(f"正在下载: {pdf_url} -> {file_path}")
-                response = requests.get(pdf_url, stream=True, timeout=30)
-                response.raise_for_status()
+                offset = part_path.stat().st_size if part_path.exists() else 0
+                headers = {"Range": f"bytes={offset}-"} if offset else {}
+                print(f"正在下载: {pdf_url} -> {file_path}" + (f"（从 {offset} 字节处继续）" if offset else ""))
+                wait_start = time.perf_counter()
+                self.host_limiter.acquire(host)
+                metrics.observe("host_limit_wait_seconds", time.perf_counter() - wait_start)
+                try:
+                    with metrics.timer("stage_seconds", stage="download"):
+                        with self.session.get(pdf_url, stream=True, timeout=30, headers=headers) as response:
+                            if response.status_code == 416:
+                                # 服务器无法满足Range请求（如文件已更新），丢弃已下载的部分重新开始
+                                self._remove(part_path)
+                                raise IOError("服务器不支持从断点继续下载")
+                            response.raise_for_status()
+                            if offset and response.status_code != 206:
+                                # 服务器忽略了Range，返回的是完整文件
+                                offset = 0
+                            elif offset and not response.headers.get("Content-Range", "").startswith(
+                                    f"bytes {offset}-"):
+                                self._remove(part_path)
+                                raise IOError(f"服务器返回的内容范围不匹配: {response.headers.get('Content-Range')}")
+                            expected_size = _expected_total(response, offset)
+
+                            # iter_content会按Content-Encoding解码，写入的是PDF本身的内容
+                            with open(part_path, 'ab' if offset else 'wb') as f:
+                                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                                    f.write(chunk)
+                                size = f.tell()
+                finally:
+                    self.host_limiter.release(host)
 
-                with open(file_path, 'wb') as f:
-                    shutil.copyfileobj(response.raw, f)
+                self._count("bytes", size - offset)
+                if expected_size is not None and size != expected_size:
+                    # 保留已下载的部分，下次重试时继续
+                    raise IOError(f"下载不完整: {size}/{expected_size} 字节")
+                if not is_valid_pdf(part_path):
+                    self._remove(part_path)
+                    raise ValueError("下载的文件不是PDF")
 
+                os.replace(part_path, file_path)
                 print(f"下载成功: {file_path}")
+                self._count("downloaded")
 
                 # 更新数据库
-                self.pdf_db[arxiv_id] = str(file_path)
-                self._save_pdf_database()
+                self._record_pdf(arxiv_id, file_path)
 
                 return str(file_path)
 
             except Exception as e:
                 print(f"下载失败 (尝试 {attempt+1}/{max_retries}): {str(e)}")
                 if attempt < max_retries - 1:
+                    metrics.inc("retries_total", stage="download")
                     # 指数退避
                     time.sleep(2 ** attempt)
                 else:
+                    # 不完整的临时文件保留到下次运行继续下载，损坏的已在上面删除
                     print(f"达到最大重试次数，放弃下载: {pdf_url}")
+                    self._count("failed")
                     return None
 
-    def download_papers(self, papers):
+    @staticmethod
+    def _remove(path):
+        """删除文件，不存在时忽略"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"删除文件失败: {path} - {str(e)}")
+
+    def download_papers(self, papers, max_workers=None):
         """
         批量下载论文
 
         Args:
             papers: 论文列表，每个论文应包含pdf_url、arxiv_id和published
+            max_workers: 并发下载线程数，None表示使用初始化时的设置
 
         Returns:
             更新后的论文列表，每个论文增加pdf_path字段
         """
-        for paper in papers:
-            published_date = paper.get('published')
-            pdf_path = self.download_pdf(
-                paper['pdf_url'],
-                paper['arxiv_id'],
-                published_date
-            )
-            paper['pdf_path'] = pdf_path
+        max_workers = max_workers or self.max_workers
+        self.reset_stats()
+
+        if max_workers <= 1 or len(papers) <= 1:
+            for paper in papers:
+                self.download_paper(paper)
+        else:
+            print(f"使用 {max_workers} 个线程并发下载 {len(papers)} 篇论文...")
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(self.download_paper, paper): paper for paper in papers}
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        paper = futures[future]
+                        paper['pdf_path'] = None
+                        self._count("failed")
+                        print(f"下载论文失败: {paper.get('arxiv_id')} - {str(e)}")
 
+        self.report_throughput()
         return papers
 
+    def download_paper(self, paper):
+        """
+        下载单篇论文
+
+        Args:
+            paper: 论文数据，应包含pdf_url、arxiv_id和published
+
+        Returns:
+            更新后的论文，增加pdf_path字段
+        """
+        if paper.get('skip_pdf'):
+            # 相关度预筛选判定为长尾的论文只用摘要总结，不下载PDF
+            paper['pdf_path'] = None
+            return paper
+        if paper.get('pdf_path') and is_valid_pdf(paper['pdf_path']):
+            # 从检查点恢复的论文已经下载过
+            self._count("cached")
+            return paper
+
+        published_date = paper.get('published')
+        pdf_path = self.download_pdf(
+            paper['pdf_url'],
+            paper['arxiv_id'],
+            published_date
+        )
+        paper['pdf_path'] = pdf_path
+        return paper
+
     def get_paper_path(self, arxiv_id):
         """
         获取论文的本地路径
@@ -172,8 +399,9 @@ class PDFDownloader:
         Returns:
             论文的本地路径，如果不存在则返回None
         """
-        if arxiv_id in self.pdf_db:
-            path = Path(self.pdf_db[arxiv_id])
-            if path.exists():
+        record = self.pdf_db.get(arxiv_id)
+        if record:
+            path = Path(record["path"])
+            if is_valid_pdf(path, record.get("size")):
                 return str(path)
         return None
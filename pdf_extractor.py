@@ -2,58 +2,227 @@ import fitz  # PyMuPDF
 import os
 from pathlib import Path
 import tempfile
-import re
+import time
+import signal
+import multiprocessing
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+from condenser import condense_text, heading_type, TAIL_SECTIONS
+from metrics import metrics
 
-# 可选的OCR支持
-try:
-    from pdf2image import convert_from_path
-    import pytesseract
-    OCR_AVAILABLE = True
-except ImportError:
-    OCR_AVAILABLE = False
+# 提取到这么多字符之前出现的参考文献/附录标题不作为正文结束的标志（可能是目录或摘要中的单独一行）
+MIN_BODY_CHARS = 2000
+
+# 可选的OCR支持，这里只检查是否安装，真正用到OCR时才导入
+OCR_AVAILABLE = find_spec("pdf2image") is not None and find_spec("pytesseract") is not None
+
+
+class _ExtractTimeout(BaseException):
+    """子进程中单个PDF处理超时，继承BaseException以免被提取函数内部的except Exception吞掉"""
+
+
+def _raise_timeout(signum, frame):
+    raise _ExtractTimeout()
+
+
+def _extract_in_worker(pdf_path, options, timeout):
+    """
+    在子进程中提取并清理PDF文本，只把文本返回给主进程
+    
+    Args:
+        pdf_path: PDF文件路径
+        options: 创建提取器的参数，见PDFExtractor._worker_options
+        timeout: 单个PDF的处理超时（秒），None表示不限制
+        
+    Returns:
+        (清理后的文本, 处理耗时秒)，失败或超时时文本为None
+    """
+    extractor = PDFExtractor(**options)
+    use_alarm = bool(timeout) and hasattr(signal, "setitimer")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    start = time.perf_counter()
+    full_text = None
+    try:
+        full_text = extractor.extract_and_clean(pdf_path)
+    except _ExtractTimeout:
+        print(f"PDF处理超过 {timeout} 秒，已放弃: {pdf_path}")
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    return full_text, time.perf_counter() - start
 
 
 class PDFExtractor:
-    def __init__(self, ocr_fallback=True, max_pages=None):
+    def __init__(self, ocr_fallback=True, max_pages=None, workers=1, timeout=None, text_cache=None,
+                 token_budget=None, text_spool=None, ocr_dpi=300, ocr_workers=0, stop_at_references=False,
+                 max_chars=0):
         """
         初始化PDF提取器
         
         Args:
             ocr_fallback: 当常规提取失败时是否使用OCR
             max_pages: 最大处理页数，None表示处理所有页面
+            workers: 提取进程数，1表示在当前进程中逐个处理
+            timeout: 多进程模式下单个PDF的处理超时（秒），None表示不限制
+            text_cache: 全文缓存（TextCache），None表示不使用缓存
+            token_budget: 按章节压缩全文的token预算，0表示只丢弃参考文献和致谢，None表示不压缩
+            text_spool: 全文暂存区（TextSpool），论文中只保存指向磁盘文本的TextHandle，None表示保存在内存中
+            ocr_dpi: OCR渲染页面的分辨率，越低越快、占用内存越少，但识别准确率会下降
+            ocr_workers: 单个PDF同时OCR的页数，0表示CPU核心数除以提取进程数
+            stop_at_references: 遇到参考文献或附录标题时是否停止解析后续页面
+            max_chars: 每篇论文最多提取的字符数，达到后停止解析，0表示不限制
         """
         self.ocr_fallback = ocr_fallback and OCR_AVAILABLE
         self.max_pages = max_pages
+        self.workers = max(1, workers or 1)
+        self.timeout = timeout
+        self.text_cache = text_cache
+        self.token_budget = token_budget
+        self.text_spool = text_spool
+        self.ocr_dpi = ocr_dpi
+        # 多个提取进程同时OCR时平分CPU核心
+        self.ocr_workers = ocr_workers or max(1, (os.cpu_count() or 1) // self.workers)
+        self.stop_at_references = stop_at_references
+        self.max_chars = max_chars
+        self._pool = None
+        self._stats_lock = threading.Lock()
+        self.tokens_saved = 0
+    
+    def _get_pool(self):
+        """按需创建进程池，使用spawn避免在多线程环境下fork"""
+        if self._pool is None:
+            context = multiprocessing.get_context("spawn")
+            self._pool = context.Pool(processes=self.workers)
+            print(f"启动 {self.workers} 个PDF提取进程")
+        return self._pool
+    
+    def close(self):
+        """关闭进程池，同时终止仍在处理超时文件的子进程"""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+    
+    def _submit(self, pdf_path):
+        """把PDF提交到进程池，返回AsyncResult"""
+        return self._get_pool().apply_async(
+            _extract_in_worker, (pdf_path, self._worker_options(), self.timeout)
+        )
+    
+    def _worker_options(self):
+        """子进程中重建提取器所需的参数"""
+        return {
+            "ocr_fallback": self.ocr_fallback,
+            "max_pages": self.max_pages,
+            "ocr_dpi": self.ocr_dpi,
+            # 超时只会中断子进程的主线程，OCR线程会继续占用子进程，设置了超时时改为在主线程中逐页OCR
+            "ocr_workers": 1 if self.timeout else self.ocr_workers,
+            "stop_at_references": self.stop_at_references,
+            "max_chars": self.max_chars,
+        }
+    
+    def _cache_settings(self):
+        """影响提取结果的参数，作为缓存键的一部分"""
+        settings = {"max_pages": self.max_pages, "ocr": self.ocr_fallback}
+        if self.ocr_fallback:
+            settings["ocr_dpi"] = self.ocr_dpi
+        if self.stop_at_references:
+            settings["stop_at_references"] = True
+        if self.max_chars:
+            settings["max_chars"] = self.max_chars
+        return settings
+    
+    def _cache_lookup(self, pdf_path):
+        """
+        查询全文缓存
+        
+        Returns:
+            (缓存键, 缓存的文本)，未启用缓存时缓存键为None，未命中时文本为None
+        """
+        if self.text_cache is None:
+            return None, None
+        try:
+            key = self.text_cache.make_key(pdf_path, self._cache_settings())
+        except OSError as e:
+            print(f"计算缓存键失败: {pdf_path} - {str(e)}")
+            return None, None
+        return key, self.text_cache.get(key)
+    
+    def _cache_store(self, key, full_text):
+        """提取成功后写入全文缓存"""
+        if key is not None and full_text:
+            self.text_cache.put(key, full_text)
+    
+    def report_stats(self):
+        """打印全文缓存的命中统计和压缩节省的token数"""
+        if self.text_cache is not None:
+            self.text_cache.report()
+        if self.token_budget is not None:
+            with self._stats_lock:
+                tokens_saved, self.tokens_saved = self.tokens_saved, 0
+            print(f"全文压缩: 共节省约 {tokens_saved} 个token")
+    
+    def _collect(self, async_result, pdf_path):
+        """等待进程池返回文本并记录子进程中的提取耗时，子进程内的超时未生效时由主进程兜底"""
+        wait = self.timeout * 2 if self.timeout else None
+        try:
+            full_text, seconds = async_result.get(wait)
+        except multiprocessing.TimeoutError:
+            print(f"等待PDF提取结果超时，已跳过: {pdf_path}")
+            return None
+        except Exception as e:
+            print(f"PDF提取进程出错: {pdf_path} - {str(e)}")
+            return None
+        metrics.observe("stage_seconds", seconds, stage="extract")
+        return full_text
+    
+    def iter_lines(self, doc):
+        """
+        逐页解析PDF并生成清理后的文本行（生成器），遇到参考文献/附录标题或达到字符预算时不再解析后续页面
+        
+        Args:
+            doc: 已打开的PyMuPDF文档
+            
+        Yields:
+            清理后的文本行
+        """
+        page_count = doc.page_count
+        if self.max_pages and page_count > self.max_pages:
+            print(f"PDF有{page_count}页，但只处理前{self.max_pages}页")
+            page_count = self.max_pages
+        
+        chars = 0
+        for page_num in range(page_count):
+            for line in self._clean_lines(doc[page_num].get_text("text")):
+                if (self.stop_at_references and chars >= MIN_BODY_CHARS
+                        and heading_type(line) in TAIL_SECTIONS):
+                    print(f"在第 {page_num + 1}/{page_count} 页遇到参考文献或附录，停止提取")
+                    return
+                if self.max_chars and chars + len(line) >= self.max_chars:
+                    if chars < self.max_chars:
+                        yield line[:self.max_chars - chars]
+                    print(f"已提取 {self.max_chars} 字符，停止提取（第 {page_num + 1}/{page_count} 页）")
+                    return
+                yield line
+                chars += len(line) + 1
     
     def extract_text_pymupdf(self, pdf_path):
         """
-        使用PyMuPDF提取PDF文本
+        使用PyMuPDF提取PDF文本，解析的同时完成清理
         
         Args:
             pdf_path: PDF文件路径
             
         Returns:
-            提取的文本
+            清理后的文本
         """
         try:
-            doc = fitz.open(pdf_path)
-            page_count = doc.page_count
-            
-            if self.max_pages and page_count > self.max_pages:
-                print(f"PDF有{page_count}页，但只处理前{self.max_pages}页")
-                page_count = self.max_pages
-            
-            text_parts = []
-            
-            # 提取每一页的文本
-            for page_num in range(page_count):
-                page = doc[page_num]
-                text = page.get_text("text")
-                text_parts.append(text)
-            
-            doc.close()
-            full_text = "\n".join(text_parts)
+            with fitz.open(pdf_path) as doc:
+                full_text = "\n".join(self.iter_lines(doc))
             
             # 检查提取的文本是否有效
             if len(full_text.strip()) < 100:
@@ -81,23 +250,37 @@ class PDFExtractor:
             print("OCR库未安装，无法使用OCR")
             return None
         
+        executor = None
         try:
-            print(f"使用OCR处理: {pdf_path}")
-            
-            # 将PDF转换为图像
-            images = convert_from_path(pdf_path, dpi=300)
-            
-            if self.max_pages and len(images) > self.max_pages:
-                print(f"PDF有{len(images)}页，但只处理前{self.max_pages}页")
-                images = images[:self.max_pages]
+            from pdf2image import convert_from_path, pdfinfo_from_path
+            import pytesseract
+
+            page_count = int(pdfinfo_from_path(pdf_path)["Pages"])
+            if self.max_pages and page_count > self.max_pages:
+                print(f"PDF有{page_count}页，但只处理前{self.max_pages}页")
+                page_count = self.max_pages
+            workers = min(self.ocr_workers, page_count)
+            print(f"使用OCR处理: {pdf_path}（{page_count} 页，{self.ocr_dpi} DPI，{workers} 页并行）")
             
-            text_parts = []
+            def ocr_page(page_num):
+                # 每次只渲染一页，识别完立即释放，峰值内存约为每个线程一页图像
+                print(f"OCR处理第 {page_num}/{page_count} 页...")
+                images = convert_from_path(pdf_path, dpi=self.ocr_dpi, first_page=page_num, last_page=page_num,
+                                           grayscale=True)
+                try:
+                    return "\n".join(pytesseract.image_to_string(image, lang='eng') for image in images)
+                finally:
+                    for image in images:
+                        image.close()
             
-            # 对每个图像进行OCR
-            for i, image in enumerate(images):
-                print(f"OCR处理第 {i+1}/{len(images)} 页...")
-                text = pytesseract.image_to_string(image, lang='eng')
-                text_parts.append(text)
+            pages = range(1, page_count + 1)
+            if workers <= 1:
+                text_parts = [ocr_page(page_num) for page_num in pages]
+            else:
+                # 渲染（pdftoppm）和识别（tesseract）都在外部进程中进行，线程池即可并行，
+                # 也能在提取进程池的子进程中使用（守护进程不能再创建子进程池）
+                executor = ThreadPoolExecutor(max_workers=workers)
+                text_parts = list(executor.map(ocr_page, pages))
             
             full_text = "\n".join(text_parts)
             return full_text
@@ -106,6 +289,10 @@ class PDFExtractor:
             print(f"OCR提取失败: {str(e)}")
             traceback.print_exc()
             return None
+        finally:
+            # 出错或超时时不等待其余页面完成
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
     
     def extract_text(self, pdf_path):
         """
@@ -115,7 +302,7 @@ class PDFExtractor:
             pdf_path: PDF文件路径
             
         Returns:
-            提取的文本，如果提取失败则返回None
+            清理后的文本，如果提取失败则返回None
         """
         if not os.path.exists(pdf_path):
             print(f"文件不存在: {pdf_path}")
@@ -127,7 +314,7 @@ class PDFExtractor:
         # 如果PyMuPDF提取失败且启用了OCR回退，则尝试OCR
         if text is None and self.ocr_fallback:
             print(f"PyMuPDF提取失败，尝试OCR: {pdf_path}")
-            text = self.extract_text_ocr(pdf_path)
+            text = self.clean_text(self.extract_text_ocr(pdf_path))
         
         return text
     
@@ -143,30 +330,19 @@ class PDFExtractor:
         """
         if text is None:
             return None
-        
-        # 移除多余的空白行
-        text = re.sub(r'\n\s*\n', '\n\n', text)
-        
-        # 移除页眉页脚（简单启发式方法）
-        lines = text.split('\n')
-        cleaned_lines = []
-        
-        for line in lines:
-            # 跳过可能的页码行
-            if re.match(r'^\s*\d+\s*$', line):
-                continue
-            
-            # 跳过短的页眉/页脚行
-            if len(line.strip()) < 5:
+        return '\n'.join(self._clean_lines(text))
+    
+    def _clean_lines(self, text):
+        """逐行过滤空行、页码行和过短的页眉页脚行（简单启发式方法）"""
+        for line in text.split('\n'):
+            stripped = line.strip()
+            if len(stripped) < 5 or stripped.isdecimal():
                 continue
-                
-            cleaned_lines.append(line)
-        
-        return '\n'.join(cleaned_lines)
+            yield line
     
     def extract_and_clean(self, pdf_path):
         """
-        提取并清理PDF文本
+        提取并清理PDF文本（PyMuPDF提取时已在解析的同时完成清理）
         
         Args:
             pdf_path: PDF文件路径
@@ -174,8 +350,7 @@ class PDFExtractor:
         Returns:
             清理后的文本，如果提取失败则返回None
         """
-        text = self.extract_text(pdf_path)
-        return self.clean_text(text)
+        return self.extract_text(pdf_path)
     
     def process_papers(self, papers):
         """
@@ -187,19 +362,86 @@ class PDFExtractor:
         Returns:
             更新后的论文列表，每个论文增加full_text字段
         """
+        if self.workers <= 1:
+            for paper in papers:
+                self.process_paper(paper)
+            self.report_stats()
+            return papers
+        
+        # 先把缓存未命中的PDF全部提交到进程池，再按顺序收集结果
+        print(f"使用 {self.workers} 个进程并行提取 {len(papers)} 篇论文...")
+        pending = []
         for paper in papers:
-            if 'pdf_path' in paper and paper['pdf_path']:
-                full_text = self.extract_and_clean(paper['pdf_path'])
-                paper['full_text'] = full_text
-                
-                # 计算提取的文本长度
-                if full_text:
-                    text_length = len(full_text)
-                    print(f"提取了 {text_length} 字符的文本: {paper['title']}")
-                else:
-                    print(f"文本提取失败: {paper['title']}")
+            if not paper.get('pdf_path') or paper.get('full_text'):
+                self.process_paper(paper)
+                continue
+            key, full_text = self._cache_lookup(paper['pdf_path'])
+            if full_text is not None:
+                self._set_full_text(paper, full_text)
             else:
-                paper['full_text'] = None
-                print(f"没有PDF路径，跳过文本提取: {paper['title']}")
+                pending.append((paper, key, self._submit(paper['pdf_path'])))
         
+        for paper, key, async_result in pending:
+            full_text = self._collect(async_result, paper['pdf_path'])
+            self._cache_store(key, full_text)
+            self._set_full_text(paper, full_text)
+        
+        self.report_stats()
         return papers
+    
+    def process_paper(self, paper):
+        """
+        处理单篇论文，提取全文
+        
+        Args:
+            paper: 论文数据，应包含pdf_path字段
+            
+        Returns:
+            更新后的论文，增加full_text字段
+        """
+        if paper.get('full_text'):
+            # 从检查点恢复的论文已经提取过
+            return paper
+        if 'pdf_path' in paper and paper['pdf_path']:
+            key, full_text = self._cache_lookup(paper['pdf_path'])
+            if full_text is None:
+                if self.workers > 1:
+                    # 耗时在子进程中统计，由_collect记录
+                    full_text = self._collect(self._submit(paper['pdf_path']), paper['pdf_path'])
+                else:
+                    with metrics.timer("stage_seconds", stage="extract"):
+                        full_text = self.extract_and_clean(paper['pdf_path'])
+                self._cache_store(key, full_text)
+            self._set_full_text(paper, full_text)
+        else:
+            paper['full_text'] = None
+            print(f"没有PDF路径，跳过文本提取: {paper['title']}")
+        
+        return paper
+    
+    def _set_full_text(self, paper, full_text):
+        """按章节压缩后保存提取结果并输出日志，缓存中保存的是压缩前的全文"""
+        if full_text and self.token_budget is not None:
+            full_text, stats = condense_text(full_text, self.token_budget)
+            paper['full_text_budget'] = self.token_budget
+            with self._stats_lock:
+                self.tokens_saved += stats['saved_tokens']
+            metrics.inc("condensed_tokens_saved_total", stats['saved_tokens'])
+        else:
+            stats = None
+        
+        metrics.inc("extractions_total", result="ok" if full_text else "failed")
+        
+        # 计算提取的文本长度
+        if full_text:
+            text_length = len(full_text)
+            print(f"提取了 {text_length} 字符的文本: {paper['title']}")
+            if stats is not None:
+                print(f"全文压缩: {stats['original_tokens']} -> {stats['condensed_tokens']} token，"
+                      f"节省 {stats['saved_tokens']}")
+            if self.text_spool is not None:
+                # 全文写入磁盘，构建提示时再读取，论文记录只保留轻量的句柄
+                full_text = self.text_spool.spool(full_text)
+        else:
+            print(f"文本提取失败: {paper['title']}")
+        paper['full_text'] = full_text
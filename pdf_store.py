@@ -0,0 +1,230 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+
+class PDFStore(ABC):
+    """PDF元数据存储接口，按arxiv_id记录本地文件路径和大小"""
+
+    @abstractmethod
+    def get(self, arxiv_id):
+        """
+        查询论文记录
+
+        Args:
+            arxiv_id: arXiv ID
+
+        Returns:
+            包含path、size和updated_at的字典，不存在时返回None
+        """
+
+    @abstractmethod
+    def put(self, arxiv_id, path, size=None):
+        """
+        新增或更新论文记录
+
+        Args:
+            arxiv_id: arXiv ID
+            path: PDF文件的本地路径
+            size: 文件大小（字节），None表示未知
+        """
+
+    @abstractmethod
+    def delete(self, arxiv_id):
+        """删除论文记录"""
+
+    @abstractmethod
+    def __len__(self):
+        """记录数"""
+
+    def __contains__(self, arxiv_id):
+        return self.get(arxiv_id) is not None
+
+    def close(self):
+        """关闭存储"""
+        pass
+
+
+class JSONPDFStore(PDFStore):
+    """旧版JSON文件存储，每次写入都会重写整个文件，仅适合少量记录"""
+
+    def __init__(self, db_file):
+        self.db_file = Path(db_file)
+        self._lock = threading.Lock()
+        self._records = {}
+        if self.db_file.exists():
+            try:
+                with open(self.db_file, 'r', encoding='utf-8') as f:
+                    self._records = json.load(f)
+            except Exception as e:
+                print(f"加载PDF数据库失败: {str(e)}")
+
+    def get(self, arxiv_id):
+        with self._lock:
+            path = self._records.get(arxiv_id)
+        if path is None:
+            return None
+        return {"path": path, "size": None, "updated_at": None}
+
+    def put(self, arxiv_id, path, size=None):
+        with self._lock:
+            self._records[arxiv_id] = str(path)
+            try:
+                with open(self.db_file, 'w', encoding='utf-8') as f:
+                    json.dump(self._records, f, ensure_ascii=False, indent=2)
+            except Exception as e:
+                print(f"保存PDF数据库失败: {str(e)}")
+
+    def delete(self, arxiv_id):
+        with self._lock:
+            self._records.pop(arxiv_id, None)
+
+    def __len__(self):
+        return len(self._records)
+
+
+class SQLitePDFStore(PDFStore):
+    """基于SQLite（WAL模式）的存储，按主键单条更新，支持多线程和多进程并发读写"""
+
+    def __init__(self, db_file):
+        self.db_file = Path(db_file)
+        os.makedirs(self.db_file.parent, exist_ok=True)
+        # 每个线程使用自己的连接，由SQLite负责并发控制
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS pdfs ("
+            "arxiv_id TEXT PRIMARY KEY, "
+            "path TEXT NOT NULL, "
+            "size INTEGER, "
+            "updated_at REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def get(self, arxiv_id):
+        row = self._conn().execute(
+            "SELECT path, size, updated_at FROM pdfs WHERE arxiv_id = ?", (arxiv_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"path": row[0], "size": row[1], "updated_at": row[2]}
+
+    def put(self, arxiv_id, path, size=None):
+        self._conn().execute(
+            "INSERT INTO pdfs (arxiv_id, path, size, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(arxiv_id) DO UPDATE SET path = excluded.path, size = excluded.size, "
+            "updated_at = excluded.updated_at",
+            (arxiv_id, str(path), size, time.time()),
+        )
+
+    def delete(self, arxiv_id):
+        self._conn().execute("DELETE FROM pdfs WHERE arxiv_id = ?", (arxiv_id,))
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM pdfs").fetchone()[0]
+
+    def migrate_from_json(self, json_file):
+        """
+        一次性导入旧版JSON数据库，导入成功后将JSON文件重命名为*.migrated
+
+        Args:
+            json_file: 旧版pdf_database.json路径
+
+        Returns:
+            导入的记录数
+        """
+        json_file = Path(json_file)
+        if not json_file.exists():
+            return 0
+
+        try:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                records = json.load(f)
+        except Exception as e:
+            print(f"读取旧版PDF数据库失败，跳过迁移: {str(e)}")
+            return 0
+
+        now = time.time()
+        rows = []
+        for arxiv_id, path in records.items():
+            if not arxiv_id or arxiv_id == "null" or not path:
+                continue
+            size = os.path.getsize(path) if os.path.exists(path) else None
+            rows.append((arxiv_id, str(path), size, now))
+
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 已存在的记录比旧文件更新，不覆盖
+            conn.executemany(
+                "INSERT OR IGNORE INTO pdfs (arxiv_id, path, size, updated_at) VALUES (?, ?, ?, ?)", rows
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        try:
+            os.replace(json_file, json_file.with_name(json_file.name + ".migrated"))
+        except OSError as e:
+            # 其他进程可能已完成迁移
+            print(f"重命名旧版PDF数据库失败: {str(e)}")
+        print(f"已将 {len(rows)} 条记录从 {json_file} 迁移到 {self.db_file}")
+        return len(rows)
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+def open_pdf_store(backend, db_file, legacy_json_file=None, base_dir=None):
+    """
+    根据配置创建PDF元数据存储
+
+    Args:
+        backend: 存储后端，"sqlite"或"json"
+        db_file: 数据库文件路径
+        legacy_json_file: 需要迁移的旧版JSON数据库路径，仅sqlite后端使用，为空时自动查找
+        base_dir: PDF保存的基础目录，自动查找旧版JSON数据库时使用，默认为数据库文件所在目录
+
+    Returns:
+        PDFStore实例
+    """
+    db_file = Path(db_file)
+    if backend == "json":
+        return JSONPDFStore(db_file)
+    if backend != "sqlite":
+        raise ValueError(f"不支持的PDF数据库后端: {backend}")
+
+    if not legacy_json_file:
+        # 兼容把PDF_DB_FILE指向旧版JSON文件的配置，否则迁移基础目录下的旧版数据库
+        if db_file.suffix == ".json" and db_file.exists():
+            legacy_json_file = db_file
+        else:
+            legacy_json_file = Path(base_dir or db_file.parent) / "pdf_database.json"
+    if db_file.suffix == ".json":
+        db_file = db_file.with_suffix(".db")
+
+    store = SQLitePDFStore(db_file)
+    store.migrate_from_json(legacy_json_file)
+    return store
@@ -0,0 +1,245 @@
+import queue
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+# 队列结束标记
+_STOP = object()
+
+# 处理函数返回此标记时，结果由处理函数稍后自行写入输出队列
+_DEFERRED = object()
+
+
+class PaperPipeline:
+    """将下载、文本提取和总结三个阶段串成流水线，各阶段之间通过有界队列衔接"""
+
+    def __init__(self, summarizer, pdf_downloader=None, pdf_extractor=None,
+                 download_workers=2, extract_workers=2, summarize_workers=None,
+                 queue_size=16):
+        """
+        初始化论文处理流水线
+
+        Args:
+            summarizer: 论文总结器，需提供summarize_paper和make_summary方法；
+                若提供can_batch和summarize_abstract_batch，只用摘要的论文会合并总结
+            pdf_downloader: PDF下载器，None表示跳过下载和提取阶段
+            pdf_extractor: PDF提取器，None表示跳过提取阶段
+            download_workers: 下载阶段的线程数
+            extract_workers: 提取阶段的线程数
+            summarize_workers: 总结阶段的线程数，None表示使用总结器的max_workers，不超过总结器的capacity
+            queue_size: 各阶段之间队列的最大长度，队列满时上游阶段阻塞
+        """
+        self.summarizer = summarizer
+        self.pdf_downloader = pdf_downloader
+        self.pdf_extractor = pdf_extractor if pdf_downloader else None
+        self.download_workers = max(1, download_workers)
+        self.extract_workers = max(1, extract_workers)
+        self.summarize_workers = max(1, summarize_workers or getattr(summarizer, "max_workers", 1))
+        # 总结线程数不超过所有密钥的并发上限之和，多出的线程只会等待密钥
+        capacity = getattr(summarizer, "capacity", None)
+        if capacity:
+            self.summarize_workers = min(self.summarize_workers, capacity)
+        self.queue_size = max(1, queue_size)
+
+    def _start_stage(self, name, func, in_queue, out_queue, workers, next_workers, on_error=None):
+        """
+        启动一个流水线阶段
+
+        Args:
+            name: 阶段名称，用于日志
+            func: 处理函数，参数为(index, paper, worker_index)，返回下游所需的结果，返回_DEFERRED时不输出
+            in_queue: 输入队列，元素为(index, paper)
+            out_queue: 输出队列，None表示由func自行保存结果
+            workers: 本阶段的线程数
+            next_workers: 下游阶段的线程数，用于发送结束标记
+            on_error: func抛出异常时生成本阶段结果的函数，参数为(paper, exception)，None表示不输出该论文
+
+        Returns:
+            本阶段的线程列表
+        """
+        remaining = [workers]
+        lock = threading.Lock()
+
+        def worker(worker_index):
+            while True:
+                item = in_queue.get()
+                if item is _STOP:
+                    break
+                index, paper = item
+                try:
+                    result = func(index, paper, worker_index)
+                except Exception as e:
+                    print(f"{name}阶段处理失败: {paper.get('title', 'N/A')} - {str(e)}")
+                    result = on_error(paper, e) if on_error is not None else _DEFERRED
+                if out_queue is not None and result is not _DEFERRED:
+                    out_queue.put((index, result))
+
+            # 最后一个退出的线程通知下游阶段结束
+            with lock:
+                remaining[0] -= 1
+                is_last = remaining[0] == 0
+            if is_last and out_queue is not None:
+                for _ in range(next_workers):
+                    out_queue.put(_STOP)
+
+        threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=worker, args=(i,), name=f"{name}-{i}", daemon=True)
+            thread.start()
+            threads.append(thread)
+        return threads
+
+    def _download(self, index, paper, worker_index):
+        try:
+            return self.pdf_downloader.download_paper(paper)
+        except Exception:
+            paper['pdf_path'] = None
+            raise
+
+    def _extract(self, index, paper, worker_index):
+        try:
+            return self.pdf_extractor.process_paper(paper)
+        except Exception:
+            paper['full_text'] = None
+            raise
+
+    def run(self, papers: List[Dict[str, Any]], checkpoint=None) -> List[Dict[str, Any]]:
+        """
+        以流水线方式处理论文并生成每日报告
+
+        Args:
+            papers: 论文列表
+            checkpoint: 检查点记录器（CategoryCheckpoint），每篇论文完成一个阶段就记录一次，None表示不记录
+
+        Returns:
+            包含总结和评分的论文列表，按评分从高到低排序
+        """
+        if not papers:
+            return []
+
+        start_time = time.time()
+        print(f"开始流水线处理 {len(papers)} 篇论文（下载线程: {self.download_workers if self.pdf_downloader else 0}，"
+              f"提取线程: {self.extract_workers if self.pdf_extractor else 0}，总结线程: {self.summarize_workers}）")
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(papers)
+        if self.pdf_downloader:
+            self.pdf_downloader.reset_stats()
+
+        # 只用摘要的论文先攒够一批再合并总结
+        batch_size = getattr(self.summarizer, "abstract_batch_size", 1)
+        abstract_buffer = []
+        buffer_lock = threading.Lock()
+
+        def summarize_batch(jobs, worker_index):
+            try:
+                summary_results = self.summarizer.summarize_abstract_batch([paper for _, paper in jobs], worker_index)
+            except Exception as e:
+                print(f"处理论文失败: {str(e)}")
+                summary_results = [{"summary_text": f"总结失败: {str(e)}", "rating": 50, "failed": True}] * len(jobs)
+            return [(index, self.summarizer.make_summary(paper, summary_result))
+                    for (index, paper), summary_result in zip(jobs, summary_results)]
+
+        def summarize(index, paper, worker_index):
+            if batch_size > 1 and self.summarizer.can_batch(paper):
+                with buffer_lock:
+                    abstract_buffer.append((index, paper))
+                    if len(abstract_buffer) < batch_size:
+                        return _DEFERRED
+                    jobs = abstract_buffer[:]
+                    del abstract_buffer[:]
+                for item in summarize_batch(jobs, worker_index):
+                    collected.put(item)
+                return _DEFERRED
+
+            try:
+                summary_result = self.summarizer.summarize_paper(paper, worker_index)
+            except Exception as e:
+                print(f"处理论文失败: {str(e)}")
+                return summarize_failed(paper, e)
+            return self.summarizer.make_summary(paper, summary_result)
+
+        def summarize_failed(paper, error):
+            # 总结阶段的失败结果仍是报告条目，标记为失败，检查点不会复用
+            return self.summarizer.make_summary(
+                paper, {"summary_text": f"总结失败: {str(error)}", "rating": 50, "failed": True}
+            )
+
+        def keep_paper(paper, error):
+            # 下载或提取失败时论文仍可只用摘要总结，原样交给下游
+            return paper
+
+        def checkpointed(func, stage, field):
+            if checkpoint is None:
+                return func
+
+            def wrapper(index, paper, worker_index):
+                result = func(index, paper, worker_index)
+                if result.get(field):
+                    checkpoint.record(stage, result)
+                return result
+            return wrapper
+
+        # 按顺序组装各阶段: (名称, 处理函数, 线程数, 失败时的结果)
+        stages = []
+        if self.pdf_downloader:
+            stages.append(("下载", checkpointed(self._download, "downloaded", "pdf_path"), self.download_workers,
+                           keep_paper))
+        if self.pdf_extractor:
+            stages.append(("提取", checkpointed(self._extract, "extracted", "full_text"), self.extract_workers,
+                           keep_paper))
+        stages.append(("总结", summarize, self.summarize_workers, summarize_failed))
+
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in stages]
+        collected = queue.Queue()
+        threads = []
+        for i, (name, func, workers, on_error) in enumerate(stages):
+            if i + 1 < len(stages):
+                out_queue, next_workers = queues[i + 1], stages[i + 1][2]
+            else:
+                out_queue, next_workers = collected, 1
+            threads.extend(self._start_stage(name, func, queues[i], out_queue, workers, next_workers, on_error))
+
+        # 送入论文，队列满时阻塞，实现背压
+        for index, paper in enumerate(papers):
+            queues[0].put((index, paper))
+        for _ in range(stages[0][2]):
+            queues[0].put(_STOP)
+
+        done = 0
+        while True:
+            item = collected.get()
+            if item is _STOP:
+                break
+            index, summary = item
+            results[index] = summary
+            if checkpoint is not None:
+                checkpoint.record("summarized", papers[index], summary)
+            done += 1
+            if done % 10 == 0 or done == len(papers):
+                print(f"流水线进度: {done}/{len(papers)}")
+
+        for thread in threads:
+            thread.join()
+
+        # 总结完剩余不足一批的论文
+        if abstract_buffer:
+            for index, summary in summarize_batch(abstract_buffer, 0):
+                results[index] = summary
+                if checkpoint is not None:
+                    checkpoint.record("summarized", papers[index], summary)
+            print(f"流水线进度: {len(papers)}/{len(papers)}")
+
+        if self.pdf_downloader:
+            self.pdf_downloader.report_throughput()
+        if self.pdf_extractor:
+            self.pdf_extractor.report_stats()
+        summary_cache = getattr(self.summarizer, "summary_cache", None)
+        if summary_cache is not None:
+            summary_cache.report()
+
+        # 按论文原始顺序收集后再排序，与逐阶段处理的结果一致
+        summaries = [summary for summary in results if summary is not None]
+        summaries.sort(key=lambda x: x.get("rating", 0), reverse=True)
+
+        print(f"流水线处理完成，共处理 {len(summaries)} 篇论文，耗时 {time.time() - start_time:.1f} 秒")
+        return summaries
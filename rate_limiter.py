@@ -0,0 +1,184 @@
+import re
+import threading
+import time
+
+# 429响应中没有给出等待时间时的默认退避秒数
+DEFAULT_RETRY_AFTER = 30.0
+
+
+def estimate_tokens(text):
+    """
+    粗略估算文本的token数：英文约4个字符一个token，中日韩字符约一个字符一个token
+
+    Args:
+        text: 文本
+
+    Returns:
+        估算的token数
+    """
+    if not text:
+        return 0
+    # 非ASCII字符在UTF-8下至少占2个字节，用字节数差值近似其数量
+    non_ascii = min(len(text), (len(text.encode('utf-8')) - len(text)) // 2)
+    return (len(text) - non_ascii) // 4 + non_ascii
+
+
+def retry_after_seconds(error):
+    """
+    判断异常是否为限流错误（HTTP 429 / RESOURCE_EXHAUSTED），并解析建议的等待时间
+
+    Args:
+        error: 调用API时抛出的异常
+
+    Returns:
+        建议等待的秒数；不是限流错误时返回None
+    """
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    message = str(error)
+    if code != 429 and "429" not in message and "RESOURCE_EXHAUSTED" not in message:
+        return None
+
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("Retry-After") or headers.get("retry-after")
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            pass
+
+    # Gemini在错误详情里给出RetryInfo.retryDelay，如 'retryDelay': '31s'，或提示 "Please retry in 31.2s"
+    match = (re.search(r"retry_?delay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", message, re.IGNORECASE)
+             or re.search(r"retry in (\d+(?:\.\d+)?)\s*s", message, re.IGNORECASE))
+    if match:
+        return float(match.group(1))
+    return DEFAULT_RETRY_AFTER
+
+
+class TokenBucket:
+    """令牌桶，按每分钟速率连续补充，允许预约未来的令牌"""
+
+    def __init__(self, per_minute):
+        """
+        Args:
+            per_minute: 每分钟补充的令牌数，同时也是桶的容量
+        """
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """取出amount个令牌需要等待的秒数（不扣除令牌）"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount, now):
+        """扣除令牌，令牌可以为负，表示已预约了未来补充的令牌"""
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+
+class KeyRateLimiter:
+    """为每个API密钥分别维护请求数和token数两个令牌桶，并记录429要求的冷却时间"""
+
+    def __init__(self, num_keys, requests_per_minute=0, tokens_per_minute=0):
+        """
+        初始化限流器
+
+        Args:
+            num_keys: API密钥数量
+            requests_per_minute: 每个密钥每分钟的请求数上限，0表示不限制
+            tokens_per_minute: 每个密钥每分钟的token数上限，0表示不限制
+        """
+        self._lock = threading.Lock()
+        self.request_buckets = [TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+                                for _ in range(num_keys)]
+        self.token_buckets = [TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+                              for _ in range(num_keys)]
+        self.blocked_until = [0.0] * num_keys
+
+    def _wait_time(self, key_index, tokens, now):
+        """调用方需持有锁"""
+        wait = max(0.0, self.blocked_until[key_index] - now)
+        request_bucket = self.request_buckets[key_index]
+        if request_bucket is not None:
+            wait = max(wait, request_bucket.wait_time(1, now))
+        token_bucket = self.token_buckets[key_index]
+        if token_bucket is not None:
+            wait = max(wait, token_bucket.wait_time(tokens, now))
+        return wait
+
+    def wait_time(self, key_index, tokens=0):
+        """
+        查询某个密钥立即发起请求需要等待的秒数
+
+        Args:
+            key_index: 密钥索引
+            tokens: 本次请求预计消耗的token数
+
+        Returns:
+            需要等待的秒数，0表示当前有余量
+        """
+        with self._lock:
+            return self._wait_time(key_index, tokens, time.monotonic())
+
+    def acquire(self, key_index, tokens=0):
+        """
+        为一次请求预约额度，必要时阻塞直到该密钥有余量
+
+        Args:
+            key_index: 密钥索引
+            tokens: 本次请求预计消耗的token数
+
+        Returns:
+            实际等待的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = self._wait_time(key_index, tokens, now)
+            # 先扣除额度再等待，保证并发请求按到达顺序排队
+            if self.request_buckets[key_index] is not None:
+                self.request_buckets[key_index].consume(1, now)
+            if self.token_buckets[key_index] is not None:
+                self.token_buckets[key_index].consume(tokens, now)
+        waited = 0.0
+        while wait > 0:
+            time.sleep(wait)
+            waited += wait
+            # 等待期间其他请求可能收到429，额度已经预约，只需重新检查冷却时间
+            with self._lock:
+                wait = self.blocked_until[key_index] - time.monotonic()
+        return waited
+
+    def wait_until_available(self, key_index):
+        """
+        阻塞直到该密钥可以发起新请求（429冷却结束且请求数有余量），不预约额度
+
+        Args:
+            key_index: 密钥索引
+        """
+        while True:
+            with self._lock:
+                wait = self._wait_time(key_index, 0, time.monotonic())
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def penalize(self, key_index, retry_after):
+        """
+        收到429后让该密钥冷却一段时间
+
+        Args:
+            key_index: 密钥索引
+            retry_after: 冷却秒数
+        """
+        with self._lock:
+            self.blocked_until[key_index] = max(self.blocked_until[key_index], time.monotonic() + retry_after)
@@ -0,0 +1,140 @@
+import sys
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class _Record:
+    """带__slots__的记录基类，同时支持paper['title']、paper.get('title')等字典式访问，兼容原有代码"""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        try:
+            setattr(self, key, value)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        return getattr(self, key, None) is not None
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None)
+        return default if value is None else value
+
+    def update(self, values):
+        for key, value in values.items():
+            self[key] = value
+
+
+class Paper(_Record):
+    """
+    单篇论文的记录
+
+    作者名和分类名使用sys.intern驻留，同一作者出现在多篇论文（以及多天的历史）中时只保存一份字符串
+    """
+
+    __slots__ = (
+        "title", "authors", "abstract", "pdf_url", "published", "arxiv_id", "category",
+        "category_description", "pdf_path", "full_text", "full_text_budget", "relevance_score", "skip_pdf",
+    )
+
+    # 序列化时保存的字段，全文由检查点的extracted阶段单独保存
+    FIELDS = (
+        "title", "authors", "abstract", "pdf_url", "published", "arxiv_id", "category",
+        "category_description", "pdf_path", "full_text_budget", "relevance_score", "skip_pdf",
+    )
+
+    def __init__(self, title, authors, abstract, pdf_url, published, arxiv_id, category=None,
+                 category_description=None, pdf_path=None, full_text=None, full_text_budget=None,
+                 relevance_score=None, skip_pdf=False):
+        self.title = title
+        self.authors = tuple(_intern(author) for author in authors or ())
+        self.abstract = abstract
+        self.pdf_url = pdf_url
+        self.published = published
+        self.arxiv_id = arxiv_id
+        self.category = _intern(category)
+        self.category_description = _intern(category_description)
+        self.pdf_path = pdf_path
+        self.full_text = full_text
+        self.full_text_budget = full_text_budget
+        self.relevance_score = relevance_score
+        self.skip_pdf = skip_pdf
+
+    def to_dict(self):
+        """转换为可JSON序列化的字典，省略值为空的字段"""
+        data = {}
+        for key in self.FIELDS:
+            value = getattr(self, key)
+            if value is None or value is False:
+                continue
+            data[key] = list(value) if key == "authors" else value
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """从to_dict的结果（或旧版的论文字典）创建记录，忽略未知字段"""
+        return cls(**{key: data[key] for key in cls.__slots__ if key in data})
+
+    def __repr__(self):
+        return f"Paper({self.arxiv_id!r}, {self.title!r})"
+
+
+class Summary(_Record):
+    """
+    单篇论文的报告条目
+
+    只保存总结文本和评分，标题、作者等论文信息通过引用的Paper读取，不再复制到每个条目中
+    """
+
+    __slots__ = ("paper", "summary", "rating", "triage_only", "failed")
+
+    # 从论文读取的字段及其缺省值
+    PAPER_FIELDS = {
+        "title": None, "authors": None, "arxiv_id": None, "pdf_url": None, "published": "N/A",
+        "abstract": "", "pdf_path": None, "relevance_score": None,
+    }
+
+    def __init__(self, paper, summary, rating=50, triage_only=False, failed=False):
+        self.paper = paper
+        self.summary = summary
+        self.rating = rating
+        self.triage_only = triage_only
+        # 总结失败时summary为错误信息，rating为缺省值，不能当作真实的评分
+        self.failed = failed
+
+    def __getattr__(self, key):
+        # 只有在__slots__中找不到时才会调用，转而读取论文（Paper或论文字典）的字段
+        if key in Summary.PAPER_FIELDS:
+            return self.paper.get(key, Summary.PAPER_FIELDS[key])
+        raise AttributeError(key)
+
+    def to_dict(self):
+        """转换为可JSON序列化的字典，格式与原先的报告条目字典相同"""
+        data = {key: getattr(self, key) for key in Summary.PAPER_FIELDS}
+        data["authors"] = list(data["authors"] or ())
+        data["summary"] = self.summary
+        data["rating"] = self.rating
+        if self.triage_only:
+            data["triage_only"] = True
+        if self.failed:
+            data["failed"] = True
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """从to_dict的结果创建报告条目，论文信息重建为Paper"""
+        paper = Paper.from_dict(data)
+        return cls(paper, data.get("summary", ""), data.get("rating", 50), data.get("triage_only", False),
+                   data.get("failed", False))
+
+    def __repr__(self):
+        return f"Summary({self.paper.arxiv_id!r}, rating={self.rating})"
@@ -0,0 +1,278 @@
+import os
+import re
+import zlib
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+import numpy as np
+from arxiv_scraper import ArxivScraper
+
+# 分词规则：字母开头的英文单词，允许包含数字和连字符（如bert-base、gpt-4）
+_TOKEN_RE = re.compile(r"[a-z][a-z0-9\-]+")
+
+# 常见的英文停用词和论文摘要中的套话
+STOPWORDS = frozenset("""
+a an and are as at be been but by can for from has have in into is it its of on or our that the their these this
+those to we which with without via using use used based show shows paper propose proposed present approach method
+methods results result also new more than such both while however can not over under between through each other
+""".split())
+
+
+# 由两个单词的哈希值组合出二元词组哈希值时使用的乘数
+_BIGRAM_MULTIPLIER = np.uint64(0x9E3779B1)
+
+
+def tokenize(text):
+    """
+    把文本切分为小写单词，去掉停用词
+
+    Args:
+        text: 文本
+
+    Returns:
+        单词列表
+    """
+    return [word for word in _TOKEN_RE.findall(text.lower()) if word not in STOPWORDS]
+
+
+class RelevanceFilter:
+    """基于哈希词袋TF-IDF的本地相关度预筛选，在调用任何API之前按兴趣画像给论文打分"""
+
+    def __init__(self, keywords=None, authors=None, seed_texts=None, state_file=None,
+                 hash_bits=18, min_score=0.0, max_papers=0, action="drop", author_bonus=0.5, id_window_days=3):
+        """
+        初始化相关度过滤器
+
+        Args:
+            keywords: 关注的关键词或短语列表
+            authors: 关注的作者列表，论文作者中包含这些人时额外加分
+            seed_texts: 种子论文的摘要列表，代表感兴趣的研究方向
+            state_file: 保存文档频率统计的文件，None表示不跨运行保存
+            hash_bits: 哈希空间的位数，词项被哈希到2**hash_bits个桶中
+            min_score: 相关度低于该值的论文视为长尾
+            max_papers: 每次最多保留的论文数，超出部分视为长尾，0表示不限制
+            action: 长尾论文的处理方式，"drop"为直接丢弃，"abstract"为保留但不下载PDF、只用摘要总结
+            author_bonus: 命中关注作者时增加的分数
+            id_window_days: 已统计论文ID的保留天数（按发布日期），应覆盖获取时的回看窗口，更早的论文不会再被获取
+        """
+        self.keywords = [keyword.strip() for keyword in (keywords or []) if keyword.strip()]
+        self.authors = {author.strip().lower() for author in (authors or []) if author.strip()}
+        self.seed_texts = [text for text in (seed_texts or []) if text.strip()]
+        self.state_file = Path(state_file) if state_file else None
+        self.dim = 1 << hash_bits
+        self.min_score = min_score
+        self.max_papers = max_papers
+        self.action = action
+        self.author_bonus = author_bonus
+        self.id_window = timedelta(days=max(1, id_window_days))
+
+        # 单词的哈希值缓存，避免重复计算
+        self._word_hashes = {}
+        # 已计入文档频率的论文{去掉版本号的arXiv ID: 发布日期}，重复出现的论文只统计一次
+        self.doc_freq, self.num_docs, self.counted_ids = self._load_state()
+
+    def _load_state(self):
+        """加载跨运行累积的文档频率，哈希空间大小变化时重新统计"""
+        if self.state_file is not None and self.state_file.exists():
+            try:
+                with np.load(self.state_file) as state:
+                    doc_freq = state["doc_freq"]
+                    num_docs = int(state["num_docs"])
+                    counted_ids = {}
+                    if "counted_dates" in state.files:
+                        counted_ids = dict(zip(state["counted_ids"].tolist(), state["counted_dates"].tolist()))
+                if doc_freq.shape == (self.dim,):
+                    return doc_freq.astype(np.float64), num_docs, counted_ids
+                print("相关度统计的哈希空间大小已改变，重新统计")
+            except Exception as e:
+                print(f"加载相关度统计失败: {str(e)}")
+        return np.zeros(self.dim, dtype=np.float64), 0, {}
+
+    def _prune_counted_ids(self):
+        """只保留最新发布日期之前id_window天内的论文ID，窗口之外的论文不会再被获取，无需去重"""
+        if not self.counted_ids:
+            return
+        cutoff = (datetime.fromisoformat(max(self.counted_ids.values())) - self.id_window).strftime('%Y-%m-%d')
+        self.counted_ids = {paper_id: date for paper_id, date in self.counted_ids.items() if date >= cutoff}
+
+    def _save_state(self):
+        """原子地保存文档频率"""
+        if self.state_file is None:
+            return
+        self._prune_counted_ids()
+        try:
+            os.makedirs(self.state_file.parent, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.state_file.parent, suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, doc_freq=self.doc_freq, num_docs=self.num_docs,
+                         counted_ids=np.array(list(self.counted_ids), dtype=str),
+                         counted_dates=np.array(list(self.counted_ids.values()), dtype=str))
+            os.replace(tmp_path, self.state_file)
+        except OSError as e:
+            print(f"保存相关度统计失败: {str(e)}")
+
+    def _term_matrix(self, texts):
+        """
+        把一批文本转换为稀疏的词频矩阵，词项包括单词和相邻单词组成的二元词组
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            (行号数组, 桶号数组, 词频数组)，同一行内桶号不重复
+        """
+        words = []
+        lengths = []
+        for text in texts:
+            text_words = tokenize(text)
+            words.extend(text_words)
+            lengths.append(len(text_words))
+        if not words:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0, dtype=np.float64)
+
+        # 只对新出现的单词计算哈希；crc32在不同进程间结果一致，内置hash()每次启动都会变化
+        word_hashes = self._word_hashes
+        for word in set(words).difference(word_hashes):
+            word_hashes[word] = zlib.crc32(word.encode('utf-8'))
+        hashes = np.array([word_hashes[word] for word in words], dtype=np.uint64)
+        rows = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+
+        # 二元词组的哈希由相邻两个单词的哈希组合而成，不跨越文本边界
+        same_text = rows[1:] == rows[:-1]
+        bigram_hashes = (hashes[:-1][same_text] * _BIGRAM_MULTIPLIER) ^ hashes[1:][same_text]
+        rows = np.concatenate([rows, rows[1:][same_text]])
+        buckets = (np.concatenate([hashes, bigram_hashes]) & np.uint64(self.dim - 1)).astype(np.int64)
+
+        # 合并同一文本中落入同一桶的词项
+        keys, counts = np.unique(rows * self.dim + buckets, return_counts=True)
+        return keys // self.dim, keys % self.dim, counts.astype(np.float64)
+
+    def _idf(self):
+        return np.log((1.0 + self.num_docs) / (1.0 + self.doc_freq)) + 1.0
+
+    def _profile_vector(self, idf):
+        """由关键词和种子摘要构造兴趣画像向量（L2归一化）"""
+        profile = np.zeros(self.dim, dtype=np.float64)
+        if self.seed_texts:
+            _, cols, counts = self._term_matrix(self.seed_texts)
+            np.add.at(profile, cols, (1.0 + np.log(counts)) * idf[cols])
+        if self.keywords:
+            # 关键词是用户明确给出的兴趣，权重高于种子摘要中的普通词
+            keyword_weight = max(1.0, float(len(self.seed_texts)))
+            _, cols, counts = self._term_matrix(self.keywords)
+            np.add.at(profile, cols, keyword_weight * idf[cols])
+
+        norm = np.linalg.norm(profile)
+        return profile / norm if norm > 0 else profile
+
+    def score(self, papers):
+        """
+        计算论文与兴趣画像的相关度，并把之前没有统计过的论文计入文档频率
+
+        Args:
+            papers: 论文列表
+
+        Returns:
+            与papers一一对应的相关度分数数组
+        """
+        texts = [f"{paper.get('title', '')}\n{paper.get('abstract', '')}" for paper in papers]
+        rows, cols, counts = self._term_matrix(texts)
+
+        # 先更新文档频率，使当天的新词也参与IDF计算；重复获取或跨分类的论文不再重复计入
+        is_new = np.zeros(len(papers), dtype=bool)
+        today = datetime.now().strftime('%Y-%m-%d')
+        for index, paper in enumerate(papers):
+            paper_id = ArxivScraper.base_id(paper.get('arxiv_id') or '')
+            if paper_id in self.counted_ids:
+                continue
+            if paper_id:
+                self.counted_ids[paper_id] = paper.get('published') or today
+            is_new[index] = True
+        self.doc_freq += np.bincount(cols[is_new[rows]], minlength=self.dim)
+        self.num_docs += int(is_new.sum())
+        idf = self._idf()
+        profile = self._profile_vector(idf)
+
+        # 余弦相似度：对数词频乘IDF，按文档分别归一化
+        weights = (1.0 + np.log(counts)) * idf[cols]
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=len(papers)))
+        dots = np.bincount(rows, weights=weights * profile[cols], minlength=len(papers))
+        scores = np.divide(dots, norms, out=np.zeros(len(papers)), where=norms > 0)
+
+        if self.authors:
+            bonus = [
+                self.author_bonus if any(author.lower() in self.authors for author in paper.get('authors', [])) else 0.0
+                for paper in papers
+            ]
+            scores += np.asarray(bonus)
+        return scores
+
+    def filter(self, papers):
+        """
+        给论文打分并处理长尾论文
+
+        每篇论文增加relevance_score字段；长尾论文按action丢弃，或标记skip_pdf后只用摘要总结。
+
+        Args:
+            papers: 论文列表
+
+        Returns:
+            保留的论文列表，按相关度从高到低排序
+        """
+        if not papers:
+            return papers
+        if not (self.keywords or self.seed_texts or self.authors):
+            print("未配置关键词、种子摘要或关注作者，跳过相关度预筛选")
+            return papers
+
+        start_time = time.perf_counter()
+        scores = self.score(papers)
+        self._save_state()
+
+        order = np.argsort(-scores, kind="stable")
+        keep = scores[order] >= self.min_score
+        if self.max_papers:
+            keep[self.max_papers:] = False
+
+        ranked = []
+        tail = 0
+        for position, index in enumerate(order):
+            paper = papers[index]
+            paper['relevance_score'] = round(float(scores[index]), 4)
+            if keep[position]:
+                ranked.append(paper)
+            elif self.action == "abstract":
+                paper['skip_pdf'] = True
+                ranked.append(paper)
+                tail += 1
+            else:
+                tail += 1
+
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        handling = "只用摘要总结" if self.action == "abstract" else "丢弃"
+        print(f"相关度预筛选: {len(papers)} 篇论文耗时 {elapsed_ms:.1f} ms，{tail} 篇长尾论文{handling}"
+              f"（最高分 {scores.max():.3f}，中位数 {float(np.median(scores)):.3f}）")
+        return ranked
+
+
+def load_seed_texts(seed_file):
+    """
+    读取种子摘要文件，不同摘要之间用空行分隔
+
+    Args:
+        seed_file: 文件路径，为空时返回空列表
+
+    Returns:
+        摘要列表
+    """
+    if not seed_file:
+        return []
+    try:
+        with open(seed_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except OSError as e:
+        print(f"读取种子摘要失败: {str(e)}")
+        return []
+    return [block.strip() for block in re.split(r"\n\s*\n", content) if block.strip()]
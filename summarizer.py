@@ -1,38 +1,15 @@
 from google import genai
 from google.genai import types
-from config import GEMINI_API_KEYS, GEMINI_MODEL, FULL_TEXT_ANALYSIS
+from config import GEMINI_API_KEYS, GEMINI_MODEL, GEMINI_BASE_URL, FULL_TEXT_ANALYSIS
+from text_spool import read_text
+from records import Summary
+from metrics import metrics
+from rate_limiter import retry_after_seconds
 import itertools
 import re
 
-
-class PaperSummarizer:
-    def __init__(self):
-        # 创建API key轮换器
-        self.api_key_cycle = itertools.cycle(GEMINI_API_KEYS)
-        self.current_client = None
-        self._update_client()
-
-    def _update_client(self):
-        """更新当前使用的API key"""
-        api_key = next(self.api_key_cycle)
-        self.current_client = genai.Client(api_key=api_key)
-
-    def summarize_paper(self, paper):
-        """使用Gemini API总结论文并评分"""
-
-        # 使用f-string更安全地处理可能包含特殊字符的内容
-        title = paper.get("title", "N/A")
-        authors = ", ".join(paper.get("authors", ["N/A"]))
-        abstract = paper.get("abstract", "N/A")
-
-        # 检查是否有全文可用
-        has_full_text = 'full_text' in paper and paper['full_text'] and len(paper['full_text']) > 200
-
-        # 根据配置和全文可用性决定使用哪种提示
-        if FULL_TEXT_ANALYSIS and has_full_text:
-            full_text = paper['full_text']
-
-            prompt = f"""
+# 基于全文的提示模板
+FULL_TEXT_PROMPT_TEMPLATE = """
     请扮演一位专业的科研助理。
     你的任务是根据下面提供的论文信息（标题、作者、摘要、全文），用简洁、专业的中文进行总结和评分。
 
@@ -61,9 +38,9 @@ class PaperSummarizer:
     *   篇幅：每个部分的内容**严格限制在200字以内**。
     *   格式：**仅输出**编号和对应内容（例如："1. 主要研究目标: [内容]"），每个部分占一行。**绝对不要包含任何**引言、结语、问候语、解释性文字或任何与要求格式无关的内容。直接开始输出 "1. 主要研究目标: ..."。
     """
-        else:
-            # 使用原来的只基于摘要的提示
-            prompt = f"""
+
+# 只基于摘要的提示模板
+ABSTRACT_PROMPT_TEMPLATE = """
     请扮演一位专业的科研助理。
     你的任务是根据下面提供的论文信息（标题、作者、摘要），用简洁、专业的中文进行总结和评分。
 
@@ -92,6 +69,77 @@ class PaperSummarizer:
     *   格式：**仅输出**编号和对应内容（例如："1. 主要研究目标: [内容]"），每个部分占一行。**绝对不要包含任何**引言、结语、问候语、解释性文字或任何与要求格式无关的内容。直接开始输出 "1. 主要研究目标: ..."。
     """
 
+
+def create_client(api_key):
+    """创建Gemini客户端，配置了GEMINI_BASE_URL时连接到该地址"""
+    if GEMINI_BASE_URL:
+        return genai.Client(api_key=api_key, http_options=types.HttpOptions(base_url=GEMINI_BASE_URL))
+    return genai.Client(api_key=api_key)
+
+
+class PaperSummarizer:
+    def __init__(self, summary_cache=None, model=GEMINI_MODEL):
+        """
+        初始化串行论文总结器
+
+        Args:
+            summary_cache: 总结缓存（SummaryCache），None表示不使用缓存
+            model: 使用的Gemini模型
+        """
+        self.summary_cache = summary_cache
+        self.model = model
+        # 创建API key轮换器
+        self.api_key_cycle = itertools.cycle(enumerate(GEMINI_API_KEYS))
+        self.key_index = None
+        self.current_client = None
+        self._update_client()
+
+    def _update_client(self):
+        """更新当前使用的API key"""
+        self.key_index, api_key = next(self.api_key_cycle)
+        self.current_client = create_client(api_key)
+
+    def summarize_paper(self, paper, worker_index=0):
+        """使用Gemini API总结论文并评分
+
+        Args:
+            paper: 论文数据
+            worker_index: 工作线程索引，串行总结器忽略该参数
+        """
+
+        # 准备提示中使用的论文信息
+        title = paper.get("title", "N/A")
+        authors = ", ".join(paper.get("authors", ["N/A"]))
+        abstract = paper.get("abstract", "N/A")
+
+        # 检查是否有全文可用
+        has_full_text = 'full_text' in paper and paper['full_text'] and len(paper['full_text']) > 200
+
+        # 根据配置和全文可用性决定使用哪种提示
+        if FULL_TEXT_ANALYSIS and has_full_text:
+            # 压缩预算不同时送入模型的全文不同，预算也作为缓存键的一部分
+            budget = paper.get('full_text_budget')
+            mode = "full_text" if budget is None else f"full_text:{budget}"
+            template = FULL_TEXT_PROMPT_TEMPLATE
+        else:
+            # 使用原来的只基于摘要的提示
+            mode = "abstract"
+            template = ABSTRACT_PROMPT_TEMPLATE
+
+        # 优先使用缓存的总结结果，命中时不必从暂存区读取全文
+        cache_key = None
+        if self.summary_cache is not None and paper.get("arxiv_id"):
+            cache_key = self.summary_cache.make_key(paper["arxiv_id"], self.model, template, mode)
+            cached = self.summary_cache.get(cache_key)
+            if cached is not None:
+                print(f"使用缓存的总结: {title[:30]}...")
+                return cached
+
+        if mode == "abstract":
+            prompt = template.format(title=title, authors=authors, abstract=abstract)
+        else:
+            prompt = template.format(title=title, authors=authors, abstract=abstract, full_text=read_text(paper['full_text']))
+
         try:
             # 准备请求内容
             contents = [
@@ -108,29 +156,40 @@ class PaperSummarizer:
 
             # 生成响应
             response = ""
-            for chunk in self.current_client.models.generate_content_stream(
-                model=GEMINI_MODEL,
-                contents=contents,
-                config=generate_content_config,
-            ):
-                response += chunk.text
+            with metrics.timer("api_request_seconds", key=self.key_index, model=self.model):
+                for chunk in self.current_client.models.generate_content_stream(
+                    model=self.model,
+                    contents=contents,
+                    config=generate_content_config,
+                ):
+                    response += chunk.text
 
             # 如果响应为空，尝试使用另一个API key
             if not response.strip():
+                metrics.inc("api_requests_total", key=self.key_index, model=self.model, outcome="empty")
+                metrics.inc("retries_total", stage="summarize", reason="empty")
                 self._update_client()
                 return self.summarize_paper(paper)
             print(response)
+            metrics.inc("api_requests_total", key=self.key_index, model=self.model, outcome="ok")
 
             # 提取评分
             rating = self._extract_rating(response)
 
-            return {
+            summary_result = {
                 "summary_text": response,
                 "rating": rating
             }
+            if cache_key is not None:
+                self.summary_cache.put(cache_key, paper["arxiv_id"], self.model, mode, summary_result)
+            return summary_result
 
         except Exception as e:
             print(f"使用当前API key失败: {str(e)}")
+            rate_limited = retry_after_seconds(e) is not None
+            metrics.inc("api_requests_total", key=self.key_index, model=self.model,
+                        outcome="rate_limited" if rate_limited else "error")
+            metrics.inc("retries_total", stage="summarize", reason="rate_limited" if rate_limited else "error")
             # 如果出错，尝试使用另一个API key
             self._update_client()
             return self.summarize_paper(paper)
@@ -155,26 +214,20 @@ class PaperSummarizer:
         summaries = []
         for paper in papers:
             summary_result = self.summarize_paper(paper)
-
-            # 提取摘要文本和评分
-            summary_text = summary_result.get("summary_text", "")
-            rating = summary_result.get("rating", 50)
-
-            summaries.append(
-                {
-                    "title": paper["title"],
-                    "authors": paper["authors"],
-                    "arxiv_id": paper["arxiv_id"],
-                    "pdf_url": paper["pdf_url"],
-                    "published": paper.get("published", "N/A"),
-                    "abstract": paper.get("abstract", ""),
-                    "summary": summary_text,
-                    "rating": rating,
-                    "pdf_path": paper.get("pdf_path", None),
-                }
-            )
+            summaries.append(self.make_summary(paper, summary_result))
 
         # 按评分排序（从高到低）
         summaries.sort(key=lambda x: x.get("rating", 0), reverse=True)
 
+        if self.summary_cache is not None:
+            self.summary_cache.report()
         return summaries
+
+    def make_summary(self, paper, summary_result):
+        """根据论文数据和总结结果生成报告条目"""
+        # 提取摘要文本和评分
+        summary_text = summary_result.get("summary_text", "")
+        rating = summary_result.get("rating", 50)
+
+        # 报告条目引用论文记录，不再复制标题、作者等字段
+        return Summary(paper, summary_text, rating, failed=summary_result.get("failed", False))
@@ -0,0 +1,170 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+from pathlib import Path
+from metrics import metrics
+
+
+def prompt_hash(template):
+    """计算提示模板的哈希，模板改动后旧缓存自动失效"""
+    return hashlib.sha256(template.encode('utf-8')).hexdigest()[:16]
+
+
+class SummaryCache:
+    """论文总结结果的持久化缓存（SQLite），避免重复运行时再次调用Gemini"""
+
+    def __init__(self, db_file, ttl_days=30, max_entries=20000, refresh=False):
+        """
+        初始化总结缓存
+
+        Args:
+            db_file: 缓存数据库文件
+            ttl_days: 缓存有效天数，0表示永不过期
+            max_entries: 最多保留的条目数，超出时淘汰最久未使用的条目，0表示不限制
+            refresh: 是否强制刷新，为True时读取一律视为未命中，但新结果仍会写入
+        """
+        self.db_file = Path(db_file)
+        self.ttl_seconds = ttl_days * 86400 if ttl_days else 0
+        self.max_entries = max_entries
+        self.refresh = refresh
+        os.makedirs(self.db_file.parent, exist_ok=True)
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+        self.hits = 0
+        self.misses = 0
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "key TEXT PRIMARY KEY, "
+            "arxiv_id TEXT NOT NULL, "
+            "model TEXT NOT NULL, "
+            "mode TEXT NOT NULL, "
+            "summary_text TEXT NOT NULL, "
+            "rating INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_accessed ON summaries (accessed_at)")
+        self._evict()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(arxiv_id, model, template, mode):
+        """
+        生成缓存键
+
+        Args:
+            arxiv_id: 带版本号的arXiv ID，如2401.12345v2
+            model: 模型名称
+            template: 使用的提示模板
+            mode: 总结模式，如"full_text"或"abstract"
+
+        Returns:
+            缓存键字符串
+        """
+        return f"{arxiv_id}|{model}|{prompt_hash(template)}|{mode}"
+
+    def get(self, key):
+        """
+        读取缓存的总结结果
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            包含summary_text和rating的字典，未命中时返回None
+        """
+        row = None
+        if not self.refresh:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT summary_text, rating, created_at FROM summaries WHERE key = ?", (key,)
+            ).fetchone()
+            now = time.time()
+            if row is not None and self.ttl_seconds and now - row[2] > self.ttl_seconds:
+                conn.execute("DELETE FROM summaries WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                conn.execute("UPDATE summaries SET accessed_at = ? WHERE key = ?", (now, key))
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        metrics.inc("cache_lookups_total", cache="summary", result="miss" if row is None else "hit")
+        if row is None:
+            return None
+        return {"summary_text": row[0], "rating": row[1]}
+
+    def put(self, key, arxiv_id, model, mode, summary_result):
+        """
+        写入总结结果
+
+        Args:
+            key: 缓存键
+            arxiv_id: arXiv ID
+            model: 模型名称
+            mode: 总结模式
+            summary_result: 包含summary_text和rating的字典
+        """
+        now = time.time()
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO summaries "
+                "(key, arxiv_id, model, mode, summary_text, rating, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, arxiv_id, model, mode, summary_result["summary_text"],
+                 int(summary_result.get("rating", 50)), now, now),
+            )
+        except sqlite3.Error as e:
+            print(f"写入总结缓存失败: {str(e)}")
+            return
+
+        with self._lock:
+            self._puts_since_evict += 1
+            should_evict = self._puts_since_evict >= 100
+            if should_evict:
+                self._puts_since_evict = 0
+        if should_evict:
+            self._evict()
+
+    def _evict(self):
+        """删除过期条目，并在超出条目上限时删除最久未使用的条目"""
+        conn = self._conn()
+        try:
+            if self.ttl_seconds:
+                conn.execute("DELETE FROM summaries WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            if self.max_entries:
+                conn.execute(
+                    "DELETE FROM summaries WHERE key IN ("
+                    "SELECT key FROM summaries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+        except sqlite3.Error as e:
+            print(f"清理总结缓存失败: {str(e)}")
+
+    def stats(self):
+        """返回命中统计"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def report(self):
+        """打印命中统计"""
+        stats = self.stats()
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = stats["hits"] / lookups * 100 if lookups else 0
+        print(f"总结缓存: 命中 {stats['hits']} 次，未命中 {stats['misses']} 次，命中率 {hit_rate:.1f}%")
@@ -0,0 +1,151 @@
+import os
+import json
+import zlib
+import hashlib
+import threading
+import tempfile
+from pathlib import Path
+from metrics import metrics
+
+
+class TextCache:
+    """已提取全文的磁盘缓存，按PDF内容哈希和提取参数索引，压缩存储，超出容量时按LRU淘汰"""
+
+    SUFFIX = ".txt.z"
+
+    def __init__(self, cache_dir, max_bytes=500 * 1024 * 1024):
+        """
+        初始化全文缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_bytes: 缓存占用的最大字节数（压缩后），超出时删除最久未使用的条目
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = sum(path.stat().st_size for path in self.cache_dir.glob(f"*{self.SUFFIX}"))
+
+    @staticmethod
+    def file_hash(pdf_path):
+        """计算文件内容的SHA-256"""
+        digest = hashlib.sha256()
+        with open(pdf_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def make_key(self, pdf_path, settings):
+        """
+        生成缓存键
+
+        Args:
+            pdf_path: PDF文件路径
+            settings: 影响提取结果的参数，如max_pages、是否OCR
+
+        Returns:
+            缓存键字符串
+        """
+        settings_str = json.dumps(settings, sort_keys=True)
+        return hashlib.sha256(f"{self.file_hash(pdf_path)}|{settings_str}".encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}{self.SUFFIX}"
+
+    def get(self, key):
+        """
+        读取缓存的全文
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的文本，未命中时返回None
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                text = zlib.decompress(f.read()).decode('utf-8')
+            # 更新修改时间，作为LRU的最近使用时间
+            os.utime(path)
+        except (OSError, zlib.error, UnicodeDecodeError):
+            with self._lock:
+                self.misses += 1
+            metrics.inc("cache_lookups_total", cache="text", result="miss")
+            return None
+
+        with self._lock:
+            self.hits += 1
+        metrics.inc("cache_lookups_total", cache="text", result="hit")
+        return text
+
+    def put(self, key, text):
+        """
+        写入全文缓存
+
+        Args:
+            key: 缓存键
+            text: 清理后的全文
+        """
+        data = zlib.compress(text.encode('utf-8'), 6)
+        path = self._path(key)
+        try:
+            old_size = path.stat().st_size if path.exists() else 0
+            # 先写临时文件再重命名，避免并发读到半个文件
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"写入全文缓存失败: {str(e)}")
+            return
+
+        with self._lock:
+            self.total_bytes += len(data) - old_size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """删除最久未使用的条目，直到占用降到上限的90%以下（调用方需持有锁）"""
+        entries = []
+        for path in self.cache_dir.glob(f"*{self.SUFFIX}"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        self.total_bytes = total
+        if removed:
+            print(f"全文缓存超出容量，已淘汰 {removed} 个条目")
+
+    def stats(self):
+        """返回命中统计"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "bytes": self.total_bytes}
+
+    def report(self):
+        """打印命中统计"""
+        stats = self.stats()
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = stats["hits"] / lookups * 100 if lookups else 0
+        print(f"全文缓存: 命中 {stats['hits']} 次，未命中 {stats['misses']} 次，命中率 {hit_rate:.1f}%，"
+              f"占用 {stats['bytes'] / (1024 * 1024):.1f} MB")
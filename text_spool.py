@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+
+class TextHandle:
+    """保存在磁盘上的文本的轻量引用，只记录路径和长度，需要时才读取"""
+
+    __slots__ = ("path", "length")
+
+    def __init__(self, path, length):
+        self.path = path
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __bool__(self):
+        return self.length > 0
+
+    def read(self):
+        """读取完整文本，调用方用完后不应长期持有"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def __repr__(self):
+        return f"TextHandle({self.path!r}, {self.length})"
+
+
+def read_text(value):
+    """
+    取得文本内容，兼容普通字符串和TextHandle
+
+    Args:
+        value: 字符串、TextHandle或None
+
+    Returns:
+        文本字符串，value为None时返回None
+    """
+    if isinstance(value, TextHandle):
+        return value.read()
+    return value
+
+
+class TextSpool:
+    """把论文全文暂存到磁盘，论文记录中只保留TextHandle，使内存占用与当天的论文数量无关"""
+
+    # 超过该时间的运行目录视为之前异常退出留下的，启动时清理
+    STALE_SECONDS = 24 * 3600
+
+    def __init__(self, spool_dir):
+        """
+        初始化全文暂存区
+
+        Args:
+            spool_dir: 暂存目录，每次运行在其中创建独立的子目录
+        """
+        self.spool_dir = Path(spool_dir)
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._remove_stale()
+        self.run_dir = Path(tempfile.mkdtemp(dir=self.spool_dir, prefix="run-"))
+        self._lock = threading.Lock()
+        self.count = 0
+        self.chars = 0
+
+    def _remove_stale(self):
+        cutoff = time.time() - self.STALE_SECONDS
+        for path in self.spool_dir.glob("run-*"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                continue
+
+    def spool(self, text):
+        """
+        把文本写入暂存区
+
+        Args:
+            text: 文本
+
+        Returns:
+            TextHandle；写入失败时返回原文本
+        """
+        try:
+            fd, path = tempfile.mkstemp(dir=self.run_dir, suffix=".txt")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+        except OSError as e:
+            print(f"暂存全文失败，保留在内存中: {str(e)}")
+            return text
+
+        with self._lock:
+            self.count += 1
+            self.chars += len(text)
+        return TextHandle(path, len(text))
+
+    def clear(self):
+        """删除本次运行暂存的所有文本，之前返回的TextHandle随之失效"""
+        with self._lock:
+            count, self.count, self.chars = self.count, 0, 0
+        for path in self.run_dir.glob("*.txt"):
+            try:
+                path.unlink()
+            except OSError:
+                continue
+        return count
+
+    def close(self):
+        """删除本次运行的暂存目录"""
+        self.clear()
+        shutil.rmtree(self.run_dir, ignore_errors=True)
@@ -0,0 +1,59 @@
+import time
+from typing import List, Dict, Any, Tuple
+
+
+class PaperTriage:
+    """两级筛选：先只根据摘要给所有论文评分，只有排名靠前的论文才下载PDF并做全文分析"""
+
+    def __init__(self, summarizer, top_k=10, min_rating=0):
+        """
+        初始化论文初筛器
+
+        Args:
+            summarizer: 用于初筛的总结器，通常使用更快的模型；论文此时没有全文，只会使用摘要提示
+            top_k: 最多选出多少篇论文做全文分析，0表示不限制
+            min_rating: 初筛评分不低于该值的论文才做全文分析，0表示不限制
+        """
+        self.summarizer = summarizer
+        self.top_k = top_k
+        self.min_rating = min_rating
+
+    def run(self, papers: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        对论文做初筛
+
+        Args:
+            papers: 论文列表
+
+        Returns:
+            (需要做全文分析的论文列表, 其余论文的初筛总结列表)
+        """
+        if not papers:
+            return [], []
+
+        start_time = time.time()
+        print(f"开始初筛 {len(papers)} 篇论文（模型: {getattr(self.summarizer, 'model', 'N/A')}）...")
+        triage_summaries = self.summarizer.generate_daily_report(papers)
+
+        # 初筛失败的论文没有真实评分，不参与排名，直接交给全文分析重新总结
+        failed_ids = {summary["arxiv_id"] for summary in triage_summaries if summary.get("failed")}
+
+        # 总结结果已按评分从高到低排序
+        ranked = [summary for summary in triage_summaries
+                  if not summary.get("failed") and summary.get("rating", 0) >= self.min_rating]
+        if self.top_k:
+            ranked = ranked[:self.top_k]
+        selected_ids = {summary["arxiv_id"] for summary in ranked} | failed_ids
+
+        # 保持论文的原始顺序，与不初筛时的处理顺序一致
+        selected = [paper for paper in papers if paper["arxiv_id"] in selected_ids]
+        remaining = []
+        for summary in triage_summaries:
+            if summary["arxiv_id"] not in selected_ids:
+                summary["triage_only"] = True
+                remaining.append(summary)
+
+        failed_note = f"（其中 {len(failed_ids)} 篇初筛失败）" if failed_ids else ""
+        print(f"初筛完成，耗时 {time.time() - start_time:.1f} 秒: {len(selected)} 篇论文进入全文分析{failed_note}，"
+              f"{len(remaining)} 篇保留初筛总结")
+        return selected, remaining